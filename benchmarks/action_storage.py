@@ -0,0 +1,73 @@
+"""
+Redis memory used by the timeline actions stored one hash per action
+(ActionManager) or packed in bucket hashes (CompactActionManager).
+
+    python benchmarks/action_storage.py --actions 10000000
+"""
+import argparse
+import uuid
+
+from utils import measure, report, setup
+
+MANAGERS = (
+    ('hash', 'sequere.contrib.timeline.backends.redis.managers.ActionManager'),
+    ('compact', 'sequere.contrib.timeline.backends.redis.managers.CompactActionManager'),
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--actions', type=int, default=1000000)
+    parser.add_argument('--actors', type=int, default=10000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup()
+
+    from sequere.contrib.timeline.backends.redis import RedisBackend
+    from sequere.tests.sequere_registry import JoinAction, LikeAction
+
+    uids = [uuid.uuid4().hex for i in range(args.actors)]
+
+    for name, manager_class in MANAGERS:
+        backend = RedisBackend(manager_class=manager_class)
+        backend.storage.clear()
+
+        client = backend.client
+
+        used_memory = client.info('memory')['used_memory']
+
+        def save(i):
+            with client.pipeline() as pipe:
+                for j in range(i * args.batch_size, min((i + 1) * args.batch_size, args.actions)):
+                    data = {
+                        'actor': uids[j % args.actors],
+                        'verb': JoinAction.verb,
+                        'timestamp': 1500000000 + j,
+                    }
+
+                    if j % 2:
+                        data['verb'] = LikeAction.verb
+                        data['target'] = uids[(j + 1) % args.actors]
+
+                    backend.storage.make_uid(data, client=pipe)
+
+                pipe.execute()
+
+        elapsed = measure(save, (args.actions + args.batch_size - 1) // args.batch_size)
+
+        report('save (%s)' % name, args.actions, elapsed, unit='action')
+
+        used_memory = client.info('memory')['used_memory'] - used_memory
+
+        print('%-40s %12d bytes  %8.1f bytes/action  %8.1f MB per 10M actions' % (
+            'memory (%s)' % name,
+            used_memory,
+            float(used_memory) / args.actions,
+            float(used_memory) / args.actions * 10000000 / 1024 / 1024))
+
+        backend.storage.clear()
+
+
+if __name__ == '__main__':
+    main()
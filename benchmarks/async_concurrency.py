@@ -0,0 +1,95 @@
+"""
+Throughput of requests reading a followers count, a follow state and the
+first page of a private timeline: synchronous calls in sequence, synchronous
+calls offloaded to a pool of threads and the asyncio API awaited
+``--concurrency`` requests at a time.
+
+    python benchmarks/async_concurrency.py --requests 1000 --concurrency 50
+"""
+import argparse
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import measure, report, setup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--actions', type=int, default=100)
+    args = parser.parse_args()
+
+    setup()
+
+    from django.db import connection
+
+    from sequere import aio, app
+    from sequere.backends.redis import RedisBackend
+    from sequere.compat import User
+    from sequere.contrib.timeline import Timeline
+    from sequere.contrib.timeline import app as timeline_app
+    from sequere.contrib.timeline.backends.redis import RedisBackend as RedisTimelineBackend
+    from sequere.models import follow, get_followers_count, is_following
+    from sequere.tests.sequere_registry import JoinAction
+
+    connection.creation.create_test_db(verbosity=0)
+
+    app.backend = RedisBackend()
+    app.backend.clear()
+
+    timeline_app.backend = RedisTimelineBackend()
+
+    actor = User.objects.create(username='actor')
+
+    readers = [User.objects.create(username='reader%d' % i) for i in range(args.concurrency)]
+
+    for reader in readers:
+        follow(reader, actor)
+
+    for i in range(args.actions):
+        Timeline(actor).save(JoinAction(actor=actor))
+
+    def read(i):
+        reader = readers[i % len(readers)]
+
+        return (get_followers_count(actor),
+                is_following(reader, actor),
+                list(Timeline(reader).get_private()[0:20]))
+
+    async def aread(i):
+        reader = readers[i % len(readers)]
+
+        return await asyncio.gather(aio.aget_followers_count(actor),
+                                    aio.ais_following(reader, actor),
+                                    Timeline(reader).aget_private(stop=20))
+
+    report('sync', args.requests, measure(read, args.requests), unit='request')
+
+    loop = asyncio.new_event_loop()
+
+    executor = ThreadPoolExecutor(args.concurrency)
+
+    async def gather(func, start):
+        return await asyncio.gather(*[func(i) for i in range(start, min(start + args.concurrency, args.requests))])
+
+    def run_batches(func):
+        def batch(i):
+            loop.run_until_complete(gather(func, i * args.concurrency))
+
+        return measure(batch, (args.requests + args.concurrency - 1) // args.concurrency)
+
+    report('threads (%d)' % args.concurrency, args.requests,
+           run_batches(lambda i: loop.run_in_executor(executor, read, i)), unit='request')
+
+    report('asyncio (%d)' % args.concurrency, args.requests, run_batches(aread), unit='request')
+
+    executor.shutdown()
+    loop.close()
+
+    app.backend.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Actions dispatched per second to the timelines of the followers of an
+actor, loading each follower or writing straight to their uids.
+
+    python benchmarks/dispatch.py --followers 100000
+"""
+import argparse
+
+from utils import measure, report, setup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--followers', type=int, default=10000)
+    parser.add_argument('--iterations', type=int, default=10)
+    args = parser.parse_args()
+
+    setup()
+
+    from django.db import connection
+
+    from sequere import app
+    from sequere.backends.redis import RedisBackend
+    from sequere.compat import User
+    from sequere.contrib.timeline import app as timeline_app
+    from sequere.contrib.timeline.tasks import dispatch_to_instances, dispatch_to_uids, get_dispatch_windows
+    from sequere.tests.sequere_registry import JoinAction
+
+    connection.creation.create_test_db(verbosity=0)
+
+    User.objects.bulk_create([User(username='user%d' % i) for i in range(args.followers + 1)])
+
+    users = list(User.objects.order_by('pk'))
+
+    actor = users[0]
+
+    app.backend = RedisBackend(manager_class='sequere.backends.redis.managers.IdentifierInstanceManager')
+    app.backend.clear()
+
+    for start in range(1, len(users), 10000):
+        app.backend.follow_many([(user, actor) for user in users[start:start + 10000]],
+                                timestamp=1000000000 + start,
+                                dispatch=False)
+
+    action = JoinAction(actor=actor)
+
+    timeline_app.backend.save(actor, action)
+
+    windows = get_dispatch_windows(actor, args.followers)
+
+    def dispatch_uids(i):
+        for identifier, after, until, size in windows:
+            dispatch_to_uids(action, identifier, after, until, size=size)
+
+    for name, dispatch in (('dispatch (instances)', lambda i: dispatch_to_instances(action, dispatch=False)),
+                           ('dispatch (uids)', dispatch_uids)):
+        elapsed = measure(dispatch, args.iterations)
+
+        report(name, args.iterations, elapsed, unit='action')
+        report(name, args.iterations * args.followers, elapsed, unit='write')
+
+    app.backend.clear()
+    timeline_app.backend.storage.clear()
+
+
+if __name__ == '__main__':
+    main()
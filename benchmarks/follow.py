@@ -0,0 +1,44 @@
+"""
+Latency per follow/unfollow with the Redis backend.
+
+Run it on two revisions to compare them:
+
+    python benchmarks/follow.py --iterations 10000
+"""
+import argparse
+
+from utils import measure, report, setup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=5000)
+    args = parser.parse_args()
+
+    setup()
+
+    from sequere.backends.redis import RedisBackend
+    from sequere.compat import User
+
+    backend = RedisBackend()
+    backend.clear()
+
+    users = [User(pk=i + 1) for i in range(args.iterations + 1)]
+
+    report('follow', args.iterations,
+           measure(lambda i: backend.follow(users[i], users[i + 1]), args.iterations))
+
+    report('follow (mutual)', args.iterations,
+           measure(lambda i: backend.follow(users[i + 1], users[i]), args.iterations))
+
+    report('unfollow (mutual)', args.iterations,
+           measure(lambda i: backend.unfollow(users[i], users[i + 1]), args.iterations))
+
+    report('unfollow', args.iterations,
+           measure(lambda i: backend.unfollow(users[i + 1], users[i]), args.iterations))
+
+    backend.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Query plans and timings of the Follow queries on a seeded table.
+
+    python benchmarks/follow_indexes.py --rows 1000000
+"""
+import argparse
+import time
+
+from utils import report, setup
+
+PAGE_SIZE = 20
+
+
+def explain(connection, qs):
+    sql, params = qs.query.sql_with_params()
+
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+
+        return [' '.join('%s' % column for column in row) for row in cursor.fetchall()]
+
+
+def seed(model, rows, batch_size=10000):
+    """
+    Each account follows 50 others, the account 0 is followed by everyone.
+    """
+    accounts = max(rows // 50, 50)
+
+    def edge(i):
+        from_id, k = divmod(i, 50)
+
+        to_id = 0 if k == 0 else 1 + (from_id + 997 * k) % accounts
+
+        return model(from_identifier='user', from_object_id=from_id + 1,
+                     to_identifier='user', to_object_id=to_id,
+                     is_mutual=k % 5 == 0)
+
+    for start in range(0, rows, batch_size):
+        model.objects.bulk_create([edge(i) for i in range(start, min(start + batch_size, rows))])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--iterations', type=int, default=100)
+    args = parser.parse_args()
+
+    setup()
+
+    from django.db import connection
+
+    from sequere.backends.database.models import Follow
+
+    connection.creation.create_test_db(verbosity=0)
+
+    start = time.time()
+    seed(Follow, args.rows)
+    report('seed', args.rows, time.time() - start, unit='row')
+
+    queries = [
+        ('followers page (celebrity)',
+         lambda: list(Follow.objects.filter(to_identifier='user', to_object_id=0)
+                      .order_by('-created_at')[:PAGE_SIZE].values('from_identifier', 'from_object_id'))),
+        ('followers count (celebrity)',
+         lambda: Follow.objects.filter(to_identifier='user', to_object_id=0).count()),
+        ('followings page',
+         lambda: list(Follow.objects.filter(from_identifier='user', from_object_id=1)
+                      .order_by('-created_at')[:PAGE_SIZE].values('to_identifier', 'to_object_id'))),
+        ('is_following',
+         lambda: Follow.objects.filter(from_identifier='user', from_object_id=1,
+                                       to_identifier='user', to_object_id=0).exists()),
+        ('friends count',
+         lambda: Follow.objects.filter(from_identifier='user', from_object_id=1, is_mutual=True).count()),
+    ]
+
+    for name, query in queries:
+        start = time.time()
+
+        for i in range(args.iterations):
+            query()
+
+        report(name, args.iterations, time.time() - start, unit='run')
+
+    print('')
+
+    for name, qs in [
+        ('followers page', Follow.objects.filter(to_identifier='user', to_object_id=0).order_by('-created_at')[:PAGE_SIZE]),
+        ('is_following', Follow.objects.filter(from_identifier='user', from_object_id=1,
+                                               to_identifier='user', to_object_id=0)),
+        ('friends', Follow.objects.filter(from_identifier='user', from_object_id=1, is_mutual=True)),
+    ]:
+        print(name)
+
+        for line in explain(connection, qs):
+            print('    %s' % line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Cost of the instrumentation on follows and counts with the Redis backend:
+without sink, with a sink dropping the measures and with the logging sink
+(its logger being disabled).
+
+    python benchmarks/instrumentation.py --iterations 10000
+"""
+import argparse
+
+from utils import measure, report, setup
+
+
+class NullSink(object):
+    def record(self, operation):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=5000)
+    args = parser.parse_args()
+
+    setup()
+
+    from sequere.backends.redis import RedisBackend
+    from sequere.compat import User
+    from sequere.instrumentation import LoggingSink, instruments
+
+    backend = RedisBackend()
+
+    users = [User(pk=i + 1) for i in range(args.iterations + 1)]
+
+    for name, sinks in (('disabled', []),
+                        ('null sink', [NullSink()]),
+                        ('logging sink', [LoggingSink(level='debug')])):
+        backend.clear()
+
+        instruments.sinks = sinks
+
+        report('follow (%s)' % name, args.iterations,
+               measure(lambda i: backend.follow(users[i], users[i + 1]), args.iterations))
+
+        report('get_followers_count (%s)' % name, args.iterations,
+               measure(lambda i: backend.get_followers_count(users[i + 1]), args.iterations))
+
+    instruments.sinks = []
+
+    backend.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Time to fetch a page of followers at increasing depths, with offsets
+and with cursors.
+
+    python benchmarks/pagination.py --followers 1000000
+"""
+import argparse
+
+from utils import measure, report, setup
+
+PAGE_SIZE = 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--followers', type=int, default=1000000)
+    parser.add_argument('--iterations', type=int, default=100)
+    args = parser.parse_args()
+
+    setup()
+
+    from django.db import connection
+
+    from sequere.backends.redis import RedisBackend
+    from sequere.compat import User
+
+    connection.creation.create_test_db(verbosity=0)
+
+    # followers are hydrated from the database when a page is read
+    User.objects.bulk_create([User(username='user%d' % i) for i in range(args.followers + 1)],
+                             batch_size=10000)
+
+    celebrity, users = User.objects.order_by('pk')[0], list(User.objects.order_by('pk')[1:])
+
+    backend = RedisBackend(manager_class='sequere.backends.redis.managers.IdentifierInstanceManager')
+    backend.clear()
+
+    for start in range(0, args.followers, 10000):
+        backend.follow_many([(user, celebrity) for user in users[start:start + 10000]],
+                            timestamp=1000000000 + start // 10000,
+                            dispatch=False)
+
+    qs = backend.get_followers(celebrity)
+
+    key = qs.keys[0]
+
+    for page in (1, 100, 10000, args.followers // PAGE_SIZE):
+        offset = (page - 1) * PAGE_SIZE
+
+        if offset >= args.followers:
+            continue
+
+        # a new list each time, slices are cached
+        report('offset page %d' % page, args.iterations,
+               measure(lambda i: backend.get_followers(celebrity)[offset:offset + PAGE_SIZE], args.iterations))
+
+        if offset:
+            (uid, score), = backend.client.zrevrange(key, offset - 1, offset - 1, withscores=True)
+
+            cursor = (score, uid)
+        else:
+            cursor = None
+
+        report('cursor page %d' % page, args.iterations,
+               measure(lambda i: qs.page(PAGE_SIZE, after=cursor), args.iterations))
+
+    backend.clear()
+
+
+if __name__ == '__main__':
+    main()
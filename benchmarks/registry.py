@@ -0,0 +1,34 @@
+"""
+Per-call cost of the registry lookups done on every follow and per hydrated row.
+
+    python benchmarks/registry.py --iterations 100000
+"""
+import argparse
+
+from utils import measure, report, setup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=100000)
+    args = parser.parse_args()
+
+    setup()
+
+    from sequere.compat import User
+    from sequere.registry import registry
+
+    user = User(pk=1)
+
+    report('registry.get_identifier(instance)', args.iterations,
+           measure(lambda i: registry.get_identifier(user), args.iterations))
+
+    report('registry.get_identifier(model)', args.iterations,
+           measure(lambda i: registry.get_identifier(User), args.iterations))
+
+    report('registry.identifiers.get(identifier)', args.iterations,
+           measure(lambda i: registry.identifiers.get('user'), args.iterations))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Write cost of the filtered timelines maintained on save (index mode) against
+the read cost of the filtered views built on read (view mode).
+
+    python benchmarks/timeline_filters.py --actions 10000
+"""
+import argparse
+
+from utils import measure, report, setup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--actions', type=int, default=10000)
+    parser.add_argument('--iterations', type=int, default=100)
+    args = parser.parse_args()
+
+    setup()
+
+    from django.db import connection
+    from django.test.utils import override_settings
+
+    from sequere import app
+    from sequere.backends.redis import RedisBackend
+    from sequere.compat import User
+    from sequere.contrib.timeline.backends.redis import RedisBackend as RedisTimelineBackend
+    from sequere.tests.models import Project
+    from sequere.tests.sequere_registry import JoinAction, LikeAction
+
+    connection.creation.create_test_db(verbosity=0)
+
+    actor = User.objects.create(username='actor')
+    reader = User.objects.create(username='reader')
+    project = Project.objects.create(name='project')
+
+    app.backend = RedisBackend(manager_class='sequere.backends.redis.managers.IdentifierInstanceManager')
+
+    for mode in ('index', 'view'):
+        with override_settings(SEQUERE_TIMELINE_FILTER_MODE=mode):
+            backend = RedisTimelineBackend()
+            backend.storage.clear()
+
+            actions = []
+
+            for i in range(args.actions):
+                if i % 2:
+                    action = LikeAction(actor=actor, target=project)
+                else:
+                    action = JoinAction(actor=actor)
+
+                backend._save(action)
+
+                actions.append(action)
+
+            elapsed = measure(lambda i: backend.save(reader, actions[i]), args.actions)
+
+            report('save (%s)' % mode, args.actions, elapsed, unit='action')
+
+            keys = backend.client.keys('%s*' % backend._make_key(reader, 'private'))
+
+            print('%-40s %8d keys' % ('timeline keys (%s)' % mode, len(keys)))
+
+            for ttl in ((0, 60) if mode == 'view' else (None, )):
+                with override_settings(SEQUERE_TIMELINE_VIEW_TTL=ttl):
+                    def read(i):
+                        list(backend.get_private(reader, action=LikeAction, target=Project)[0:20])
+
+                    name = 'read (%s)' % mode if ttl is None else 'read (%s, ttl=%s)' % (mode, ttl)
+
+                    report(name, args.iterations, measure(read, args.iterations))
+
+            backend.storage.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup():
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sequere.tests.settings')
+
+    import django
+
+    django.setup()
+
+
+def measure(func, iterations):
+    start = time.time()
+
+    for i in range(iterations):
+        func(i)
+
+    return time.time() - start
+
+
+def report(name, iterations, elapsed, unit='call'):
+    print('%-40s %8d %ss in %8.3fs  %10.1f us/%s  %10.1f %ss/s' % (
+        name,
+        iterations,
+        unit,
+        elapsed,
+        elapsed / iterations * 1000000,
+        unit,
+        iterations / elapsed if elapsed else 0,
+        unit))
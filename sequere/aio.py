@@ -0,0 +1,126 @@
+"""
+Asyncio mirror of sequere.models (Python 3.6+), each call awaits the async
+backend of ``app.backend`` which shares its keys, tables and semantics.
+
+The Redis backends use redis.asyncio pipelines, the database backend uses the
+async ORM of Django 4.1+ (a thread before) and runs its writes in a thread,
+transactions being unavailable to async code.
+"""
+import asyncio
+import weakref
+
+
+class LoopLocal(object):
+    """
+    Holds a value created by ``factory`` per event loop, redis.asyncio
+    connections being bound to the loop they were opened in.
+    """
+    def __init__(self, factory):
+        self.factory = factory
+        self._values = weakref.WeakKeyDictionary()
+
+    def get(self):
+        loop = asyncio.get_event_loop()
+
+        value = self._values.get(loop)
+
+        if value is None:
+            value = self._values[loop] = self.factory()
+
+        return value
+
+
+def run_sync(func, *args, **kwargs):
+    """
+    Runs a blocking callable in the thread Django uses for synchronous code
+    and returns an awaitable of its result.
+    """
+    from asgiref.sync import sync_to_async
+
+    return sync_to_async(func)(*args, **kwargs)
+
+
+async def fetch(queryset):
+    """
+    Returns the results of a queryset as a list.
+    """
+    if hasattr(queryset, 'aiterator'):
+        return [result async for result in queryset]
+
+    return await run_sync(list, queryset)
+
+
+async def fetch_count(queryset):
+    if hasattr(queryset, 'acount'):
+        return await queryset.acount()
+
+    return await run_sync(queryset.count)
+
+
+async def fetch_exists(queryset):
+    if hasattr(queryset, 'aexists'):
+        return await queryset.aexists()
+
+    return await run_sync(queryset.exists)
+
+
+def get_backend():
+    from sequere import app
+
+    return app.backend.get_async_backend()
+
+
+async def afollow(from_instance, to_instance):
+    return await get_backend().follow(from_instance, to_instance)
+
+
+async def ais_following(from_instance, to_instance):
+    return await get_backend().is_following(from_instance, to_instance)
+
+
+async def ais_following_many(from_instance, to_instances):
+    return await get_backend().is_following_many(from_instance, to_instances)
+
+
+async def aunfollow(from_instance, to_instance):
+    return await get_backend().unfollow(from_instance, to_instance)
+
+
+async def abulk_follow(from_instance, to_instances):
+    return await get_backend().bulk_follow(from_instance, to_instances)
+
+
+async def abulk_unfollow(from_instance, to_instances):
+    return await get_backend().bulk_unfollow(from_instance, to_instances)
+
+
+async def abulk_add_followers(to_instance, from_instances):
+    return await get_backend().bulk_add_followers(to_instance, from_instances)
+
+
+async def aget_followings(instance, *args, **kwargs):
+    return await get_backend().get_followings(instance, *args, **kwargs)
+
+
+async def aget_followings_count(instance, *args, **kwargs):
+    return await get_backend().get_followings_count(instance, *args, **kwargs)
+
+
+async def aget_followers_count(instance, *args, **kwargs):
+    return await get_backend().get_followers_count(instance, *args, **kwargs)
+
+
+async def aget_counts(instances, *args, **kwargs):
+    return await get_backend().get_counts(instances, *args, **kwargs)
+
+
+async def aget_followers(instance, *args, **kwargs):
+    return await get_backend().get_followers(instance, *args, **kwargs)
+
+
+async def aget_friends_count(instance, *args, **kwargs):
+    return await get_backend().get_friends_count(instance, *args, **kwargs)
+
+
+async def aget_friends(instance, *args, **kwargs):
+    return await get_backend().get_friends(instance, *args, **kwargs)
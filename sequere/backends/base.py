@@ -1,24 +1,70 @@
+from sequere.utils import load_class
+
+COUNT_KINDS = ('followers', 'followings', 'friends', )
+
+
 class BaseBackend(object):
+    async_backend_class = None
+
+    def get_async_backend(self):
+        """
+        Returns the asyncio mirror of the backend (see sequere.aio), created
+        once per backend.
+        """
+        if self.async_backend_class is None:
+            raise NotImplementedError('%s has no asyncio mirror' % self.__class__.__name__)
+
+        if getattr(self, '_async_backend', None) is None:
+            self._async_backend = load_class(self.async_backend_class)(self)
+
+        return self._async_backend
+
     def follow(self, from_instance, to_instance):
-        raise NotImplemented
+        raise NotImplementedError
 
     def unfollow(self, from_instance, to_instance):
-        raise NotImplemented
+        raise NotImplementedError
+
+    def follow_many(self, edges):
+        raise NotImplementedError
+
+    def unfollow_many(self, edges):
+        raise NotImplementedError
+
+    def bulk_follow(self, from_instance, to_instances):
+        return self.follow_many([(from_instance, to_instance) for to_instance in to_instances])
+
+    def bulk_unfollow(self, from_instance, to_instances):
+        return self.unfollow_many([(from_instance, to_instance) for to_instance in to_instances])
+
+    def bulk_add_followers(self, to_instance, from_instances):
+        return self.follow_many([(from_instance, to_instance) for from_instance in from_instances])
 
     def get_followers(self, instance):
-        raise NotImplemented
+        raise NotImplementedError
 
     def get_followings(self, instance):
-        raise NotImplemented
+        raise NotImplementedError
 
     def is_following(self, from_instance, to_instance):
-        raise NotImplemented
+        raise NotImplementedError
+
+    def is_following_many(self, from_instance, to_instances):
+        return dict((to_instance, self.is_following(from_instance, to_instance))
+                    for to_instance in to_instances)
 
     def get_followings_count(self, instance):
-        raise NotImplemented
+        raise NotImplementedError
 
     def get_followers_count(self, instance):
-        raise NotImplemented
+        raise NotImplementedError
+
+    def get_counts(self, instances, kinds=COUNT_KINDS, identifiers=(None, )):
+        return dict((instance, dict(((kind, identifier),
+                                     getattr(self, 'get_%s_count' % kind)(instance, identifier=identifier))
+                                    for kind in kinds
+                                    for identifier in identifiers))
+                    for instance in instances)
 
     def clear(self):
-        raise NotImplemented
+        raise NotImplementedError
@@ -0,0 +1,149 @@
+from collections import defaultdict
+
+import six
+
+from sequere.aio import fetch, fetch_count, fetch_exists, run_sync
+from sequere.backends.base import COUNT_KINDS
+from sequere.registry import registry
+
+
+class AsyncDatabaseBackend(object):
+    """
+    Asyncio mirror of DatabaseBackend, reads use the async ORM and writes,
+    which need a transaction, run the synchronous backend in a thread.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+        self.model = backend.model
+        self.counter_model = backend.counter_model
+
+    async def follow(self, from_instance, to_instance):
+        return await run_sync(self.backend.follow, from_instance, to_instance)
+
+    async def unfollow(self, from_instance, to_instance):
+        return await run_sync(self.backend.unfollow, from_instance, to_instance)
+
+    async def follow_many(self, edges):
+        return await run_sync(self.backend.follow_many, edges)
+
+    async def unfollow_many(self, edges):
+        return await run_sync(self.backend.unfollow_many, edges)
+
+    async def bulk_follow(self, from_instance, to_instances):
+        return await self.follow_many([(from_instance, to_instance) for to_instance in to_instances])
+
+    async def bulk_unfollow(self, from_instance, to_instances):
+        return await self.unfollow_many([(from_instance, to_instance) for to_instance in to_instances])
+
+    async def bulk_add_followers(self, to_instance, from_instances):
+        return await self.follow_many([(from_instance, to_instance) for from_instance in from_instances])
+
+    async def retrieve_instances(self, transformer, *, start=0, stop=None):
+        """
+        Returns the couples (instance, date) of a transformer of the
+        synchronous backend between the ranks ``start`` and ``stop``, one
+        query is done per identifier.
+        """
+        qs = transformer.qs.order_by(*transformer.get_ordering(transformer.desc))
+
+        values = await fetch(qs[start:stop].values(*transformer.keys))
+
+        identifier_ids = defaultdict(dict)
+
+        for value in values:
+            identifier_ids[value[transformer.aggregate_key]][value[transformer.pivot_key]] = None
+
+        for identifier, objects in six.iteritems(identifier_ids):
+            model = registry.identifiers.get(identifier)
+
+            for result in await fetch(model.objects.filter(pk__in=list(objects))):
+                objects[result.pk] = result
+
+        return [(identifier_ids[value[transformer.aggregate_key]][value[transformer.pivot_key]],
+                 value[transformer.sorting_key])
+                for value in values]
+
+    async def get_followers(self, instance, desc=True, identifier=None, *, start=0, stop=None):
+        return await self.retrieve_instances(self.backend.get_followers(instance, desc=desc, identifier=identifier),
+                                             start=start, stop=stop)
+
+    async def get_followings(self, instance, desc=True, identifier=None, *, start=0, stop=None):
+        return await self.retrieve_instances(self.backend.get_followings(instance, desc=desc, identifier=identifier),
+                                             start=start, stop=stop)
+
+    async def get_friends(self, instance, identifier=None, desc=True, *, start=0, stop=None):
+        return await self.retrieve_instances(self.backend.get_friends(instance, identifier=identifier, desc=desc),
+                                             start=start, stop=stop)
+
+    async def is_following(self, from_instance, to_instance):
+        return await fetch_exists(self.model.objects.from_instance(from_instance).to_instance(to_instance).using(
+            self.backend.router.get(from_instance, to_instance)))
+
+    async def is_following_many(self, from_instance, to_instances):
+        to_instances = list(to_instances)
+
+        edges = [(from_instance, to_instance) for to_instance in to_instances]
+
+        if not edges:
+            return {}
+
+        existing = set(await fetch(self.model.objects.filter(self.backend._edges_q(edges)).using(
+            self.backend.router.get(from_instance, *to_instances)).values_list('to_identifier', 'to_object_id')))
+
+        return dict((to_instance, (registry.get_identifier(to_instance), to_instance.pk) in existing)
+                    for to_instance in to_instances)
+
+    async def get_counts(self, instances, kinds=COUNT_KINDS, identifiers=(None, )):
+        instances = list(instances)
+
+        counts, queries = self.backend._get_count_queries(instances, kinds, identifiers)
+
+        using = self.backend.router.get(*instances)
+
+        for qs, add_row in queries:
+            for row in await fetch(qs.using(using)):
+                add_row(row)
+
+        return counts
+
+    async def _get_counter(self, instance, kind, identifier=None):
+        result = await fetch(self.counter_model.objects.get_count_queryset(instance, kind, identifier).using(
+            self.backend.router.get(instance))[:1])
+
+        if result:
+            return result[0]
+
+        return 0
+
+    async def get_followings_count(self, instance, identifier=None):
+        if self.backend.counters:
+            return await self._get_counter(instance, self.counter_model.FOLLOWINGS, identifier)
+
+        qs = self.model.objects.from_instance(instance).using(self.backend.router.get(instance))
+
+        if identifier:
+            qs = qs.filter(to_identifier=identifier)
+
+        return await fetch_count(qs)
+
+    async def get_followers_count(self, instance, identifier=None):
+        if self.backend.counters:
+            return await self._get_counter(instance, self.counter_model.FOLLOWERS, identifier)
+
+        qs = self.model.objects.to_instance(instance).using(self.backend.router.get(instance))
+
+        if identifier:
+            qs = qs.filter(from_identifier=identifier)
+
+        return await fetch_count(qs)
+
+    async def get_friends_count(self, instance, identifier=None):
+        if self.backend.counters:
+            return await self._get_counter(instance, self.counter_model.FRIENDS, identifier)
+
+        qs = self.model.objects.from_instance(instance).filter(is_mutual=True).using(self.backend.router.get(instance))
+
+        if identifier:
+            qs = qs.filter(to_identifier=identifier)
+
+        return await fetch_count(qs)
@@ -1,20 +1,39 @@
+from django.apps import apps
 from django.core.exceptions import ImproperlyConfigured
-from django.db.models import Q
+import operator
 
-from sequere.backends.base import BaseBackend
+from collections import defaultdict
+from functools import partial, reduce
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q
+
+import six
+
+from sequere.backends.base import BaseBackend, COUNT_KINDS
+from sequere.instrumentation import instrument
 from sequere.registry import registry
-from sequere.signals import followed, unfollowed
+from sequere.replicas import ReadRouter
+from sequere.signals import followed, unfollowed, bulk_followed, bulk_unfollowed
+from sequere.utils import unique_edges
 
 from .query import DatabaseQuerySetTransformer
 
 
 class DatabaseBackend(BaseBackend):
+    async_backend_class = 'sequere.backends.database.aio.AsyncDatabaseBackend'
+
     def __init__(self, *args, **kwargs):
-        from .models import Follow
+        from .models import Follow, FollowCounter
 
         self.model = Follow
+        self.counter_model = FollowCounter
+        self.counters = kwargs.get('counters', False)
+
+        # reads are sent to the database aliases of the replicas
+        self.router = ReadRouter(None, kwargs.get('replicas', []), **kwargs.get('replica_options', {}))
 
-        if not self.model._meta.installed:
+        if not apps.is_installed('sequere.backends.database'):
             raise ImproperlyConfigured(
                 "The sequere.backends.database app isn't installed "
                 "correctly. Make sure it's in your INSTALLED_APPS setting.")
@@ -40,41 +59,186 @@ class DatabaseBackend(BaseBackend):
 
         return params
 
+    def _update_counters(self, from_instance, to_instance, delta, mutual=False):
+        from_identifier = registry.get_identifier(from_instance)
+
+        to_identifier = registry.get_identifier(to_instance)
+
+        counters = [
+            (from_instance, self.counter_model.FOLLOWINGS, to_identifier),
+            (to_instance, self.counter_model.FOLLOWERS, from_identifier),
+        ]
+
+        if mutual:
+            counters += [
+                (from_instance, self.counter_model.FRIENDS, to_identifier),
+                (to_instance, self.counter_model.FRIENDS, from_identifier),
+            ]
+
+        for instance, kind, identifier in counters:
+            self.counter_model.objects.incr(instance, kind, delta=delta)
+            self.counter_model.objects.incr(instance, kind, identifier, delta=delta)
+
+    @instrument('follow')
     def follow(self, from_instance, to_instance):
-        new, created = self.model.objects.get_or_create(**self._params(from_instance=from_instance,
-                                                                       to_instance=to_instance))
+        with transaction.atomic():
+            new, created = self.model.objects.get_or_create(**self._params(from_instance=from_instance,
+                                                                           to_instance=to_instance))
+
+            mutual = self._is_following(to_instance, from_instance)
+
+            if mutual:
+                self.model.objects.filter(
+                    Q(**self._params(from_instance=from_instance,
+                                     to_instance=to_instance)) |
+                    Q(**self._params(to_instance=from_instance,
+                                     from_instance=to_instance))).update(is_mutual=True)
+
+            if created and self.counters:
+                self._update_counters(from_instance, to_instance, 1, mutual=mutual)
 
         if created:
+            self.router.pin([from_instance, to_instance])
+
             followed.send(sender=self.model,
                           from_instance=from_instance,
                           to_instance=to_instance)
 
-        if self.is_following(to_instance, from_instance):
-            self.model.objects.filter(
-                Q(**self._params(from_instance=from_instance,
-                                 to_instance=to_instance)) |
-                Q(**self._params(to_instance=from_instance,
-                                 from_instance=to_instance))).update(is_mutual=True)
-
         return new
 
+    @instrument('unfollow')
     def unfollow(self, from_instance, to_instance):
-        if self.is_following(to_instance, from_instance):
-            self.model.objects.from_instance(to_instance).to_instance(from_instance).update(is_mutual=False)
+        with transaction.atomic():
+            mutual = self._is_following(to_instance, from_instance)
+
+            if mutual:
+                self.model.objects.from_instance(to_instance).to_instance(from_instance).update(is_mutual=False)
 
-        qs = self.model.objects.from_instance(from_instance).to_instance(to_instance)
+            qs = self.model.objects.from_instance(from_instance).to_instance(to_instance)
 
-        count = qs.count()
+            count = qs.count()
 
-        qs.delete()
+            qs.delete()
+
+            if count and self.counters:
+                self._update_counters(from_instance, to_instance, -1, mutual=mutual)
 
         if count:
+            self.router.pin([from_instance, to_instance])
+
             unfollowed.send(sender=self.model,
                             from_instance=from_instance,
                             to_instance=to_instance)
 
+    def _edges_q(self, edges):
+        """
+        Builds a filter matching the edges, grouped by their common side.
+        """
+        froms = defaultdict(list)
+        tos = defaultdict(list)
+
+        for from_instance, to_instance in edges:
+            from_identifier = registry.get_identifier(from_instance)
+            to_identifier = registry.get_identifier(to_instance)
+
+            froms[(from_identifier, from_instance.pk, to_identifier)].append(to_instance.pk)
+            tos[(to_identifier, to_instance.pk, from_identifier)].append(from_instance.pk)
+
+        if len(froms) <= len(tos):
+            filters = [Q(from_identifier=from_identifier, from_object_id=from_object_id,
+                         to_identifier=to_identifier, to_object_id__in=ids)
+                       for (from_identifier, from_object_id, to_identifier), ids in six.iteritems(froms)]
+        else:
+            filters = [Q(to_identifier=to_identifier, to_object_id=to_object_id,
+                         from_identifier=from_identifier, from_object_id__in=ids)
+                       for (to_identifier, to_object_id, from_identifier), ids in six.iteritems(tos)]
+
+        return reduce(operator.or_, filters)
+
+    def _existing_edges(self, edges, using=None):
+        if not edges:
+            return set()
+
+        existing = set(self.model.objects.filter(self._edges_q(edges)).using(using).values_list('from_identifier',
+                                                                                              'from_object_id',
+                                                                                              'to_identifier',
+                                                                                              'to_object_id'))
+
+        return set((from_instance, to_instance) for from_instance, to_instance in edges
+                   if (registry.get_identifier(from_instance), from_instance.pk,
+                       registry.get_identifier(to_instance), to_instance.pk) in existing)
+
+    @instrument('follow_many')
+    def follow_many(self, edges):
+        edges = unique_edges(edges)
+
+        with transaction.atomic():
+            existing = self._existing_edges(edges)
+
+            created = [edge for edge in edges if edge not in existing]
+
+            try:
+                with transaction.atomic():
+                    self.model.objects.bulk_create([self.model(**self._params(from_instance=from_instance,
+                                                                              to_instance=to_instance))
+                                                    for from_instance, to_instance in created])
+            except IntegrityError:
+                created = [(from_instance, to_instance) for from_instance, to_instance in created
+                           if self.model.objects.get_or_create(**self._params(from_instance=from_instance,
+                                                                              to_instance=to_instance))[1]]
+
+            mutuals = self._existing_edges([(to_instance, from_instance) for from_instance, to_instance in created])
+
+            if mutuals:
+                self.model.objects.filter(
+                    self._edges_q(list(mutuals)) |
+                    self._edges_q([(from_instance, to_instance) for to_instance, from_instance in mutuals])
+                ).update(is_mutual=True)
+
+            if self.counters:
+                for from_instance, to_instance in created:
+                    self._update_counters(from_instance, to_instance, 1,
+                                          mutual=(to_instance, from_instance) in mutuals)
+
+        if created:
+            self.router.pin_edges(created)
+
+            bulk_followed.send(sender=self.model, edges=created)
+
+        return created
+
+    @instrument('unfollow_many')
+    def unfollow_many(self, edges):
+        edges = unique_edges(edges)
+
+        with transaction.atomic():
+            existing = self._existing_edges(edges)
+
+            deleted = [edge for edge in edges if edge in existing]
+
+            if not deleted:
+                return deleted
+
+            mutuals = self._existing_edges([(to_instance, from_instance) for from_instance, to_instance in deleted])
+
+            if mutuals:
+                self.model.objects.filter(self._edges_q(list(mutuals))).update(is_mutual=False)
+
+            self.model.objects.filter(self._edges_q(deleted)).delete()
+
+            if self.counters:
+                for from_instance, to_instance in deleted:
+                    self._update_counters(from_instance, to_instance, -1,
+                                          mutual=(to_instance, from_instance) in mutuals)
+
+        self.router.pin_edges(deleted)
+
+        bulk_unfollowed.send(sender=self.model, edges=deleted)
+
+        return deleted
+
     def get_followers(self, instance, desc=True, identifier=None):
-        qs = self.model.objects.to_instance(instance)
+        qs = self.model.objects.to_instance(instance).using(self.router.get(instance))
 
         if identifier:
             qs = qs.filter(from_identifier=identifier)
@@ -83,8 +247,7 @@ class DatabaseBackend(BaseBackend):
 
         qs.order_by(order_by)
 
-        count = self.get_followers_count(instance,
-                                         identifier=identifier)
+        count = partial(self.get_followers_count, instance, identifier=identifier)
 
         transformer = DatabaseQuerySetTransformer(qs, count)
         transformer.aggregate_by('from_identifier')
@@ -94,7 +257,7 @@ class DatabaseBackend(BaseBackend):
         return transformer
 
     def get_followings(self, instance, desc=True, identifier=None):
-        qs = self.model.objects.from_instance(instance)
+        qs = self.model.objects.from_instance(instance).using(self.router.get(instance))
 
         if identifier:
             qs = qs.filter(to_identifier=identifier)
@@ -103,8 +266,7 @@ class DatabaseBackend(BaseBackend):
 
         qs.order_by(order_by)
 
-        count = self.get_followings_count(instance,
-                                          identifier=identifier)
+        count = partial(self.get_followings_count, instance, identifier=identifier)
 
         transformer = DatabaseQuerySetTransformer(qs, count)
 
@@ -114,11 +276,114 @@ class DatabaseBackend(BaseBackend):
 
         return transformer
 
+    @instrument('is_following')
     def is_following(self, from_instance, to_instance):
-        return self.model.objects.from_instance(from_instance).to_instance(to_instance).exists()
+        return self._is_following(from_instance, to_instance, using=self.router.get(from_instance, to_instance))
+
+    def _is_following(self, from_instance, to_instance, using=None):
+        return self.model.objects.from_instance(from_instance).to_instance(to_instance).using(using).exists()
+
+    @instrument('is_following_many')
+    def is_following_many(self, from_instance, to_instances):
+        to_instances = list(to_instances)
+
+        existing = self._existing_edges([(from_instance, to_instance) for to_instance in to_instances],
+                                        using=self.router.get(from_instance, *to_instances))
+
+        return dict((to_instance, (from_instance, to_instance) in existing)
+                    for to_instance in to_instances)
+
+    def _instances_q(self, instances, prefix):
+        ids = defaultdict(list)
+
+        for instance in instances:
+            ids[registry.get_identifier(instance)].append(instance.pk)
+
+        return reduce(operator.or_, [Q(**{'%sidentifier' % prefix: identifier,
+                                          '%sobject_id__in' % prefix: object_ids})
+                                     for identifier, object_ids in six.iteritems(ids)])
+
+    @instrument('get_counts')
+    def get_counts(self, instances, kinds=COUNT_KINDS, identifiers=(None, )):
+        instances = list(instances)
+
+        counts, queries = self._get_count_queries(instances, kinds, identifiers)
+
+        using = self.router.get(*instances)
+
+        for qs, add_row in queries:
+            for row in qs.using(using):
+                add_row(row)
+
+        return counts
+
+    def _get_count_queries(self, instances, kinds, identifiers):
+        """
+        Returns the counts of get_counts initialized to zero and the
+        (queryset, add_row) couples filling them, each row of a queryset
+        being passed to its add_row.
+        """
+        keys = dict(((registry.get_identifier(instance), instance.pk), instance) for instance in instances)
+
+        counts = dict((instance, dict(((kind, identifier), 0)
+                                      for kind in kinds
+                                      for identifier in identifiers))
+                      for instance in instances)
 
+        if not instances:
+            return counts, []
+
+        def add(key, kind, identifier, count):
+            instance = keys.get(key)
+
+            if instance is not None and (kind, identifier) in counts[instance]:
+                counts[instance][(kind, identifier)] += count
+
+        if self.counters:
+            rows = (self.counter_model.objects
+                    .filter(self._instances_q(instances, ''),
+                            kind__in=kinds,
+                            sub_identifier__in=[identifier or '' for identifier in identifiers])
+                    .values_list('identifier', 'object_id', 'kind', 'sub_identifier', 'count'))
+
+            def add_counter(row):
+                identifier, object_id, kind, sub_identifier, count = row
+
+                add((identifier, object_id), kind, sub_identifier or None, count)
+
+            return counts, [(rows, add_counter)]
+
+        aggregates = {
+            'followers': (self.model.objects.filter(self._instances_q(instances, 'to_')),
+                          ('to_identifier', 'to_object_id', 'from_identifier')),
+            'followings': (self.model.objects.filter(self._instances_q(instances, 'from_')),
+                           ('from_identifier', 'from_object_id', 'to_identifier')),
+            'friends': (self.model.objects.filter(self._instances_q(instances, 'from_'), is_mutual=True),
+                        ('from_identifier', 'from_object_id', 'to_identifier')),
+        }
+
+        queries = []
+
+        for kind in kinds:
+            qs, fields = aggregates[kind]
+
+            def add_aggregate(row, kind=kind, fields=fields):
+                identifier, object_id, sub_identifier = [row[field] for field in fields]
+
+                add((identifier, object_id), kind, None, row['count'])
+                add((identifier, object_id), kind, sub_identifier, row['count'])
+
+            queries.append((qs.order_by().values(*fields).annotate(count=Count('id')), add_aggregate))
+
+        return counts, queries
+
+    @instrument('get_followings_count')
     def get_followings_count(self, instance, identifier=None):
-        qs = self.model.objects.from_instance(instance)
+        if self.counters:
+            return self.counter_model.objects.get_count(instance, self.counter_model.FOLLOWINGS, identifier,
+                                                        using=self.router.get(instance))
+
+        qs = self.model.objects.from_instance(instance).using(self.router.get(instance))
 
         if identifier:
             qs = qs.filter(to_identifier=identifier)
@@ -126,7 +391,7 @@ class DatabaseBackend(BaseBackend):
         return qs.count()
 
     def get_friends(self, instance, identifier=None, desc=True):
-        qs = self.model.objects.from_instance(instance).filter(is_mutual=True)
+        qs = self.model.objects.from_instance(instance).filter(is_mutual=True).using(self.router.get(instance))
 
         if identifier:
             qs = qs.filter(to_identifier=identifier)
@@ -135,8 +400,7 @@ class DatabaseBackend(BaseBackend):
 
         qs.order_by(order_by)
 
-        count = self.get_followings_count(instance,
-                                          identifier=identifier)
+        count = partial(self.get_friends_count, instance, identifier=identifier)
 
         transformer = DatabaseQuerySetTransformer(qs, count)
 
@@ -146,16 +410,26 @@ class DatabaseBackend(BaseBackend):
 
         return transformer
 
+    @instrument('get_friends_count')
     def get_friends_count(self, instance, identifier=None):
-        qs = self.model.objects.from_instance(instance).filter(is_mutual=True)
+        if self.counters:
+            return self.counter_model.objects.get_count(instance, self.counter_model.FRIENDS, identifier,
+                                                        using=self.router.get(instance))
+
+        qs = self.model.objects.from_instance(instance).filter(is_mutual=True).using(self.router.get(instance))
 
         if identifier:
             qs = qs.filter(to_identifier=identifier)
 
         return qs.count()
 
+    @instrument('get_followers_count')
     def get_followers_count(self, instance, identifier=None):
-        qs = self.model.objects.to_instance(instance)
+        if self.counters:
+            return self.counter_model.objects.get_count(instance, self.counter_model.FOLLOWERS, identifier,
+                                                        using=self.router.get(instance))
+
+        qs = self.model.objects.to_instance(instance).using(self.router.get(instance))
 
         if identifier:
             qs = qs.filter(from_identifier=identifier)
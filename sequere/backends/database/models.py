@@ -1,7 +1,8 @@
-from django.db import models
-from django.utils.encoding import python_2_unicode_compatible
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 from django.db.models.query import QuerySet
 from django.utils.functional import cached_property
+from six import python_2_unicode_compatible
 
 from sequere.registry import registry
 
@@ -36,10 +37,10 @@ class Follow(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     from_object_id = models.PositiveIntegerField()
-    from_identifier = models.CharField(max_length=50, db_index=True)
+    from_identifier = models.CharField(max_length=50)
 
     to_object_id = models.PositiveIntegerField()
-    to_identifier = models.CharField(max_length=50, db_index=True)
+    to_identifier = models.CharField(max_length=50)
 
     is_mutual = models.BooleanField(default=False)
 
@@ -48,6 +49,11 @@ class Follow(models.Model):
     class Meta:
         ordering = ['-created_at', ]
         app_label = 'sequere'
+        unique_together = ('from_identifier', 'from_object_id', 'to_identifier', 'to_object_id')
+        index_together = [
+            ('from_identifier', 'from_object_id', 'created_at'),
+            ('to_identifier', 'to_object_id', 'created_at'),
+        ]
 
     def __str__(self):
         return '[%s: %d] -> [%s: %d]' % (self.from_identifier,
@@ -66,3 +72,70 @@ class Follow(models.Model):
         model = registry.identifiers.get(self.to_identifier)
 
         return model.objects.get(pk=self.to_object_id)
+
+
+class FollowCounterManager(models.Manager):
+    def _params(self, instance, kind, identifier=None):
+        return {
+            'identifier': registry.get_identifier(instance),
+            'object_id': instance.pk,
+            'kind': kind,
+            'sub_identifier': identifier or '',
+        }
+
+    def get_count_queryset(self, instance, kind, identifier=None):
+        return self.filter(**self._params(instance, kind, identifier)).values_list('count', flat=True)
+
+    def get_count(self, instance, kind, identifier=None, using=None):
+        result = self.get_count_queryset(instance, kind, identifier).using(using)
+
+        if result:
+            return result[0]
+
+        return 0
+
+    def incr(self, instance, kind, identifier=None, delta=1):
+        params = self._params(instance, kind, identifier)
+
+        if self.filter(**params).update(count=F('count') + delta):
+            return
+
+        try:
+            with transaction.atomic():
+                self.create(count=delta, **params)
+        except IntegrityError:
+            self.filter(**params).update(count=F('count') + delta)
+
+
+@python_2_unicode_compatible
+class FollowCounter(models.Model):
+    FOLLOWERS = 'followers'
+    FOLLOWINGS = 'followings'
+    FRIENDS = 'friends'
+
+    KIND_CHOICES = (
+        (FOLLOWERS, 'followers'),
+        (FOLLOWINGS, 'followings'),
+        (FRIENDS, 'friends'),
+    )
+
+    identifier = models.CharField(max_length=50)
+    object_id = models.PositiveIntegerField()
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    sub_identifier = models.CharField(max_length=50, blank=True, default='')
+
+    count = models.IntegerField(default=0)
+
+    objects = FollowCounterManager()
+
+    class Meta:
+        app_label = 'sequere'
+        unique_together = ('identifier', 'object_id', 'kind', 'sub_identifier')
+
+    def __str__(self):
+        return '[%s: %d] %s%s: %d' % (self.identifier,
+                                      self.object_id,
+                                      self.kind,
+                                      ' (%s)' % self.sub_identifier if self.sub_identifier else '',
+                                      self.count)
@@ -1,6 +1,9 @@
 from collections import defaultdict
-from operator import itemgetter
 
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from sequere.instrumentation import instruments
 from sequere.query import QuerySetTransformer
 from sequere.registry import registry
 
@@ -16,6 +19,7 @@ class DatabaseQuerySetTransformer(QuerySetTransformer):
     def order_by(self, key):
         self.order_by = key
         self.desc = False
+        self._result_cache = {}
         self.sorting_key = key
 
         if key.startswith('-'):
@@ -40,27 +44,51 @@ class DatabaseQuerySetTransformer(QuerySetTransformer):
 
         return self
 
-    def transform(self, qs):
-        values = qs[self.start:self.stop].values(*self.keys)
+    def get_ordering(self, desc):
+        if desc:
+            return ('-%s' % self.sorting_key, '-pk')
 
-        identifier_ids = defaultdict(list)
+        return (self.sorting_key, 'pk')
 
-        orders = {}
+    def hydrate(self, values):
+        """
+        Returns the couples (instance, date) of the values keeping their order,
+        one query is done per identifier.
+        """
+        identifier_ids = defaultdict(dict)
 
         for value in values:
-            identifier_ids[value[self.aggregate_key]].append(value[self.pivot_key])
-            orders[value[self.pivot_key]] = value[self.sorting_key]
+            identifier_ids[value[self.aggregate_key]][value[self.pivot_key]] = None
+
+        with instruments.measure('hydrate', size=len(values), backend=self.__class__.__name__):
+            for identifier, objects in six.iteritems(identifier_ids):
+                model = registry.identifiers.get(identifier)
+
+                for result in model.objects.filter(pk__in=objects.keys()):
+                    objects[result.pk] = result
+
+        return [(identifier_ids[value[self.aggregate_key]][value[self.pivot_key]], value[self.sorting_key])
+                for value in values]
+
+    def transform(self, qs):
+        values = list(qs.order_by(*self.get_ordering(self.desc))[self.start:self.stop].values(*self.keys))
+
+        return self.hydrate(values)
+
+    def _fetch(self, limit, cursor=None, reverse=False):
+        desc = self.desc != reverse
 
-        for identifier, ids in six.iteritems(identifier_ids):
-            model = registry.identifiers.get(identifier)
+        qs = self.qs
 
-            results = model.objects.filter(pk__in=ids)
+        if cursor is not None:
+            value, pk = parse_datetime(cursor[0]), cursor[1]
 
-            for result in results:
-                created = orders[result.pk]
+            lookup = '%s__%s' % (self.sorting_key, 'lt' if desc else 'gt')
 
-                del orders[result.pk]
+            qs = qs.filter(Q(**{lookup: value}) |
+                           Q(**{self.sorting_key: value, 'pk__%s' % ('lt' if desc else 'gt'): pk}))
 
-                orders[result] = created
+        values = list(qs.order_by(*self.get_ordering(desc))[:limit].values(*(self.keys + ['pk'])))
 
-        return sorted(orders.items(), key=itemgetter(1), reverse=self.desc)
+        return [(result, (value[self.sorting_key].isoformat(), value['pk']))
+                for result, value in zip(self.hydrate(values), values)]
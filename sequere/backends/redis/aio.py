@@ -0,0 +1,349 @@
+import logging
+import time
+
+from functools import partial
+
+from django.core.exceptions import ImproperlyConfigured
+
+from sequere import signals
+from sequere.aio import LoopLocal, fetch, run_sync
+from sequere.backends.base import COUNT_KINDS
+from sequere.exceptions import AlreadyFollowingException, NotFollowingException, SequereException
+from sequere.registry import registry
+from sequere.utils import from_timestamp, get_client, get_setting, unique_edges
+
+from . import scripts
+from .managers import IdentifierInstanceManager, InstanceManager
+from .utils import get_key
+
+logger = logging.getLogger('sequere')
+
+FAIL_SILENTLY = get_setting('FAIL_SILENTLY')
+
+
+class AsyncRedisBackend(object):
+    """
+    Asyncio mirror of RedisBackend using a redis.asyncio client per event
+    loop (``async_client_class``) built from the options of the backend,
+    keys, scripts and uids are the ones of the synchronous backend.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+        self.manager = backend.manager
+
+        if self.manager.hash_tags:
+            raise ImproperlyConfigured('The asyncio API does not support sharded Redis clients')
+
+        self._client = LoopLocal(partial(get_client, backend.options, connection_class=backend.async_client_class,
+                                         shared=False))
+
+        # scripts are called with the client of the running loop
+        self.follow_script = self.client.register_script(scripts.FOLLOW)
+        self.unfollow_script = self.client.register_script(scripts.UNFOLLOW)
+
+    @property
+    def client(self):
+        return self._client.get()
+
+    async def send(self, signal, **kwargs):
+        """
+        Sends a signal from a thread, its receivers (the import of the
+        actions of the timeline on follow) being blocking.
+        """
+        return await run_sync(signal.send, **kwargs)
+
+    async def get_uid(self, instance):
+        return (await self.make_uids([instance]))[0]
+
+    async def get_uids(self, instances):
+        return await self.make_uids(instances)
+
+    async def _get_uids(self, instances):
+        """
+        Returns the uids of a list of instances, None for the instances
+        without uid.
+        """
+        if isinstance(self.manager, IdentifierInstanceManager):
+            return self.manager.get_uids(instances)
+
+        if not instances:
+            return []
+
+        return await self.client.mget([self.manager.make_uid_key(instance) for instance in instances])
+
+    async def make_uids(self, instances):
+        uids = await self._get_uids(instances)
+
+        missing = [i for i, uid in enumerate(uids) if not uid]
+
+        if missing:
+            async with self.client.pipeline() as pipe:
+                for i in missing:
+                    instance = instances[i]
+
+                    uids[i] = super(InstanceManager, self.manager).make_uid(data={
+                        'identifier': registry.get_identifier(instance),
+                        'object_id': instance.pk
+                    }, client=pipe)
+
+                    pipe.set(self.manager.make_uid_key(instance), uids[i])
+
+                await pipe.execute()
+
+        return uids
+
+    async def get_data_from_uid_list(self, uid_list):
+        manager = self.manager
+
+        if isinstance(manager, IdentifierInstanceManager):
+            return manager.get_data_from_uid_list(uid_list)
+
+        cached = manager.cache.get_data(uid_list) if manager.cache is not None else {}
+
+        missing = [uid for uid in uid_list if uid not in cached]
+
+        if missing:
+            async with self.client.pipeline() as pipe:
+                for uid in missing:
+                    pipe.hgetall(manager.get_uid_key(uid))
+
+                found = dict((uid, data) for uid, data in zip(missing, await pipe.execute()) if data)
+
+            if manager.cache is not None:
+                manager.cache.set_data(found)
+
+            cached.update(found)
+
+        return [cached.get(uid, {}) for uid in uid_list]
+
+    async def get_from_uid_list(self, uid_list):
+        """
+        Returns the instances of a list of uids in the same order (None when
+        missing), one query is done per identifier.
+        """
+        results = await self.get_data_from_uid_list(uid_list)
+
+        identifier_ids = self.manager.group_data(results)
+
+        found = {}
+
+        for identifier, klass, missing in self.manager.get_missing(identifier_ids):
+            for result in await fetch(klass.objects.filter(pk__in=missing)):
+                found[(identifier, result.pk)] = result
+
+        return self.manager.resolve_data(results, identifier_ids, found)
+
+    async def get_identifiers(self, uids):
+        return [data.get('identifier') for data in await self.get_data_from_uid_list(uids)]
+
+    async def _run_follow_scripts(self, script, edges, timestamp=None):
+        if not edges:
+            return []
+
+        instances = list(set(instance for edge in edges for instance in edge))
+
+        uids = dict(zip(instances, await self.make_uids(instances)))
+
+        timestamp = timestamp or int(time.time())
+
+        async with self.client.pipeline() as pipe:
+            for from_instance, to_instance in edges:
+                await script(client=pipe, **self.backend._get_follow_params(uids, from_instance, to_instance, timestamp))
+
+            results = await pipe.execute()
+
+        return [edge for edge, result in zip(edges, results) if result]
+
+    async def follow(self, from_instance, to_instance, timestamp=None,
+                     fail_silently=FAIL_SILENTLY,
+                     dispatch=True):
+
+        if from_instance == to_instance:
+            raise SequereException('%s cannot follows itself' % from_instance)
+
+        if not await self._run_follow_scripts(self.follow_script, [(from_instance, to_instance)], timestamp=timestamp):
+            if fail_silently is False:
+                raise AlreadyFollowingException('%s is already following %s' % (from_instance, to_instance))
+
+            return logger.error('%s is already following %s' % (from_instance, to_instance))
+
+        self.backend.router.pin([from_instance, to_instance])
+
+        if dispatch:
+            await self.send(signals.followed,
+                            sender=from_instance.__class__,
+                            from_instance=from_instance,
+                            to_instance=to_instance)
+
+    async def unfollow(self, from_instance, to_instance,
+                       fail_silently=FAIL_SILENTLY,
+                       dispatch=True):
+        if not await self._run_follow_scripts(self.unfollow_script, [(from_instance, to_instance)]):
+            if fail_silently is False:
+                raise NotFollowingException('%s is not following %s' % (from_instance, to_instance))
+
+            return logger.error('%s is not following %s' % (from_instance, to_instance))
+
+        self.backend.router.pin([from_instance, to_instance])
+
+        if dispatch:
+            await self.send(signals.unfollowed,
+                            sender=from_instance.__class__,
+                            from_instance=from_instance,
+                            to_instance=to_instance)
+
+    async def follow_many(self, edges, timestamp=None, dispatch=True):
+        created = await self._run_follow_scripts(self.follow_script, unique_edges(edges), timestamp=timestamp)
+
+        self.backend.router.pin_edges(created)
+
+        if created and dispatch:
+            await self.send(signals.bulk_followed, sender=self.backend.__class__, edges=created)
+
+        return created
+
+    async def unfollow_many(self, edges, dispatch=True):
+        deleted = await self._run_follow_scripts(self.unfollow_script, unique_edges(edges))
+
+        self.backend.router.pin_edges(deleted)
+
+        if deleted and dispatch:
+            await self.send(signals.bulk_unfollowed, sender=self.backend.__class__, edges=deleted)
+
+        return deleted
+
+    async def bulk_follow(self, from_instance, to_instances):
+        return await self.follow_many([(from_instance, to_instance) for to_instance in to_instances])
+
+    async def bulk_unfollow(self, from_instance, to_instances):
+        return await self.unfollow_many([(from_instance, to_instance) for to_instance in to_instances])
+
+    async def bulk_add_followers(self, to_instance, from_instances):
+        return await self.follow_many([(from_instance, to_instance) for from_instance in from_instances])
+
+    async def retrieve_instances(self, instance, name, desc=True, identifier=None, *, start=0, stop=None):
+        """
+        Returns the couples (instance, date) of a list of an instance between
+        the ranks ``start`` and ``stop``, in the order of the synchronous
+        querysets.
+        """
+        uid = (await self._get_uids([instance]))[0]
+
+        if not uid:
+            return []
+
+        key = self.manager.get_uid_key(uid, name, identifier)
+
+        method = self.client.zrevrange if desc else self.client.zrange
+
+        scores = await method(key, start, -1 if stop is None else stop - 1, withscores=True)
+
+        objects = await self.get_from_uid_list([uid for uid, score in scores])
+
+        return [(objects[i], from_timestamp(score)) for i, (uid, score) in enumerate(scores)]
+
+    async def get_followers(self, instance, desc=True, identifier=None, *, start=0, stop=None):
+        return await self.retrieve_instances(instance, 'followers', desc=desc, identifier=identifier,
+                                             start=start, stop=stop)
+
+    async def get_followings(self, instance, desc=True, identifier=None, *, start=0, stop=None):
+        return await self.retrieve_instances(instance, 'followings', desc=desc, identifier=identifier,
+                                             start=start, stop=stop)
+
+    async def get_friends(self, instance, desc=True, identifier=None, *, start=0, stop=None):
+        return await self.retrieve_instances(instance, 'friends', desc=desc, identifier=identifier,
+                                             start=start, stop=stop)
+
+    async def get_following_uids(self, instance, uids):
+        """
+        Returns the uids among ``uids`` followed by an instance.
+        """
+        from_uid = (await self._get_uids([instance]))[0]
+
+        if not from_uid:
+            return []
+
+        key = self.manager.get_uid_key(from_uid, 'followings')
+
+        async with self.client.pipeline() as pipe:
+            for uid in uids:
+                pipe.zscore(key, uid)
+
+            return [uid for uid, score in zip(uids, await pipe.execute()) if score is not None]
+
+    async def intersect_following_uids(self, instance, key):
+        """
+        Returns the uids of the set ``key``, stored by the server of the
+        backend, followed by an instance, intersected by the server.
+        """
+        from_uid = (await self._get_uids([instance]))[0]
+
+        if not from_uid:
+            return []
+
+        followings_key = self.manager.get_uid_key(from_uid, 'followings')
+
+        dest = get_key(followings_key, 'intersection')
+
+        async with self.client.pipeline() as pipe:
+            pipe.zinterstore(dest, [followings_key, key])
+            pipe.zrange(dest, 0, -1)
+            pipe.delete(dest)
+
+            return (await pipe.execute())[1]
+
+    async def is_following(self, from_instance, to_instance):
+        return (await self.is_following_many(from_instance, [to_instance]))[to_instance]
+
+    async def is_following_many(self, from_instance, to_instances):
+        to_instances = list(to_instances)
+
+        uids = await self._get_uids([from_instance] + to_instances)
+
+        from_uid, to_uids = uids[0], uids[1:]
+
+        if not from_uid:
+            return dict((to_instance, False) for to_instance in to_instances)
+
+        key = self.manager.get_uid_key(from_uid, 'followings')
+
+        async with self.client.pipeline() as pipe:
+            for to_uid in to_uids:
+                pipe.zscore(key, '%s' % to_uid)
+
+            results = await pipe.execute()
+
+        return dict((to_instance, bool(to_uid) and result is not None)
+                    for to_instance, to_uid, result in zip(to_instances, to_uids, results))
+
+    async def get_counts(self, instances, kinds=COUNT_KINDS, identifiers=(None, )):
+        instances = list(instances)
+
+        keys = [(instance, uid, kind, identifier)
+                for instance, uid in zip(instances, await self._get_uids(instances))
+                for kind in kinds
+                for identifier in identifiers]
+
+        results = await self.client.mget([self.manager.get_uid_key(uid, kind, identifier, 'count')
+                                          for instance, uid, kind, identifier in keys]) if keys else []
+
+        counts = dict((instance, {}) for instance in instances)
+
+        for (instance, uid, kind, identifier), result in zip(keys, results):
+            counts[instance][(kind, identifier)] = int(result) if uid and result else 0
+
+        return counts
+
+    async def get_count(self, instance, kind, identifier=None):
+        counts = await self.get_counts([instance], kinds=(kind, ), identifiers=(identifier, ))
+
+        return counts[instance][(kind, identifier)]
+
+    async def get_followers_count(self, instance, identifier=None):
+        return await self.get_count(instance, 'followers', identifier=identifier)
+
+    async def get_followings_count(self, instance, identifier=None):
+        return await self.get_count(instance, 'followings', identifier=identifier)
+
+    async def get_friends_count(self, instance, identifier=None):
+        return await self.get_count(instance, 'friends', identifier=identifier)
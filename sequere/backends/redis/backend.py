@@ -3,17 +3,21 @@ from __future__ import unicode_literals
 import time
 import logging
 
+from functools import partial
 
-from sequere.backends.base import BaseBackend
+
+from sequere.backends.base import BaseBackend, COUNT_KINDS
 from sequere.registry import registry
 from sequere.exceptions import AlreadyFollowingException, NotFollowingException, SequereException
 from sequere import signals
-from sequere.utils import get_client, get_setting
+from sequere.instrumentation import instrument
+from sequere.replicas import ReadRouter
+from sequere.utils import get_client, get_setting, load_class, unique_edges
 
-from .managers import InstanceManager
+from . import scripts
 from .utils import get_key
 
-from .query import RedisQuerySetTransformer
+from .query import RedisQuerySetTransformer, zrange_after
 
 logger = logging.getLogger('sequere')
 
@@ -21,193 +25,466 @@ FAIL_SILENTLY = get_setting('FAIL_SILENTLY')
 
 
 class RedisBackend(BaseBackend):
+    async_backend_class = 'sequere.backends.redis.aio.AsyncRedisBackend'
+
     def __init__(self, *args, **kwargs):
         kwargs.setdefault('client_class', 'redis.StrictRedis')
+        kwargs.setdefault('async_client_class', 'redis.asyncio.StrictRedis')
         kwargs.setdefault('options', {'decode_responses': True})
         kwargs.setdefault('prefix', 'sequere')
         kwargs.setdefault('key_separator', ':')
+        kwargs.setdefault('manager_class', 'sequere.backends.redis.managers.InstanceManager')
+        kwargs.setdefault('pool_class', get_setting('CONNECTION_POOL_CLASS'))
+        kwargs.setdefault('pool_options', get_setting('CONNECTION_POOL_OPTIONS'))
+
+        get_pooled_client = partial(get_client, connection_class=kwargs['client_class'],
+                                    pool_class=kwargs['pool_class'], pool_options=kwargs['pool_options'])
+
+        self.client = get_pooled_client(kwargs['options'])
+
+        self.options = kwargs['options']
+        self.async_client_class = kwargs['async_client_class']
+
+        self.router = ReadRouter(self.client,
+                                 [get_pooled_client(options) for options in kwargs.get('replicas', [])],
+                                 **kwargs.get('replica_options', {}))
+
+        cache = None
 
-        self.client = get_client(kwargs['options'], connection_class=kwargs['client_class'])
+        if kwargs.get('cache_class'):
+            cache = load_class(kwargs['cache_class'])(**kwargs.get('cache_options', {}))
 
-        self.manager = InstanceManager(self.client, prefix=kwargs['prefix'])
+        self.manager = load_class(kwargs['manager_class'])(self.client, prefix=kwargs['prefix'], cache=cache)
+
+        self.follow_script = self.client.register_script(scripts.FOLLOW)
+        self.unfollow_script = self.client.register_script(scripts.UNFOLLOW)
+        self.range_after_script = self.client.register_script(scripts.RANGE_AFTER)
+
+        if self.manager.hash_tags:
+            self.follow_out_script = self.client.register_script(scripts.FOLLOW_OUT)
+            self.follow_in_script = self.client.register_script(scripts.FOLLOW_IN)
+            self.follow_friends_script = self.client.register_script(scripts.FOLLOW_FRIENDS)
+            self.unfollow_side_script = self.client.register_script(scripts.UNFOLLOW_SIDE)
 
     def get_uid(self, instance):
         return self.manager.make_uid(instance)
 
+    def get_uids(self, instances):
+        return self.manager.make_uids(instances)
+
     def get_from_uid(self, uid):
         return self.manager.get_from_uid(uid)
 
-    def follow(self, from_instance, to_instance, timestamp=None,
-               fail_silently=FAIL_SILENTLY,
-               dispatch=True):
+    def get_from_uid_list(self, uids):
+        return self.manager.get_from_uid_list(uids)
 
-        if from_instance == to_instance:
-            raise SequereException('%s cannot follows itself' % from_instance)
+    def get_identifiers(self, uids):
+        """
+        Returns the identifiers of a list of uids without loading their
+        instances (None when missing).
+        """
+        return [data.get('identifier') for data in self.manager.get_data_from_uid_list(uids)]
 
-        if self.is_following(from_instance, to_instance):
-            if fail_silently is False:
-                raise AlreadyFollowingException('%s is already following %s' % (from_instance, to_instance))
+    def _get_follow_keys(self, from_uid, from_identifier, to_uid, to_identifier):
+        keys = []
 
-            return logger.error('%s is already following %s' % (from_instance, to_instance))
+        for uid, name, identifier in ((from_uid, 'followings', None),
+                                      (from_uid, 'followings', to_identifier),
+                                      (to_uid, 'followers', None),
+                                      (to_uid, 'followers', from_identifier)):
+            key = self.manager.get_uid_key(uid, name, identifier)
 
-        from_uid = self.manager.make_uid(from_instance)
+            keys += [key, get_key(key, 'count')]
 
-        to_uid = self.manager.make_uid(to_instance)
+        keys.append(self.manager.get_uid_key(to_uid, 'followings'))
 
-        from_identifier = registry.get_identifier(from_instance)
+        for uid, identifier in ((to_uid, None),
+                                (to_uid, from_identifier),
+                                (from_uid, None),
+                                (from_uid, to_identifier)):
+            key = self.manager.get_uid_key(uid, 'friends', identifier)
 
-        to_identifier = registry.get_identifier(to_instance)
+            keys += [key, get_key(key, 'count')]
 
-        prefix = self.manager.add_prefix('uid')
+        return keys
 
-        with self.client.pipeline() as pipe:
-            pipe.incr(get_key(prefix, from_uid, 'followings', 'count'))
-            pipe.incr(get_key(prefix, to_uid, 'followers', 'count'))
+    def _get_follow_params(self, uids, from_instance, to_instance, timestamp):
+        from_uid, to_uid = uids[from_instance], uids[to_instance]
+
+        return {
+            'keys': self._get_follow_keys(from_uid, registry.get_identifier(from_instance),
+                                          to_uid, registry.get_identifier(to_instance)),
+            'args': [from_uid, to_uid, timestamp or int(time.time())]
+        }
+
+    def _run_follow_script(self, script, from_instance, to_instance, timestamp=None):
+        if self.manager.hash_tags:
+            return bool(self._run_follow_scripts(script, [(from_instance, to_instance)], timestamp=timestamp))
+
+        uids = dict(zip((from_instance, to_instance),
+                        self.manager.make_uids([from_instance, to_instance])))
+
+        return script(**self._get_follow_params(uids, from_instance, to_instance, timestamp))
+
+    def _run_follow_scripts(self, script, edges, timestamp=None):
+        if not edges:
+            return []
+
+        instances = list(set(instance for edge in edges for instance in edge))
+
+        uids = dict(zip(instances, self.manager.make_uids(instances)))
+
+        timestamp = timestamp or int(time.time())
 
-            pipe.incr(get_key(prefix, from_uid, 'followings', to_identifier, 'count'))
-            pipe.incr(get_key(prefix, to_uid, 'followers', from_identifier, 'count'))
+        params = [self._get_follow_params(uids, from_instance, to_instance, timestamp)
+                  for from_instance, to_instance in edges]
 
-            timestamp = timestamp or int(time.time())
+        if self.manager.hash_tags:
+            results = self._run_sharded_steps(script, params)
+        else:
+            with self.client.pipeline() as pipe:
+                for param in params:
+                    script(client=pipe, **param)
 
-            pipe.zadd(get_key(prefix, to_uid, 'followers'), **{
-                '%s' % from_uid: timestamp
-            })
+                results = pipe.execute()
 
-            pipe.zadd(get_key(prefix, to_uid, 'followers', from_identifier), **{
-                '%s' % from_uid: timestamp
-            })
+        return [edge for edge, result in zip(edges, results) if result]
 
-            pipe.zadd(get_key(prefix, from_uid, 'followings'), **{
-                '%s' % to_uid: timestamp
-            })
+    def _get_sharded_steps(self, script, param):
+        """
+        Returns the steps (script, keys, args) of the follow or unfollow
+        script of an edge, the side of the follower first then the side of
+        the followed instance.
+        """
+        keys, (from_uid, to_uid, timestamp) = param['keys'], param['args']
 
-            pipe.zadd(get_key(prefix, from_uid, 'followings', to_identifier), **{
-                '%s' % to_uid: timestamp
-            })
+        if script is self.follow_script:
+            return [
+                (self.follow_out_script,
+                 keys[0:4] + [self.manager.get_uid_key(from_uid, 'followers')],
+                 [to_uid, timestamp]),
+                (self.follow_in_script, keys[4:13], [from_uid, timestamp]),
+            ]
 
-            if self.is_following(to_instance, from_instance):
-                pipe.incr(get_key(prefix, to_uid, 'friends', 'count'))
-                pipe.incr(get_key(prefix, to_uid, 'friends', from_identifier, 'count'))
+        return [
+            (self.unfollow_side_script, keys[0:4] + keys[13:17], [to_uid]),
+            (self.unfollow_side_script, keys[4:8] + keys[9:13], [from_uid]),
+        ]
 
-                pipe.zadd(get_key(prefix, to_uid, 'friends'), **{
-                    '%s' % from_uid: timestamp
-                })
+    def _get_friends_steps(self, param, out_result, in_result):
+        """
+        Returns the steps (script, keys, args) adding the friends of an edge
+        once its follow steps have run, FOLLOW_IN already added the friends
+        of the followed instance when it has seen the reverse edge.
+        """
+        keys, (from_uid, to_uid, timestamp) = param['keys'], param['args']
 
-                pipe.zadd(get_key(prefix, to_uid, 'friends', from_identifier), **{
-                    '%s' % from_uid: timestamp
-                })
+        steps = []
 
-                pipe.incr(get_key(prefix, from_uid, 'friends', 'count'))
-                pipe.incr(get_key(prefix, from_uid, 'friends', to_identifier, 'count'))
+        if in_result == 2 or out_result[1]:
+            steps.append((self.follow_friends_script, keys[13:17], [to_uid, timestamp]))
 
-                pipe.zadd(get_key(prefix, from_uid, 'friends'), **{
-                    '%s' % to_uid: timestamp
-                })
-                pipe.zadd(get_key(prefix, from_uid, 'friends', to_identifier), **{
-                    '%s' % to_uid: timestamp
-                })
+        if in_result != 2 and out_result[1]:
+            steps.append((self.follow_friends_script, keys[9:13], [from_uid, timestamp]))
 
-            pipe.execute()
+        return steps
+
+    def _run_sharded_steps(self, script, params):
+        """
+        Runs the follow or unfollow script of a list of edges as steps
+        touching the keys of a single uid (see scripts.FOLLOW_OUT), the
+        steps of both sides of every edge are sent at once to their shards
+        and the friends are added in a second round trip.
+
+        Returns the results of the side of the follower in the order of
+        ``params``, truthy when the edge has been added or removed.
+        """
+        with self.client.pipeline() as pipe:
+            for param in params:
+                for step, keys, args in self._get_sharded_steps(script, param):
+                    step(keys=keys, args=args, client=pipe)
+
+            results = pipe.execute()
+
+        if script is not self.follow_script:
+            return results[::2]
+
+        steps = [step
+                 for param, out_result, in_result in zip(params, results[::2], results[1::2])
+                 for step in self._get_friends_steps(param, out_result, in_result)]
+
+        if steps:
+            with self.client.pipeline() as pipe:
+                for step, keys, args in steps:
+                    step(keys=keys, args=args, client=pipe)
+
+                pipe.execute()
+
+        return [added for added, mutual in results[::2]]
+
+    @instrument('follow')
+    def follow(self, from_instance, to_instance, timestamp=None,
+               fail_silently=FAIL_SILENTLY,
+               dispatch=True):
+
+        if from_instance == to_instance:
+            raise SequereException('%s cannot follows itself' % from_instance)
+
+        if not self._run_follow_script(self.follow_script, from_instance, to_instance, timestamp=timestamp):
+            if fail_silently is False:
+                raise AlreadyFollowingException('%s is already following %s' % (from_instance, to_instance))
+
+            return logger.error('%s is already following %s' % (from_instance, to_instance))
+
+        self.router.pin([from_instance, to_instance])
 
         if dispatch:
             signals.followed.send(sender=from_instance.__class__,
                                   from_instance=from_instance,
                                   to_instance=to_instance)
 
+    @instrument('unfollow')
     def unfollow(self, from_instance, to_instance,
                  fail_silently=FAIL_SILENTLY,
                  dispatch=True):
-        if not self.is_following(from_instance, to_instance):
+        if not self._run_follow_script(self.unfollow_script, from_instance, to_instance):
             if fail_silently is False:
                 raise NotFollowingException('%s is not following %s' % (from_instance, to_instance))
 
             return logger.error('%s is not following %s' % (from_instance, to_instance))
 
-        from_uid = self.manager.make_uid(from_instance)
+        self.router.pin([from_instance, to_instance])
+
+        if dispatch:
+            signals.unfollowed.send(sender=from_instance.__class__,
+                                    from_instance=from_instance,
+                                    to_instance=to_instance)
+
+    @instrument('follow_many')
+    def follow_many(self, edges, timestamp=None, dispatch=True):
+        created = self._run_follow_scripts(self.follow_script, unique_edges(edges), timestamp=timestamp)
+
+        self.router.pin_edges(created)
+
+        if created and dispatch:
+            signals.bulk_followed.send(sender=self.__class__, edges=created)
+
+        return created
+
+    @instrument('unfollow_many')
+    def unfollow_many(self, edges, dispatch=True):
+        deleted = self._run_follow_scripts(self.unfollow_script, unique_edges(edges))
+
+        self.router.pin_edges(deleted)
 
-        to_uid = self.manager.make_uid(to_instance)
+        if deleted and dispatch:
+            signals.bulk_unfollowed.send(sender=self.__class__, edges=deleted)
 
-        from_identifier = registry.get_identifier(from_instance)
+        return deleted
 
-        to_identifier = registry.get_identifier(to_instance)
+    def _get_read_key(self, instance, client, *segments):
+        """
+        Returns the key of an instance followed by ``segments``, its uid
+        being read with the connection of its reads. Reads do not create
+        uids: the key of an instance without uid is a missing key.
+        """
+        uid = self.manager.get_uid(instance, client=client)
+
+        return self.manager.get_uid_key(uid or '', *segments)
+
+    def retrieve_instances(self, key, count, desc, client=None):
+        transformer = RedisQuerySetTransformer(self.manager, count, key=key, client=client,
+                                               range_after_script=self.range_after_script)
+        transformer.order_by(desc)
+
+        return transformer
+
+    def get_followers(self, instance, desc=True, identifier=None):
+        client = self.router.get(instance)
 
-        prefix = self.manager.add_prefix('uid')
+        key = self._get_read_key(instance, client, 'followers', identifier)
+
+        return self.retrieve_instances(key,
+                                       partial(self.get_followers_count, instance, identifier=identifier),
+                                       desc=desc,
+                                       client=client)
+
+    @instrument('get_follower_uids')
+    def get_follower_uids(self, instance, identifier=None, start=0, stop=None):
+        """
+        Returns the uids of the followers of an instance between the ranks
+        ``start`` and ``stop`` (oldest first), followers are not loaded.
+        """
+        key = self.manager.get_uid_key(self.manager.make_uid(instance), 'followers', identifier)
+
+        return self.client.zrange(key,
+                                  start,
+                                  -1 if stop is None else stop - 1)
+
+    @instrument('get_follower_windows')
+    def get_follower_windows(self, instance, chunk_size, identifier=None):
+        """
+        Splits the followers of an instance in windows of about ``chunk_size``
+        followers, (after, until, size) where ``after`` is the (score, uid)
+        cursor of the last follower before the window (None for the first
+        one) and ``until`` the cursor of its last follower. The last window
+        ends with the followers who followed before the current timestamp.
+
+        Windows are bounded by followers instead of ranks, unfollows during
+        the dispatch do not shift the following windows.
+        """
+        key = self.manager.get_uid_key(self.manager.make_uid(instance), 'followers', identifier)
+
+        cutoff = int(time.time())
+
+        count = self.client.zcount(key, '-inf', cutoff)
+
+        ranks = list(range(chunk_size - 1, count - 1, chunk_size))
 
         with self.client.pipeline() as pipe:
-            pipe.decr(get_key(prefix, from_uid, 'followings', 'count'))
-            pipe.decr(get_key(prefix, to_uid, 'followers', 'count'))
+            for rank in ranks:
+                pipe.zrange(key, rank, rank, withscores=True)
 
-            pipe.decr(get_key(prefix, from_uid, 'followings', to_identifier, 'count'))
-            pipe.decr(get_key(prefix, to_uid, 'followers', from_identifier, 'count'))
+            results = pipe.execute() if ranks else []
 
-            if self.is_following(to_instance, from_instance):
-                pipe.decr(get_key(prefix, to_uid, 'friends', 'count'))
-                pipe.decr(get_key(prefix, to_uid, 'friends', from_identifier, 'count'))
+        cursors = [(score, uid) for result in results for uid, score in result]
 
-                pipe.zrem(get_key(prefix, to_uid, 'friends'), '%s' % from_uid)
-                pipe.zrem(get_key(prefix, to_uid, 'friends', from_identifier), '%s' % from_uid)
+        windows = []
 
-                pipe.decr(get_key(prefix, from_uid, 'friends', 'count'))
-                pipe.decr(get_key(prefix, from_uid, 'friends', to_identifier, 'count'))
+        after = None
 
-                pipe.zrem(get_key(prefix, from_uid, 'friends'), '%s' % to_uid)
-                pipe.zrem(get_key(prefix, from_uid, 'friends', to_identifier), '%s' % to_uid)
+        for cursor in cursors + [(cutoff, None)]:
+            windows.append((after, cursor, min(chunk_size, count - len(windows) * chunk_size)))
 
-            pipe.zrem(get_key(prefix, to_uid, 'followers'), '%s' % from_uid)
-            pipe.zrem(get_key(prefix, to_uid, 'followers', from_identifier), '%s' % from_uid)
+            after = cursor
 
-            pipe.zrem(get_key(prefix, from_uid, 'followings'), '%s' % to_uid)
-            pipe.zrem(get_key(prefix, from_uid, 'followings', to_identifier), '%s' % to_uid)
+        return [window for window in windows if window[2] > 0]
 
-            pipe.execute()
+    @instrument('get_follower_uids_after')
+    def get_follower_uids_after(self, instance, identifier=None, cursor=None, limit=100):
+        """
+        Returns at most ``limit`` couples (uid, score) of the followers of an
+        instance (oldest first) located after the (score, uid) ``cursor``.
+        """
+        key = self.manager.get_uid_key(self.manager.make_uid(instance), 'followers', identifier)
 
-        if dispatch:
-            signals.unfollowed.send(sender=from_instance.__class__,
-                                    from_instance=from_instance,
-                                    to_instance=to_instance)
+        return zrange_after(self.client, key, limit, self.range_after_script, cursor=cursor, desc=False)
 
-    def retrieve_instances(self, key, count, desc):
-        transformer = RedisQuerySetTransformer(self.manager, count, key=key)
-        transformer.order_by(desc)
+    @instrument('get_following_uids')
+    def get_following_uids(self, instance, uids):
+        """
+        Returns the uids among ``uids`` followed by an instance.
+        """
+        key = self.manager.get_uid_key(self.manager.make_uid(instance), 'followings')
 
-        return transformer
+        with self.client.pipeline() as pipe:
+            for uid in uids:
+                pipe.zscore(key, uid)
 
-    def get_followers(self, instance, desc=True, identifier=None):
-        key = get_key('uid', self.manager.make_uid(instance), 'followers', identifier)
+            return [uid for uid, score in zip(uids, pipe.execute()) if score is not None]
+
+    @instrument('intersect_following_uids')
+    def intersect_following_uids(self, instance, key):
+        """
+        Returns the uids of the set ``key``, stored by the server of the
+        backend, followed by an instance, intersected by the server.
+        """
+        followings_key = self.manager.get_uid_key(self.manager.make_uid(instance), 'followings')
+
+        dest = get_key(followings_key, 'intersection')
+
+        with self.client.pipeline() as pipe:
+            pipe.zinterstore(dest, [followings_key, key])
+            pipe.zrange(dest, 0, -1)
+            pipe.delete(dest)
 
-        return self.retrieve_instances(self.manager.add_prefix(key),
-                                       self.get_followers_count(instance, identifier=identifier),
-                                       desc=desc)
+            return pipe.execute()[1]
 
     def get_friends(self, instance, desc=True, identifier=None):
-        key = get_key('uid', self.manager.make_uid(instance), 'friends', identifier)
+        client = self.router.get(instance)
 
-        return self.retrieve_instances(self.manager.add_prefix(key),
-                                       self.get_friends_count(instance, identifier=identifier),
-                                       desc=desc)
+        key = self._get_read_key(instance, client, 'friends', identifier)
+
+        return self.retrieve_instances(key,
+                                       partial(self.get_friends_count, instance, identifier=identifier),
+                                       desc=desc,
+                                       client=client)
 
     def get_followings(self, instance, desc=True, identifier=None):
-        key = get_key('uid', self.manager.make_uid(instance), 'followings', identifier)
+        client = self.router.get(instance)
+
+        key = self._get_read_key(instance, client, 'followings', identifier)
 
-        return self.retrieve_instances(self.manager.add_prefix(key),
-                                       self.get_followings_count(instance, identifier=identifier),
-                                       desc=desc)
+        return self.retrieve_instances(key,
+                                       partial(self.get_followings_count, instance, identifier=identifier),
+                                       desc=desc,
+                                       client=client)
 
+    @instrument('is_following')
     def is_following(self, from_instance, to_instance):
         return self._is_following(from_instance, to_instance) is not None
 
     def _is_following(self, from_instance, to_instance):
-        key = get_key('uid', self.manager.make_uid(from_instance), 'followings')
+        client = self.router.get(from_instance, to_instance)
+
+        from_uid, to_uid = self.manager.get_uids([from_instance, to_instance], client=client)
+
+        if not from_uid or not to_uid:
+            return None
+
+        return client.zrank(self.manager.get_uid_key(from_uid, 'followings'), to_uid)
+
+    @instrument('is_following_many')
+    def is_following_many(self, from_instance, to_instances):
+        to_instances = list(to_instances)
+
+        client = self.router.get(from_instance, *to_instances)
+
+        uids = self.manager.get_uids([from_instance] + to_instances, client=client)
+
+        from_uid, to_uids = uids[0], uids[1:]
+
+        if not from_uid:
+            return dict((to_instance, False) for to_instance in to_instances)
+
+        key = self.manager.get_uid_key(from_uid, 'followings')
+
+        with client.pipeline() as pipe:
+            for to_uid in to_uids:
+                pipe.zscore(key, '%s' % to_uid)
+
+            results = pipe.execute()
+
+        return dict((to_instance, bool(to_uid) and result is not None)
+                    for to_instance, to_uid, result in zip(to_instances, to_uids, results))
+
+    @instrument('get_counts')
+    def get_counts(self, instances, kinds=COUNT_KINDS, identifiers=(None, )):
+        instances = list(instances)
+
+        client = self.router.get(*instances)
+
+        keys = [(instance, uid, kind, identifier)
+                for instance, uid in zip(instances, self.manager.get_uids(instances, client=client))
+                for kind in kinds
+                for identifier in identifiers]
+
+        results = client.mget([self.manager.get_uid_key(uid, kind, identifier, 'count')
+                               for instance, uid, kind, identifier in keys]) if keys else []
+
+        counts = dict((instance, {}) for instance in instances)
 
-        result = self.client.zrank(self.manager.add_prefix(key), '%s' % self.manager.make_uid(to_instance))
+        for (instance, uid, kind, identifier), result in zip(keys, results):
+            counts[instance][(kind, identifier)] = int(result) if uid and result else 0
 
-        return result
+        return counts
 
     def _get_followings_count(self, instance, identifier=None):
-        cache_key = get_key('uid', self.manager.make_uid(instance), 'followings', identifier, 'count')
+        client = self.router.get(instance)
 
-        return self.client.get(self.manager.add_prefix(cache_key))
+        return client.get(self._get_read_key(instance, client, 'followings', identifier, 'count'))
 
+    @instrument('get_followings_count')
     def get_followings_count(self, instance, identifier=None):
         result = self._get_followings_count(instance, identifier=identifier)
 
@@ -217,10 +494,11 @@ class RedisBackend(BaseBackend):
         return 0
 
     def _get_followers_count(self, instance, identifier=None):
-        cache_key = get_key('uid', self.manager.make_uid(instance), 'followers', identifier, 'count')
+        client = self.router.get(instance)
 
-        return self.client.get(self.manager.add_prefix(cache_key))
+        return client.get(self._get_read_key(instance, client, 'followers', identifier, 'count'))
 
+    @instrument('get_followers_count')
     def get_followers_count(self, instance, identifier=None):
         result = self._get_followers_count(instance, identifier=identifier)
 
@@ -230,10 +508,11 @@ class RedisBackend(BaseBackend):
         return 0
 
     def _get_friends_count(self, instance, identifier=None):
-        cache_key = get_key('uid', self.manager.make_uid(instance), 'friends', identifier, 'count')
+        client = self.router.get(instance)
 
-        return self.client.get(self.manager.add_prefix(cache_key))
+        return client.get(self._get_read_key(instance, client, 'friends', identifier, 'count'))
 
+    @instrument('get_friends_count')
     def get_friends_count(self, instance, identifier=None):
         result = self._get_friends_count(instance, identifier=identifier)
 
@@ -0,0 +1,215 @@
+"""
+Redis clients shared by the backends of a process.
+
+Clients are registered by their connection settings: the follow and the
+timeline backends configured with the same options share one client and
+its pool of connections. The pool of a registered client is replaced by a
+``pool_class`` pool built with the connection settings of the client and
+``pool_options``: a ``ConnectionPool`` opening a connection whenever none
+is idle, or a ``BlockingConnectionPool`` waiting for a connection to be
+released instead of opening more than ``max_connections``.
+"""
+from __future__ import absolute_import
+
+import os
+import threading
+
+import redis
+import six
+
+from sequere.instrumentation import instruments
+from sequere.utils import create_client, load_class
+
+
+def freeze(value):
+    """
+    Returns a hashable version of connection settings.
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item)) for key, item in six.iteritems(value)))
+
+    if isinstance(value, (list, tuple, set)):
+        return tuple(freeze(item) for item in value)
+
+    return value
+
+
+def get_pool_name(pool):
+    kwargs = pool.connection_kwargs
+
+    if 'path' in kwargs:
+        return 'unix://%s/%s' % (kwargs['path'], kwargs.get('db', 0))
+
+    return '%s:%s/%s' % (kwargs.get('host', 'localhost'), kwargs.get('port', 6379), kwargs.get('db', 0))
+
+
+class ConnectionPool(redis.ConnectionPool):
+    """
+    A ``redis.ConnectionPool`` counting the checkouts which found every
+    connection in use and opened a new one (``exhausted``) and the ones
+    refused because ``max_connections`` were open (``timeouts``). A checkout
+    being made per command or pipeline, each one is a round trip of the
+    operations being measured.
+    """
+    def reset(self):
+        super(ConnectionPool, self).reset()
+
+        # reset in the child of a fork too
+        self.exhausted = 0
+        self.timeouts = 0
+
+    def get_connection(self, *args, **kwargs):
+        instruments.round_trip()
+
+        exhausted = not self._available_connections
+
+        if exhausted:
+            self.exhausted += 1
+
+        try:
+            return super(ConnectionPool, self).get_connection(*args, **kwargs)
+        except redis.ConnectionError:
+            if exhausted and self._created_connections >= self.max_connections:
+                self.timeouts += 1
+
+            raise
+
+    def get_stats(self):
+        in_use = len(self._in_use_connections)
+
+        return {
+            'max_connections': self.max_connections,
+            'created': self._created_connections,
+            'in_use': in_use,
+            'idle': len(self._available_connections),
+            'saturation': float(in_use) / self.max_connections,
+            'exhausted': self.exhausted,
+            'timeouts': self.timeouts,
+        }
+
+
+class BlockingConnectionPool(redis.BlockingConnectionPool):
+    """
+    A ``redis.BlockingConnectionPool`` counting the checkouts which found
+    every connection in use (``exhausted``) and the ones which timed out
+    waiting for a connection (``timeouts``). A checkout being made per
+    command or pipeline, each one is a round trip of the operations being
+    measured.
+    """
+    def reset(self):
+        super(BlockingConnectionPool, self).reset()
+
+        # reset in the child of a fork too
+        self.exhausted = 0
+        self.timeouts = 0
+
+    def get_connection(self, *args, **kwargs):
+        instruments.round_trip()
+
+        exhausted = self.pool.empty()
+
+        if exhausted:
+            self.exhausted += 1
+
+        try:
+            return super(BlockingConnectionPool, self).get_connection(*args, **kwargs)
+        except redis.ConnectionError:
+            if exhausted:
+                self.timeouts += 1
+
+            raise
+
+    def get_stats(self):
+        idle = len([connection for connection in list(self.pool.queue) if connection is not None])
+
+        in_use = len(self._connections) - idle
+
+        return {
+            'max_connections': self.max_connections,
+            'created': len(self._connections),
+            'in_use': in_use,
+            'idle': idle,
+            'saturation': float(in_use) / self.max_connections,
+            'exhausted': self.exhausted,
+            'timeouts': self.timeouts,
+        }
+
+
+class ClientRegistry(object):
+    """
+    Holds the clients of a process by connection settings.
+
+    Connections inherited from the parent of a fork (prefork Celery or
+    gunicorn workers) are dropped from the pools in the child without being
+    closed, the parent keeps using them.
+    """
+    def __init__(self):
+        self.clients = {}
+        # a sharded client registers its shards while being created
+        self.lock = threading.RLock()
+        self.pid = os.getpid()
+
+    def get(self, connection, connection_class=None, pool_class=None, pool_options=None):
+        if self.pid != os.getpid():
+            self.after_fork()
+
+        key = freeze((connection, connection_class, pool_class, pool_options))
+
+        client = self.clients.get(key)
+
+        if client is None:
+            with self.lock:
+                client = self.clients.get(key)
+
+                if client is None:
+                    client = self.clients[key] = self.create(connection, connection_class,
+                                                             pool_class=pool_class,
+                                                             pool_options=pool_options)
+
+        return client
+
+    def create(self, connection, connection_class=None, pool_class=None, pool_options=None):
+        client = create_client(connection, connection_class=connection_class)
+
+        pool = getattr(client, 'connection_pool', None)
+
+        if pool_class and isinstance(pool, redis.ConnectionPool):
+            client.connection_pool = load_class(pool_class)(connection_class=pool.connection_class,
+                                                            **dict(pool.connection_kwargs, **(pool_options or {})))
+
+        return client
+
+    def get_pools(self):
+        pools = []
+
+        for client in list(self.clients.values()):
+            pool = getattr(client, 'connection_pool', None)
+
+            if pool is not None and pool not in pools:
+                pools.append(pool)
+
+        return pools
+
+    def get_stats(self):
+        """
+        Returns the usage of the pools able to report it, a list of dicts.
+        """
+        return [dict(pool.get_stats(), name=get_pool_name(pool))
+                for pool in self.get_pools() if hasattr(pool, 'get_stats')]
+
+    def after_fork(self):
+        self.lock = threading.RLock()
+        self.pid = os.getpid()
+
+        for pool in self.get_pools():
+            pool.reset()
+
+    def clear(self):
+        with self.lock:
+            self.clients = {}
+
+
+clients = ClientRegistry()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=clients.after_fork)
@@ -3,19 +3,38 @@ import uuid
 
 from collections import defaultdict
 
+from sequere.instrumentation import instruments
 from sequere.registry import registry
 
+from .sharding import ShardedRedis
 from .utils import get_key
 
 
 class Manager(object):
-    def __init__(self, client, prefix=None):
+    def __init__(self, client, prefix=None, cache=None):
         self.client = client
         self.prefix = prefix or ''
+        self.cache = cache
+
+        # keys sharing a hash tag are stored on the same shard
+        self.hash_tags = isinstance(client, ShardedRedis)
 
     def add_prefix(self, key):
         return get_key(self.prefix, key)
 
+    def tag(self, value):
+        if self.hash_tags:
+            return '{%s}' % value
+
+        return value
+
+    def get_uid_key(self, uid, *segments):
+        """
+        Returns the key of a uid followed by ``segments``, the uid being the
+        hash tag of the key when the client is sharded.
+        """
+        return get_key(self.add_prefix('uid'), self.tag(uid), *segments)
+
     def make_uid(self, data, client=None):
         client = client or self.client
 
@@ -23,16 +42,12 @@ class Manager(object):
 
         data['uid'] = uid
 
-        key = self.add_prefix(get_key('uid', uid))
-
-        client.hmset(key, data)
+        client.hmset(self.get_uid_key(uid), data)
 
         return uid
 
     def get_data_from_uid(self, uid):
-        key = self.add_prefix(get_key('uid', uid))
-
-        return self.client.hgetall(key)
+        return self.client.hgetall(self.get_uid_key(uid))
 
     def clear(self):
         self.client.flushdb()
@@ -56,6 +71,27 @@ class InstanceManager(Manager):
 
         return uid
 
+    def make_uids(self, instances):
+        uids = self.get_uids(instances)
+
+        missing = [i for i, uid in enumerate(uids) if not uid]
+
+        if missing:
+            with self.client.pipeline() as pipe:
+                for i in missing:
+                    instance = instances[i]
+
+                    uids[i] = super(InstanceManager, self).make_uid(data={
+                        'identifier': registry.get_identifier(instance),
+                        'object_id': instance.pk
+                    }, client=pipe)
+
+                    pipe.set(self.make_uid_key(instance), uids[i])
+
+                pipe.execute()
+
+        return uids
+
     def make_uid_key(self, instance):
         identifier = registry.get_identifier(instance)
 
@@ -63,30 +99,96 @@ class InstanceManager(Manager):
 
         return self.add_prefix(get_key('uid', identifier, object_id))
 
-    def get_from_uid_list(self, uid_list):
-        with self.client.pipeline() as pipe:
-            for uid in uid_list:
-                pipe.hgetall(self.add_prefix(get_key('uid', uid)))
+    def get_data_from_uid_list(self, uid_list, client=None):
+        cached = self.cache.get_data(uid_list) if self.cache is not None else {}
+
+        missing = [uid for uid in uid_list if uid not in cached]
+
+        if missing:
+            with (client or self.client).pipeline() as pipe:
+                for uid in missing:
+                    pipe.hgetall(self.get_uid_key(uid))
+
+                found = dict((uid, data) for uid, data in zip(missing, pipe.execute()) if data)
+
+            if self.cache is not None:
+                self.cache.set_data(found)
+
+            cached.update(found)
+
+        return [cached.get(uid, {}) for uid in uid_list]
+
+    def get_from_uid_list(self, uid_list, client=None):
+        """
+        Returns the instances of a list of uids in the same order (None when
+        missing), one query is done per identifier, uid data being read with
+        ``client`` when given.
+        """
+        with instruments.measure('hydrate', size=len(uid_list), backend=self.__class__.__name__):
+            results = self.get_data_from_uid_list(uid_list, client=client)
+
+            identifier_ids = self.group_data(results)
 
-            identifier_ids = defaultdict(dict)
+            found = {}
 
-            results = pipe.execute()
+            for identifier, klass, missing in self.get_missing(identifier_ids):
+                for result in klass.objects.filter(pk__in=missing):
+                    found[(identifier, result.pk)] = result
 
-            for i, value in enumerate(results):
+            return self.resolve_data(results, identifier_ids, found)
+
+    def group_data(self, results):
+        """
+        Returns the object ids of a list of uid data grouped by identifier
+        and mapped to their cached instances (None when not cached).
+        """
+        identifier_ids = defaultdict(dict)
+
+        for value in results:
+            if value:
                 identifier_ids[value['identifier']][int(value['object_id'])] = None
 
-            for identifier, objects in six.iteritems(identifier_ids):
-                klass = registry.identifiers.get(identifier)
+        if self.cache is not None:
+            cached = self.cache.get_instances([(identifier, object_id)
+                                               for identifier, objects in six.iteritems(identifier_ids)
+                                               for object_id in objects])
+
+            for (identifier, object_id), instance in six.iteritems(cached):
+                identifier_ids[identifier][object_id] = instance
+
+        return identifier_ids
+
+    def get_missing(self, identifier_ids):
+        """
+        Returns the (identifier, model, object ids) to load from the
+        database after group_data.
+        """
+        for identifier, objects in six.iteritems(identifier_ids):
+            klass = registry.identifiers.get(identifier)
+
+            missing = [object_id for object_id, instance in six.iteritems(objects) if instance is None]
 
-                for result in klass.objects.filter(pk__in=objects.keys()):
-                    identifier_ids[identifier][result.pk] = result
+            if klass is not None and missing:
+                yield identifier, klass, missing
 
-            results = [identifier_ids[value['identifier']][int(value['object_id'])]
-                       for i, value in enumerate(results)]
+    def resolve_data(self, results, identifier_ids, found):
+        """
+        Returns the instances of a list of uid data from the instances loaded
+        for get_missing, keyed by (identifier, object id).
+        """
+        for (identifier, object_id), instance in six.iteritems(found):
+            identifier_ids[identifier][object_id] = instance
 
-            return results
+        if self.cache is not None and found:
+            self.cache.set_instances(found)
+
+        return [identifier_ids[value['identifier']][int(value['object_id'])] if value else None
+                for value in results]
 
     def get_from_uid(self, uid):
+        if self.cache is not None:
+            return self.get_from_uid_list([uid])[0]
+
         data = self.get_data_from_uid(uid)
 
         if not data:
@@ -99,5 +201,50 @@ class InstanceManager(Manager):
         except klass.DoesNotExist:
             return None
 
-    def get_uid(self, instance):
-        return self.client.get(self.make_uid_key(instance))
+    def get_uid(self, instance, client=None):
+        """
+        Returns the uid of an instance read with ``client`` when given, None
+        when the instance has no uid, unlike make_uid.
+        """
+        return (client or self.client).get(self.make_uid_key(instance))
+
+    def get_uids(self, instances, client=None):
+        if not instances:
+            return []
+
+        return (client or self.client).mget([self.make_uid_key(instance) for instance in instances])
+
+
+class IdentifierInstanceManager(InstanceManager):
+    """
+    Derives the uid of an instance from its identifier and its primary key
+    (``user.1``), keys are computed without any round trip and uids are
+    decoded without reading the uid hashes.
+    """
+    separator = '.'
+
+    def make_uid(self, instance):
+        return self.get_uid(instance)
+
+    def make_uids(self, instances):
+        return self.get_uids(instances)
+
+    def get_uid(self, instance, client=None):
+        return '%s%s%s' % (registry.get_identifier(instance), self.separator, instance.pk)
+
+    def get_uids(self, instances, client=None):
+        return [self.get_uid(instance) for instance in instances]
+
+    def get_data_from_uid(self, uid):
+        try:
+            identifier, object_id = uid.rsplit(self.separator, 1)
+        except ValueError:
+            return {}
+
+        return {
+            'identifier': identifier,
+            'object_id': object_id
+        }
+
+    def get_data_from_uid_list(self, uid_list, client=None):
+        return [self.get_data_from_uid(uid) for uid in uid_list]
@@ -1,19 +1,43 @@
 from collections import OrderedDict
 
+from six.moves import range
+
 from sequere.query import QuerySetTransformer
 from sequere import utils
 
 
+def zrange_after(client, key, limit, script, cursor=None, desc=True):
+    """
+    Returns at most ``limit`` couples (member, score) of a sorted set located
+    strictly after the (score, member) ``cursor``, in a single round trip
+    whatever the depth of the cursor, ``script`` being ``RANGE_AFTER``
+    registered by the backend.
+    """
+    if cursor is None:
+        if desc:
+            return client.zrevrangebyscore(key, '+inf', '-inf', start=0, num=limit, withscores=True)
+
+        return client.zrangebyscore(key, '-inf', '+inf', start=0, num=limit, withscores=True)
+
+    score, member = cursor
+
+    results = script(keys=[key], args=[repr(score), member, limit, int(desc)], client=client)
+
+    return [(results[i], float(results[i + 1])) for i in range(0, len(results), 2)]
+
+
 class RedisQuerySetTransformer(QuerySetTransformer):
-    def __init__(self, manager, count, key):
-        super(RedisQuerySetTransformer, self).__init__(manager.client, count)
+    def __init__(self, manager, count, key, client=None, range_after_script=None):
+        super(RedisQuerySetTransformer, self).__init__(client or manager.client, count)
 
         self.manager = manager
+        self.range_after_script = range_after_script
         self.keys = [key, ]
         self.order_by(False)
 
     def order_by(self, desc):
         self.desc = desc
+        self._result_cache = {}
 
         if desc:
             self.method = getattr(self.qs, 'zrevrangebyscore')
@@ -37,7 +61,17 @@ class RedisQuerySetTransformer(QuerySetTransformer):
 
         scores = OrderedDict(scores)
 
-        objects = self.manager.get_from_uid_list(scores.keys())
+        objects = self.manager.get_from_uid_list(list(scores.keys()), client=self.qs)
 
         return [(objects[i], utils.from_timestamp(value[1]))
                 for i, value in enumerate(scores.items())]
+
+    def _fetch(self, limit, cursor=None, reverse=False):
+        scores = zrange_after(self.qs, self.keys[0], limit, self.range_after_script,
+                              cursor=cursor,
+                              desc=self.desc != reverse)
+
+        objects = self.manager.get_from_uid_list([uid for uid, score in scores], client=self.qs)
+
+        return [((objects[i], utils.from_timestamp(score)), (score, uid))
+                for i, (uid, score) in enumerate(scores)]
@@ -0,0 +1,217 @@
+# KEYS layout shared by FOLLOW and UNFOLLOW, see RedisBackend._get_follow_keys:
+#
+#  1, 2   followings of from (+ count)
+#  3, 4   followings of from for the identifier of to (+ count)
+#  5, 6   followers of to (+ count)
+#  7, 8   followers of to for the identifier of from (+ count)
+#  9      followings of to (used to detect mutual follows)
+# 10, 11  friends of to (+ count)
+# 12, 13  friends of to for the identifier of from (+ count)
+# 14, 15  friends of from (+ count)
+# 16, 17  friends of from for the identifier of to (+ count)
+#
+# ARGV: from_uid, to_uid, timestamp
+#
+# Both scripts return 0 when nothing has been done, 1 when the relation
+# has been updated and 2 when the friendship has been updated too.
+
+FOLLOW = """
+if redis.call('ZSCORE', KEYS[1], ARGV[2]) then
+    return 0
+end
+
+local function add(index, member)
+    redis.call('ZADD', KEYS[index], ARGV[3], member)
+    redis.call('INCR', KEYS[index + 1])
+end
+
+add(1, ARGV[2])
+add(3, ARGV[2])
+add(5, ARGV[1])
+add(7, ARGV[1])
+
+if not redis.call('ZSCORE', KEYS[9], ARGV[1]) then
+    return 1
+end
+
+add(10, ARGV[1])
+add(12, ARGV[1])
+add(14, ARGV[2])
+add(16, ARGV[2])
+
+return 2
+"""
+
+UNFOLLOW = """
+if not redis.call('ZSCORE', KEYS[1], ARGV[2]) then
+    return 0
+end
+
+local function remove(index, member)
+    redis.call('ZREM', KEYS[index], member)
+    redis.call('DECR', KEYS[index + 1])
+end
+
+remove(1, ARGV[2])
+remove(3, ARGV[2])
+remove(5, ARGV[1])
+remove(7, ARGV[1])
+
+if not redis.call('ZSCORE', KEYS[9], ARGV[1]) then
+    return 1
+end
+
+remove(10, ARGV[1])
+remove(12, ARGV[1])
+remove(14, ARGV[2])
+remove(16, ARGV[2])
+
+return 2
+"""
+
+# Steps of FOLLOW and UNFOLLOW for sharded clients, each step only touches
+# the keys of a single uid so it runs on the shard of this uid. Steps are
+# idempotent (members are only counted when added or removed) so a follow
+# interrupted between two steps is completed by running it again.
+
+_ADD = """
+local function add(index, member, score)
+    if redis.call('ZADD', KEYS[index], 'NX', score, member) == 1 then
+        redis.call('INCR', KEYS[index + 1])
+
+        return 1
+    end
+
+    return 0
+end
+"""
+
+_REMOVE = """
+local function remove(index, member)
+    if redis.call('ZREM', KEYS[index], member) == 1 then
+        redis.call('DECR', KEYS[index + 1])
+
+        return 1
+    end
+
+    return 0
+end
+"""
+
+# KEYS: followings of from (+ count), followings of from for the identifier
+# of to (+ count), followers of from. ARGV: to_uid, timestamp.
+#
+# Returns {added, mutual}: added is 1 when added, mutual is 1 when to follows
+# from. Two edges A -> B and B -> A sent at the same time can both miss the
+# reverse edge in FOLLOW_IN, one of them sees it here since the FOLLOW_OUT of
+# an edge and the FOLLOW_IN of the reverse edge run on the same shard.
+FOLLOW_OUT = _ADD + """
+local added = add(1, ARGV[1], ARGV[2])
+
+add(3, ARGV[1], ARGV[2])
+
+if redis.call('ZSCORE', KEYS[5], ARGV[1]) then
+    return {added, 1}
+end
+
+return {added, 0}
+"""
+
+# KEYS: followers of to (+ count), followers of to for the identifier of from
+# (+ count), followings of to, friends of to (+ count), friends of to for the
+# identifier of from (+ count). ARGV: from_uid, timestamp.
+#
+# Returns 2 when to follows from (FOLLOW_FRIENDS has to be run), 1 when
+# added and 0 otherwise.
+FOLLOW_IN = _ADD + """
+local added = add(1, ARGV[1], ARGV[2])
+
+add(3, ARGV[1], ARGV[2])
+
+if not redis.call('ZSCORE', KEYS[5], ARGV[1]) then
+    return added
+end
+
+add(6, ARGV[1], ARGV[2])
+add(8, ARGV[1], ARGV[2])
+
+return 2
+"""
+
+# KEYS: friends of from (+ count), friends of from for the identifier of to
+# (+ count), or the same keys of to. ARGV: the uid of the other side,
+# timestamp.
+FOLLOW_FRIENDS = _ADD + """
+add(1, ARGV[1], ARGV[2])
+add(3, ARGV[1], ARGV[2])
+
+return 1
+"""
+
+# KEYS: the followings then the friends of from (+ counts, with and without
+# the identifier of to), or the followers then the friends of to (+ counts,
+# with and without the identifier of from). ARGV: the uid of the other side.
+#
+# Returns 1 when the relation has been removed.
+UNFOLLOW_SIDE = _REMOVE + """
+local removed = remove(1, ARGV[1])
+
+remove(3, ARGV[1])
+remove(5, ARGV[1])
+remove(7, ARGV[1])
+
+return removed
+"""
+
+# Returns at most ARGV[3] members (with scores) of the sorted set KEYS[1]
+# located after the member ARGV[2] of score ARGV[1], ARGV[4] is '1' for a
+# descending order.
+#
+# The range starts at the rank of the member when it is still there, members
+# sharing its score are filtered otherwise.
+RANGE_AFTER = """
+local key, score, member, limit = KEYS[1], ARGV[1], ARGV[2], tonumber(ARGV[3])
+local desc = ARGV[4] == '1'
+
+local current = redis.call('ZSCORE', key, member)
+
+if current and tonumber(current) == tonumber(score) then
+    if desc then
+        local rank = redis.call('ZREVRANK', key, member)
+
+        return redis.call('ZREVRANGE', key, rank + 1, rank + limit, 'WITHSCORES')
+    end
+
+    local rank = redis.call('ZRANK', key, member)
+
+    return redis.call('ZRANGE', key, rank + 1, rank + limit, 'WITHSCORES')
+end
+
+local ties, rest
+
+if desc then
+    ties = redis.call('ZREVRANGEBYSCORE', key, score, score, 'WITHSCORES')
+    rest = redis.call('ZREVRANGEBYSCORE', key, '(' .. score, '-inf', 'WITHSCORES', 'LIMIT', 0, limit)
+else
+    ties = redis.call('ZRANGEBYSCORE', key, score, score, 'WITHSCORES')
+    rest = redis.call('ZRANGEBYSCORE', key, '(' .. score, '+inf', 'WITHSCORES', 'LIMIT', 0, limit)
+end
+
+local results = {}
+
+for i = 1, #ties, 2 do
+    if #results < limit * 2 and ((desc and ties[i] < member) or (not desc and ties[i] > member)) then
+        table.insert(results, ties[i])
+        table.insert(results, ties[i + 1])
+    end
+end
+
+for i = 1, #rest, 2 do
+    if #results < limit * 2 then
+        table.insert(results, rest[i])
+        table.insert(results, rest[i + 1])
+    end
+end
+
+return results
+"""
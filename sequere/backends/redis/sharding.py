@@ -0,0 +1,457 @@
+"""
+Client side sharding of a Redis keyspace over a consistent-hash ring.
+
+Keys are placed by their hash tag (the content of their first ``{...}``, like
+Redis Cluster) or by their whole name without tag, the Redis backends tag
+the keys of a uid with the uid so a follower list, its counters and the
+timelines of its owner land on the same shard.
+"""
+import bisect
+import hashlib
+import threading
+
+from collections import OrderedDict
+from functools import partial
+
+import redis
+import six
+
+from sequere.exceptions import CrossShardException
+from sequere.instrumentation import instruments
+from sequere.utils import get_client, get_setting
+
+# commands whose key is not their first argument
+SUBCOMMANDS = ('MEMORY', 'OBJECT', )
+
+# number of members written per ZADD when a multi shard set is stored
+STORE_BATCH_SIZE = 1000
+
+
+def get_hash_tag(key):
+    """
+    Returns the part of a key hashed to pick its shard.
+    """
+    start = key.find('{')
+
+    if start != -1:
+        end = key.find('}', start + 1)
+
+        if end > start + 1:
+            return key[start + 1:end]
+
+    return key
+
+
+def get_command_key(args):
+    if args[0].upper() in SUBCOMMANDS:
+        return args[2]
+
+    return args[1]
+
+
+def run_parallel(funcs):
+    """
+    Calls functions in parallel threads and returns their results in the
+    same order, the first error is raised once every call has returned.
+
+    The round trips of the threads are added to the operations measured by
+    the calling thread.
+    """
+    if len(funcs) == 1:
+        return [funcs[0]()]
+
+    results = [None] * len(funcs)
+    operations = [None] * len(funcs)
+    errors = []
+
+    measuring = instruments.is_measuring()
+
+    def run(i, func):
+        try:
+            if measuring:
+                results[i], operations[i] = instruments.collect(func)
+            else:
+                results[i] = func()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i, func)) for i, func in enumerate(funcs)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    for operation in operations:
+        if operation is not None:
+            instruments.merge(operation)
+
+    if errors:
+        raise errors[0]
+
+    return results
+
+
+class HashRing(object):
+    """
+    A consistent-hash ring placing ``replicas`` points per node, adding a
+    node only moves the keys located between its points and the previous
+    ones (about 1/n of the keys).
+    """
+    def __init__(self, nodes=(), replicas=160):
+        self.replicas = replicas
+
+        self._points = []
+        self._nodes = {}
+
+        for node in nodes:
+            self.add_node(node)
+
+    @property
+    def nodes(self):
+        return set(self._nodes.values())
+
+    def get_point(self, value):
+        return int(hashlib.md5(value.encode('utf-8')).hexdigest()[:8], 16)
+
+    def add_node(self, node):
+        for i in range(self.replicas):
+            point = self.get_point('%s-%d' % (node, i))
+
+            if point not in self._nodes:
+                bisect.insort(self._points, point)
+
+            self._nodes[point] = node
+
+    def remove_node(self, node):
+        self._points = [point for point in self._points if self._nodes[point] != node]
+        self._nodes = dict((point, self._nodes[point]) for point in self._points)
+
+    def get_node(self, key):
+        index = bisect.bisect(self._points, self.get_point(key)) % len(self._points)
+
+        return self._nodes[self._points[index]]
+
+
+class ShardedScript(object):
+    """
+    A Lua script registered on every shard, all the keys of a call must be
+    located on the same shard.
+    """
+    def __init__(self, client, script):
+        self.client = client
+        self.script = script
+
+        self.scripts = dict((name, shard.register_script(script)) for name, shard in six.iteritems(client.shards))
+
+    def get_shard_name(self, keys):
+        names = set(self.client.get_shard_name(key) for key in keys)
+
+        if len(names) > 1:
+            raise CrossShardException('The keys %s of a script are located on several shards' % ', '.join(keys))
+
+        return names.pop() if names else sorted(self.scripts)[0]
+
+    def __call__(self, keys=[], args=[], client=None):
+        if isinstance(client, ShardedPipeline):
+            return client.queue_script(self, keys, args)
+
+        name = self.get_shard_name(keys)
+
+        # a replica of the client, made of the same shards
+        if isinstance(client, ShardedRedis) and client is not self.client:
+            return self.scripts[name](keys=keys, args=args, client=client.shards[name])
+
+        return self.scripts[name](keys=keys, args=args)
+
+
+class ShardedRedis(object):
+    """
+    A Redis client spreading keys over the shards of ``hosts`` (a dict of
+    shard names and connection options merged with ``options``), each shard
+    being a ``client_class`` client shared with the backends connected to
+    the same server through a ``pool_class`` pool.
+
+    Single key commands are sent to the shard of their key, multi key
+    commands are split by shard and ZUNIONSTORE / ZINTERSTORE are computed
+    by the client when their keys are located on several shards.
+    """
+    def __init__(self, hosts, client_class='redis.StrictRedis', replicas=160, pool_class=None, pool_options=None,
+                 **options):
+        if pool_class is None:
+            pool_class = get_setting('CONNECTION_POOL_CLASS')
+
+        if pool_options is None:
+            pool_options = get_setting('CONNECTION_POOL_OPTIONS')
+
+        self.shards = dict((name, get_client(dict(options, **connection), connection_class=client_class,
+                                             pool_class=pool_class, pool_options=pool_options))
+                           for name, connection in six.iteritems(hosts))
+
+        self.ring = HashRing(sorted(self.shards), replicas=replicas)
+
+    def get_shard_name(self, key):
+        return self.ring.get_node(get_hash_tag(key))
+
+    def get_shard(self, key):
+        return self.shards[self.get_shard_name(key)]
+
+    def group_keys(self, keys):
+        """
+        Returns the indexes of a list of keys grouped by shard name.
+        """
+        groups = OrderedDict()
+
+        for i, key in enumerate(keys):
+            groups.setdefault(self.get_shard_name(key), []).append(i)
+
+        return groups
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def command(key, *args, **kwargs):
+            return getattr(self.get_shard(key), name)(key, *args, **kwargs)
+
+        return command
+
+    def execute_command(self, *args, **options):
+        return self.get_shard(get_command_key(args)).execute_command(*args, **options)
+
+    def _call_grouped(self, method, keys):
+        groups = self.group_keys(keys)
+
+        return groups, run_parallel([partial(getattr(self.shards[name], method), *[keys[i] for i in indexes])
+                                     for name, indexes in six.iteritems(groups)])
+
+    def mget(self, keys, *args):
+        keys = list(keys) + list(args)
+
+        results = [None] * len(keys)
+
+        groups = self.group_keys(keys)
+
+        values = run_parallel([partial(self.shards[name].mget, [keys[i] for i in indexes])
+                               for name, indexes in six.iteritems(groups)])
+
+        for indexes, shard_values in zip(groups.values(), values):
+            for i, value in zip(indexes, shard_values):
+                results[i] = value
+
+        return results
+
+    def delete(self, *keys):
+        return sum(self._call_grouped('delete', keys)[1])
+
+    def exists(self, *keys):
+        if len(keys) == 1:
+            return self.get_shard(keys[0]).exists(keys[0])
+
+        return sum(int(result) for result in self._call_grouped('exists', keys)[1])
+
+    def _get_scores(self, key):
+        """
+        Returns the members of a sorted set or of a set, scored 1 like
+        ZUNIONSTORE and ZINTERSTORE do.
+        """
+        shard = self.get_shard(key)
+
+        try:
+            return shard.zrange(key, 0, -1, withscores=True)
+        except redis.ResponseError:
+            return [(member, 1.0) for member in shard.smembers(key)]
+
+    def _store(self, command, dest, keys, aggregate=None):
+        name = self.get_shard_name(dest)
+
+        if all(self.get_shard_name(key) == name for key in keys):
+            return getattr(self.shards[name], command)(dest, keys, aggregate=aggregate)
+
+        sets = run_parallel([partial(self._get_scores, key) for key in keys])
+
+        combine = {
+            'SUM': lambda a, b: a + b,
+            'MIN': min,
+            'MAX': max,
+        }[(aggregate or 'SUM').upper()]
+
+        members = dict(sets[0])
+
+        for scores in sets[1:]:
+            scores = dict(scores)
+
+            if command == 'zinterstore':
+                members = dict((member, combine(score, scores[member]))
+                               for member, score in six.iteritems(members) if member in scores)
+
+                continue
+
+            for member, score in six.iteritems(scores):
+                members[member] = combine(members[member], score) if member in members else score
+
+        items = list(members.items())
+
+        with self.shards[name].pipeline() as pipe:
+            pipe.delete(dest)
+
+            for start in range(0, len(items), STORE_BATCH_SIZE):
+                pipe.execute_command('ZADD', dest, *[value
+                                                     for member, score in items[start:start + STORE_BATCH_SIZE]
+                                                     for value in (repr(float(score)), member)])
+
+            pipe.execute()
+
+        return len(items)
+
+    def zunionstore(self, dest, keys, aggregate=None):
+        return self._store('zunionstore', dest, keys, aggregate=aggregate)
+
+    def zinterstore(self, dest, keys, aggregate=None):
+        return self._store('zinterstore', dest, keys, aggregate=aggregate)
+
+    def flushdb(self):
+        run_parallel([shard.flushdb for shard in self.shards.values()])
+
+        return True
+
+    def keys(self, pattern='*'):
+        return [key for keys in run_parallel([partial(shard.keys, pattern) for shard in self.shards.values()])
+                for key in keys]
+
+    def scan_iter(self, match=None, count=None):
+        for name in sorted(self.shards):
+            for key in self.shards[name].scan_iter(match=match, count=count):
+                yield key
+
+    def register_script(self, script):
+        return ShardedScript(self, script)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return ShardedPipeline(self, transaction=transaction)
+
+
+class ShardedPipeline(object):
+    """
+    Buffers commands and runs them in a pipeline per shard, the pipelines of
+    the shards being executed in parallel threads. Multi key commands
+    spanning several shards are run by the client between the commands
+    queued before and after them so results keep their order.
+    """
+    def __init__(self, client, transaction=True):
+        self.client = client
+        self.transaction = transaction
+
+        self.commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.reset()
+
+    def __len__(self):
+        return len(self.commands)
+
+    def reset(self):
+        self.commands = []
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def command(key, *args, **kwargs):
+            self.commands.append((self.client.get_shard_name(key),
+                                  lambda pipe: getattr(pipe, name)(key, *args, **kwargs)))
+
+            return self
+
+        return command
+
+    def execute_command(self, *args, **options):
+        self.commands.append((self.client.get_shard_name(get_command_key(args)),
+                              lambda pipe: pipe.execute_command(*args, **options)))
+
+        return self
+
+    def _queue_multi(self, method, keys, *args, **kwargs):
+        names = set(self.client.get_shard_name(key) for key in keys)
+
+        if len(names) == 1:
+            self.commands.append((names.pop(), lambda pipe: getattr(pipe, method)(*args, **kwargs)))
+        else:
+            self.commands.append((None, lambda: getattr(self.client, method)(*args, **kwargs)))
+
+        return self
+
+    def mget(self, keys, *args):
+        keys = list(keys) + list(args)
+
+        return self._queue_multi('mget', keys, keys)
+
+    def delete(self, *keys):
+        return self._queue_multi('delete', keys, *keys)
+
+    def exists(self, *keys):
+        return self._queue_multi('exists', keys, *keys)
+
+    def zunionstore(self, dest, keys, aggregate=None):
+        return self._queue_multi('zunionstore', [dest] + list(keys), dest, keys, aggregate=aggregate)
+
+    def zinterstore(self, dest, keys, aggregate=None):
+        return self._queue_multi('zinterstore', [dest] + list(keys), dest, keys, aggregate=aggregate)
+
+    def queue_script(self, script, keys, args):
+        name = script.get_shard_name(keys)
+
+        self.commands.append((name, lambda pipe: script.scripts[name](keys=keys, args=args, client=pipe)))
+
+        return self
+
+    def _execute_batch(self, batch, raise_on_error):
+        if not batch:
+            return []
+
+        groups = OrderedDict()
+
+        for i, (name, func) in enumerate(batch):
+            groups.setdefault(name, []).append(i)
+
+        def run(name, indexes):
+            with self.client.shards[name].pipeline(transaction=self.transaction) as pipe:
+                for i in indexes:
+                    batch[i][1](pipe)
+
+                return pipe.execute(raise_on_error=raise_on_error)
+
+        results = [None] * len(batch)
+
+        values = run_parallel([partial(run, name, indexes) for name, indexes in six.iteritems(groups)])
+
+        for indexes, shard_values in zip(groups.values(), values):
+            for i, value in zip(indexes, shard_values):
+                results[i] = value
+
+        return results
+
+    def execute(self, raise_on_error=True):
+        commands, self.commands = self.commands, []
+
+        results = []
+        batch = []
+
+        for name, func in commands + [(None, None)]:
+            if name is not None:
+                batch.append((name, func))
+
+                continue
+
+            results += self._execute_batch(batch, raise_on_error)
+
+            batch = []
+
+            if func is not None:
+                results.append(func())
+
+        return results
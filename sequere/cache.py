@@ -0,0 +1,185 @@
+import threading
+import time
+
+from collections import OrderedDict
+
+from django.db.models.signals import post_delete, post_save
+
+from sequere.registry import registry
+
+
+def copy_instance(instance):
+    """
+    Returns a copy of a model instance holding the values of its loaded
+    fields only, without the related objects, prefetched querysets or
+    attributes its users set on it.
+    """
+    names = [field.attname for field in instance._meta.concrete_fields
+             if field.attname in instance.__dict__]
+
+    return instance.__class__.from_db(instance._state.db, names, [instance.__dict__[name] for name in names])
+
+
+class LRUCache(object):
+    """
+    A thread safe mapping keeping at most ``max_size`` entries, the least
+    recently used ones are evicted first and entries expire after ``ttl``
+    seconds (never when None).
+    """
+    def __init__(self, max_size=1000, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get_many(self, keys):
+        results = {}
+
+        now = time.time()
+
+        with self._lock:
+            for key in keys:
+                try:
+                    value, expires_at = self._data.pop(key)
+                except KeyError:
+                    continue
+
+                if expires_at is not None and expires_at < now:
+                    continue
+
+                self._data[key] = (value, expires_at)
+
+                results[key] = value
+
+        return results
+
+    def set_many(self, mapping):
+        expires_at = time.time() + self.ttl if self.ttl else None
+
+        with self._lock:
+            for key, value in mapping.items():
+                self._data.pop(key, None)
+                self._data[key] = (value, expires_at)
+
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class HydrationCache(object):
+    """
+    Caches the resolution of uids to instances used by InstanceManager.
+
+    The data of a uid never changes and is kept in a process local LRU, the
+    instances are kept ``ttl`` seconds in another one backed by the Django
+    cache ``cache_alias`` when given. Instances of registered models are
+    invalidated on post_save and post_delete, other processes only see the
+    change once their local entry has expired.
+
+    Instances are cached and returned as copies, a caller never sees the
+    state another one attached to them.
+    """
+    def __init__(self, max_size=1000, ttl=60, cache_alias=None, cache_timeout=300,
+                 key_prefix='sequere:instance'):
+        self.uids = LRUCache(max_size)
+        self.instances = LRUCache(max_size, ttl=ttl)
+
+        self.shared = None
+
+        if cache_alias is not None:
+            from django.core.cache import caches
+
+            self.shared = caches[cache_alias]
+
+        self.cache_timeout = cache_timeout
+        self.key_prefix = key_prefix
+
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+        post_save.connect(self.handle_change)
+        post_delete.connect(self.handle_change)
+
+    @property
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+        }
+
+    def get_shared_key(self, key):
+        return '%s:%s:%s' % ((self.key_prefix, ) + key)
+
+    def get_data(self, uids):
+        return self.uids.get_many(uids)
+
+    def set_data(self, mapping):
+        self.uids.set_many(mapping)
+
+    def get_instances(self, keys):
+        """
+        Returns the cached instances of a list of (identifier, object_id).
+        """
+        results = self.instances.get_many(keys)
+
+        self.hits += len(results)
+
+        missing = [key for key in keys if key not in results]
+
+        if missing and self.shared is not None:
+            shared_keys = dict((self.get_shared_key(key), key) for key in missing)
+
+            found = dict((shared_keys[shared_key], instance)
+                         for shared_key, instance in self.shared.get_many(list(shared_keys)).items())
+
+            self.instances.set_many(found)
+
+            self.shared_hits += len(found)
+
+            results.update(found)
+
+        self.misses += len(keys) - len(results)
+
+        return dict((key, copy_instance(instance)) for key, instance in results.items())
+
+    def set_instances(self, mapping):
+        mapping = dict((key, copy_instance(instance)) for key, instance in mapping.items())
+
+        self.instances.set_many(mapping)
+
+        if self.shared is not None:
+            self.shared.set_many(dict((self.get_shared_key(key), instance)
+                                      for key, instance in mapping.items()), self.cache_timeout)
+
+    def invalidate(self, identifier, object_id):
+        key = (identifier, object_id)
+
+        self.instances.delete_many([key])
+
+        if self.shared is not None:
+            self.shared.delete(self.get_shared_key(key))
+
+    def handle_change(self, sender, instance, **kwargs):
+        identifier = registry.get_identifier(sender)
+
+        if identifier is not None:
+            self.invalidate(identifier, instance.pk)
+
+    def clear(self):
+        self.uids.clear()
+        self.instances.clear()
+
+        self.hits = self.shared_hits = self.misses = 0
@@ -1,6 +1,6 @@
 import django
 
-__all__ = ['User']
+__all__ = ['User', 'reverse', 'url']
 
 # Django 1.5+ compatibility
 if django.VERSION >= (1, 5):
@@ -12,3 +12,10 @@ else:
     from django.contrib.auth.models import User
 
     update_fields = lambda instance, fields: instance.save()
+
+# Django 2.0+ compatibility
+try:
+    from django.urls import re_path as url, reverse
+except ImportError:
+    from django.conf.urls import url  # noqa
+    from django.core.urlresolvers import reverse  # noqa
@@ -1,6 +1,6 @@
-from .timeline import Timeline
+from .timeline import Timeline, get_unread_counts
 from .action import Action, get_actions
 
-__all__ = ['Timeline', 'Action', 'get_actions']
+__all__ = ['Timeline', 'Action', 'get_actions', 'get_unread_counts']
 
 default_app_config = 'sequere.contrib.timeline.apps.SequereTimelineConfig'
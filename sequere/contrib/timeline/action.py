@@ -1,10 +1,15 @@
 from __future__ import unicode_literals
 
-from django.utils.encoding import python_2_unicode_compatible
-from django.utils import six
+import six
+
+from six import python_2_unicode_compatible
 from django.utils.encoding import force_str
 from django.utils import timezone as datetime
-from django.utils.lru_cache import lru_cache
+
+try:
+    from functools import lru_cache
+except ImportError:  # Python 2
+    from django.utils.lru_cache import lru_cache
 
 from sequere.registry import registry
 
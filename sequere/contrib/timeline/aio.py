@@ -0,0 +1,35 @@
+"""
+Asyncio mirror of the reads of Timeline (Python 3.6+), mixed in Timeline
+and awaiting the async backend of its backend.
+"""
+
+
+class AsyncTimelineMixin(object):
+    async def amark_as_read(self, timestamp=None):
+        await self.backend.get_async_backend().mark_as_read(self.instance, timestamp=timestamp)
+
+    async def aget_unread_count(self, action=None, target=None):
+        return await self.backend.get_async_backend().get_unread_count(self.instance, action=action, target=target)
+
+    async def aget_read_at(self):
+        return await self.backend.get_async_backend().get_read_at(self.instance)
+
+    async def aget_private(self, action=None, target=None, desc=True, *, start=0, stop=None):
+        return await self.backend.get_async_backend().get_private(self.instance, action=action, target=target,
+                                                                  start=start, stop=stop, desc=desc)
+
+    async def aget_public(self, action=None, target=None, desc=True, *, start=0, stop=None):
+        return await self.backend.get_async_backend().get_public(self.instance, action=action, target=target,
+                                                                 start=start, stop=stop, desc=desc)
+
+    async def aget_private_count(self, action=None, target=None):
+        return await self.backend.get_async_backend().get_private_count(self.instance, action=action, target=target)
+
+    async def aget_public_count(self, action=None, target=None):
+        return await self.backend.get_async_backend().get_public_count(self.instance, action=action, target=target)
+
+
+async def aget_unread_counts(instances):
+    from . import app
+
+    return await app.backend.get_async_backend().get_unread_counts(instances)
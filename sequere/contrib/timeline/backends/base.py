@@ -8,13 +8,28 @@ class BaseBackend(object):
     def save(self, action):
         raise NotImplementedError
 
+    def save_many(self, uids, identifier, action):
+        raise NotImplementedError
+
+    def start_dispatch(self, action, total):
+        raise NotImplementedError
+
+    def get_dispatch_progress(self, action_uid):
+        raise NotImplementedError
+
     def get_count(self, instance, name, action=None, target=None):
         raise NotImplementedError
 
-    def get_read_at(self):
+    def mark_as_read(self, instance, timestamp=None):
+        raise NotImplementedError
+
+    def get_read_at(self, instance):
         raise NotImplementedError
 
-    def get_unread_count(self, instance, read_at, action=None, target=None):
+    def get_unread_count(self, instance, read_at=None, action=None, target=None):
+        raise NotImplementedError
+
+    def get_unread_counts(self, instances):
         raise NotImplementedError
 
     def get_private(self, instance, action=None, target=None, desc=True):
@@ -28,3 +43,12 @@ class BaseBackend(object):
 
     def get_public_count(self, instance, action=None, target=None):
         raise NotImplementedError
+
+    def save_pulled(self, action):
+        raise NotImplementedError
+
+    def get_pulled_uids(self, uids):
+        raise NotImplementedError
+
+    def remove_pulled(self, uid):
+        raise NotImplementedError
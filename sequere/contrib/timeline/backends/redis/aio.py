@@ -0,0 +1,386 @@
+import six
+
+from functools import partial
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone as datetime
+
+from sequere import app
+from sequere.aio import LoopLocal
+from sequere.backends.redis import scripts as follow_scripts
+from sequere.backends.redis.utils import get_key
+from sequere.registry import registry
+from sequere.utils import from_timestamp, get_client, get_setting, to_precise_timestamp
+from sequere.contrib.timeline.exceptions import ActionInvalid
+from sequere.contrib.timeline.utils import logger
+
+from . import scripts
+from .backend import PULLED_KEY_LIFETIME, VIEW_DONE, VIEW_WINDOW
+
+
+class AsyncRedisBackend(object):
+    """
+    Asyncio mirror of the reads of the timeline RedisBackend (timelines,
+    counts, unread counts and read cursors) using a redis.asyncio client
+    per event loop, keys and scripts are the ones of the synchronous
+    backend which keeps saving and dispatching the actions.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+        self.storage = backend.storage
+
+        if self.storage.hash_tags:
+            raise ImproperlyConfigured('The asyncio API does not support sharded Redis clients')
+
+        self._client = LoopLocal(partial(get_client, backend.options, connection_class=backend.async_client_class,
+                                         shared=False))
+
+        # scripts are called with the client of the running loop
+        self.unread_script = self.client.register_script(scripts.UNREAD)
+        self.mark_as_read_script = self.client.register_script(scripts.MARK_AS_READ)
+        self.delete_script = self.client.register_script(scripts.DELETE)
+        self.range_after_script = self.client.register_script(follow_scripts.RANGE_AFTER)
+
+    @property
+    def client(self):
+        return self._client.get()
+
+    @property
+    def follow_backend(self):
+        return app.backend.get_async_backend()
+
+    async def _make_key(self, instance, name, action=None, target=None):
+        return self.backend._make_uid_key(await self.follow_backend.get_uid(instance), name,
+                                          action=action, target=target)
+
+    async def get_data_from_uid_list(self, uid_list):
+        async with self.client.pipeline() as pipe:
+            self.storage.read_data(pipe, uid_list)
+
+            return self.storage.parse_data(uid_list, await pipe.execute())
+
+    async def get_action_list(self, data_list):
+        """
+        Returns the actions of a list of action data in the same order (None
+        when invalid), the actors and the targets of every action are loaded
+        at once with one query per identifier.
+        """
+        uids = list(set(data[attr_name]
+                        for data in data_list
+                        for attr_name in ('actor', 'target', )
+                        if data.get(attr_name, None)))
+
+        instances = dict(zip(uids, await self.follow_backend.get_from_uid_list(uids)))
+
+        actions = []
+
+        for data in data_list:
+            try:
+                actions.append(self.backend._build_action(data, instances.get))
+            except ActionInvalid as e:
+                logger.exception(e)
+
+                actions.append(None)
+
+        return actions
+
+    async def _get_following_pulled_uids(self, instance):
+        if getattr(app.backend, 'client', None) is self.backend.client:
+            return await self.follow_backend.intersect_following_uids(instance, self.backend.get_pulled_actors_key())
+
+        uids = await self.client.smembers(self.backend.get_pulled_actors_key())
+
+        if not uids:
+            return []
+
+        return await self.follow_backend.get_following_uids(instance, list(uids))
+
+    async def _get_pulled_key(self, instance, action=None, target=None):
+        if get_setting('TIMELINE_PULL_THRESHOLD') is None:
+            return None
+
+        key = await self._make_key(instance, 'private', action=action, target=target)
+
+        pulled_key = get_key(key, 'pulled')
+
+        ttl = get_setting('TIMELINE_PULL_TTL')
+
+        if ttl and await self.client.exists(pulled_key):
+            return pulled_key
+
+        uids = await self._get_following_pulled_uids(instance)
+
+        if not uids:
+            return None
+
+        target = self.backend._get_target_identifier(target) if target else None
+
+        if target == registry.get_identifier(instance):
+            target = None
+
+        keys = [key] + [self.backend._make_uid_key(uid, 'outbox', action=action, target=target) for uid in uids]
+
+        async with self.client.pipeline() as pipe:
+            pipe.zunionstore(pulled_key, keys, aggregate='MAX')
+            pipe.expire(pulled_key, ttl or PULLED_KEY_LIFETIME)
+            await pipe.execute()
+
+        return pulled_key
+
+    async def _get_view(self, instance, key, action=None, target=None):
+        """
+        Returns a temporary key holding the actions of the timeline ``key``
+        of an instance filtered by verb and target and a coroutine function
+        filling it, see RedisBackend._get_view.
+        """
+        verb = action if isinstance(action, six.string_types) or action is None else action.verb
+
+        target = self.backend._get_target_identifier(target) if target else None
+
+        if target == registry.get_identifier(instance):
+            target = None
+
+        if verb is None and target is None:
+            return key, None
+
+        view_key = self.backend._get_view_name(key, verb, target)
+
+        ttl = get_setting('TIMELINE_VIEW_TTL')
+
+        if not ttl or not await self.client.exists(get_key(view_key, 'cursor')):
+            async with self.client.pipeline() as pipe:
+                pipe.delete(view_key)
+                pipe.set(get_key(view_key, 'cursor'), '', ex=ttl or PULLED_KEY_LIFETIME)
+                await pipe.execute()
+
+        return view_key, partial(self._fill_view, key, view_key, verb, target)
+
+    async def _zrange_after(self, key, limit, cursor=None):
+        if cursor is None:
+            return await self.client.zrevrangebyscore(key, '+inf', '-inf', start=0, num=limit, withscores=True)
+
+        score, member = cursor
+
+        results = await self.range_after_script(keys=[key], args=[repr(score), member, limit, 1], client=self.client)
+
+        return [(results[i], float(results[i + 1])) for i in range(0, len(results), 2)]
+
+    async def _fill_view(self, key, view_key, verb, target, limit=None):
+        """
+        Scans the timeline ``key`` of a view from its scan cursor, see
+        RedisBackend._fill_view.
+        """
+        cursor_key = get_key(view_key, 'cursor')
+
+        ttl = get_setting('TIMELINE_VIEW_TTL') or PULLED_KEY_LIFETIME
+
+        async with self.client.pipeline() as pipe:
+            pipe.zcard(view_key)
+            pipe.get(cursor_key)
+
+            count, cursor = await pipe.execute()
+
+        position = self.backend._parse_view_cursor(cursor)
+
+        scanned = await self.client.zcount(view_key, position[0], '+inf') if position else 0
+
+        while cursor is not None and cursor != VIEW_DONE and (limit is None or scanned < limit):
+            scores = await self._zrange_after(key, VIEW_WINDOW, cursor=position)
+
+            data_list = await self.get_data_from_uid_list([uid for uid, score in scores])
+
+            identifiers = {}
+
+            if target:
+                uids = list(set(data['target'] for data in data_list
+                                if data.get('target') and data['target'] != data['actor']))
+
+                identifiers = dict(zip(uids, await self.follow_backend.get_identifiers(uids)))
+
+            matches = self.backend._filter_view(scores, data_list, verb, target, identifiers)
+
+            cursor = self.backend._get_view_cursor(scores)
+
+            position = self.backend._parse_view_cursor(cursor)
+
+            async with self.client.pipeline() as pipe:
+                if matches:
+                    pipe.zadd(view_key, matches)
+
+                pipe.expire(view_key, ttl)
+                pipe.set(cursor_key, cursor, ex=ttl)
+                pipe.zcard(view_key)
+                pipe.zcount(view_key, position[0] if position else '-inf', '+inf')
+
+                count, scanned = (await pipe.execute())[-2:]
+
+        return count
+
+    async def _get_source(self, instance, name, action=None, target=None):
+        """
+        Returns the key a timeline is read from and whether its count is
+        stored in a counter, see RedisBackend._get_source.
+        """
+        view = (action or target) and not self.backend._has_indexes()
+
+        if view:
+            key, fill = await self._get_view(instance, (await self._get_source(instance, name))[0],
+                                             action=action, target=target)
+
+            if fill:
+                await fill()
+
+            return key, False
+
+        if name == 'private':
+            pulled_key = await self._get_pulled_key(instance, action=action, target=target)
+
+            if pulled_key:
+                return pulled_key, False
+
+        return await self._make_key(instance, name, action=action, target=target), True
+
+    async def get_count(self, instance, name, action=None, target=None):
+        result = await self.client.get(get_key(await self._make_key(instance, name, action=action, target=target),
+                                               'count'))
+
+        if result:
+            return int(result)
+
+        return 0
+
+    async def get_timeline(self, instance, name, action=None, target=None, desc=True, *, start=0, stop=None):
+        """
+        Returns the actions of a timeline of an instance between the ranks
+        ``start`` and ``stop``, in the order of the synchronous querysets.
+        """
+        if (action or target) and not self.backend._has_indexes():
+            # views are filled up to the pages read
+            key, fill = await self._get_view(instance, (await self._get_source(instance, name))[0],
+                                             action=action, target=target)
+
+            if fill:
+                await fill(stop if desc and stop else None)
+        else:
+            key = (await self._get_source(instance, name, action=action, target=target))[0]
+
+        method = self.client.zrevrange if desc else self.client.zrange
+
+        scores = await method(key, start, -1 if stop is None else stop - 1, withscores=True)
+
+        results = await self.get_data_from_uid_list([uid for uid, score in scores])
+
+        expired = [uid for (uid, score), data in zip(scores, results) if not data]
+
+        if expired:
+            await self.prune(instance, name, key, expired, action=action, target=target)
+
+        actions = await self.get_action_list([data for data in results if data])
+
+        return [action for action in actions if action is not None]
+
+    async def prune(self, instance, name, key, uids, action=None, target=None):
+        """
+        Removes the expired actions ``uids`` found by a read of the sorted
+        set ``key`` from a timeline of an instance, see RedisBackend.prune.
+        """
+        pulled_uids = []
+
+        if key.endswith(get_key('', 'pulled')):
+            pulled_uids = await self._get_following_pulled_uids(instance)
+
+        params, temporary = self.backend._get_prune_params(await self.follow_backend.get_uid(instance),
+                                                           registry.get_identifier(instance),
+                                                           name,
+                                                           key,
+                                                           action=action,
+                                                           target=target,
+                                                           pulled_uids=pulled_uids)
+
+        async with self.client.pipeline(transaction=False) as pipe:
+            for uid in uids:
+                for keys, tracked in params:
+                    await self.delete_script(keys=keys, args=[uid, tracked], client=pipe)
+
+            for temporary_key in temporary:
+                pipe.zrem(temporary_key, *uids)
+
+            await pipe.execute()
+
+    async def get_timeline_count(self, instance, name, action=None, target=None):
+        key, counted = await self._get_source(instance, name, action=action, target=target)
+
+        if counted:
+            return await self.get_count(instance, name, action=action, target=target)
+
+        return await self.client.zcard(key)
+
+    async def get_private(self, instance, action=None, target=None, desc=True, *, start=0, stop=None):
+        return await self.get_timeline(instance, 'private', action=action, target=target,
+                                       start=start, stop=stop, desc=desc)
+
+    async def get_public(self, instance, action=None, target=None, desc=True, *, start=0, stop=None):
+        return await self.get_timeline(instance, 'public', action=action, target=target,
+                                       start=start, stop=stop, desc=desc)
+
+    async def get_private_count(self, instance, action=None, target=None):
+        return await self.get_timeline_count(instance, 'private', action=action, target=target)
+
+    async def get_public_count(self, instance, action=None, target=None):
+        return await self.get_timeline_count(instance, 'public', action=action, target=target)
+
+    async def mark_as_read(self, instance, timestamp=None):
+        uid = await self.follow_backend.get_uid(instance)
+
+        keys = [(await self._get_source(instance, 'private'))[0], self.backend._make_uid_key(uid, 'private')]
+
+        score = '%r' % to_precise_timestamp(timestamp) if timestamp is not None else ''
+
+        await self.mark_as_read_script(keys=keys + self.backend._get_unread_keys(uid),
+                                       args=[score, '%r' % to_precise_timestamp(datetime.now())],
+                                       client=self.client)
+
+    async def get_read_at(self, instance):
+        result = await self.client.get(await self._make_key(instance, 'read_at'))
+
+        if result:
+            return from_timestamp(float(result.split('|')[0]))
+
+        return None
+
+    async def get_unread_count(self, instance, read_at=None, action=None, target=None):
+        key, counted = await self._get_source(instance, 'private', action=action, target=target)
+
+        if read_at:
+            return await self.client.zcount(key, '(%r' % to_precise_timestamp(read_at), '+inf')
+
+        keys = self.backend._get_unread_keys(await self.follow_backend.get_uid(instance))
+
+        if not counted or action or target:
+            keys = keys[:1]
+
+        return await self.unread_script(keys=[key] + keys, client=self.client)
+
+    async def get_unread_counts(self, instances):
+        """
+        Returns the number of unread actions of the private timelines of a
+        list of instances in the same order, in a single round trip when no
+        actor is pulled.
+        """
+        pulled = get_setting('TIMELINE_PULL_THRESHOLD') is not None
+
+        sources = []
+
+        for instance, uid in zip(instances, await self.follow_backend.get_uids(instances)):
+            key, counted = (await self._get_source(instance, 'private') if pulled
+                            else (self.backend._make_uid_key(uid, 'private'), True))
+
+            keys = self.backend._get_unread_keys(uid)
+
+            sources.append([key] + (keys if counted else keys[:1]))
+
+        async with self.client.pipeline(transaction=False) as pipe:
+            for keys in sources:
+                await self.unread_script(keys=keys, client=pipe)
+
+            return [int(result) for result in await pipe.execute()]
@@ -1,46 +1,94 @@
 import six
 
+from functools import partial
+
 from django.db import models
 from django.utils import timezone as datetime
 
+from sequere.instrumentation import instrument, instruments
 from sequere.registry import registry
-from sequere.utils import get_client
-from sequere.backends.redis.managers import Manager
+from sequere.utils import get_client, get_setting, load_class
+from sequere.backends.redis import scripts as follow_scripts
+from sequere.backends.redis.query import zrange_after
 from sequere.backends.redis.utils import get_key
 from sequere import app
-from sequere.utils import to_timestamp, from_timestamp
+from sequere.utils import to_precise_timestamp, from_timestamp
 from sequere.contrib.timeline.action import Action, get_actions
 from sequere.contrib.timeline.exceptions import ActionDoesNotExist, ActionInvalid
+from sequere.contrib.timeline.utils import logger
 
+from . import scripts
 from .query import RedisTimelineQuerySetTransformer
 
+# lifetime of a merged timeline rebuilt on each read (TIMELINE_PULL_TTL = 0),
+# long enough for the lists returned by get_private to be read
+PULLED_KEY_LIFETIME = 60
+
+# number of actions read per round trip when a filtered view is built
+VIEW_WINDOW = 1000
+
+# value of the scan cursor of a filtered view built from its whole timeline
+VIEW_DONE = 'done'
+
 
 class RedisBackend(object):
     queryset_class = RedisTimelineQuerySetTransformer
+    async_backend_class = 'sequere.contrib.timeline.backends.redis.aio.AsyncRedisBackend'
 
     def __init__(self, *args, **kwargs):
         kwargs.setdefault('client_class', 'redis.StrictRedis')
+        kwargs.setdefault('async_client_class', 'redis.asyncio.StrictRedis')
         kwargs.setdefault('options', {'decode_responses': True})
         kwargs.setdefault('prefix', 'sequere:timeline:')
+        kwargs.setdefault('manager_class', 'sequere.contrib.timeline.backends.redis.managers.ActionManager')
+        kwargs.setdefault('pool_class', get_setting('CONNECTION_POOL_CLASS'))
+        kwargs.setdefault('pool_options', get_setting('CONNECTION_POOL_OPTIONS'))
 
-        self.client = get_client(kwargs['options'], connection_class=kwargs['client_class'])
+        self.client = get_client(kwargs['options'],
+                                 connection_class=kwargs['client_class'],
+                                 pool_class=kwargs['pool_class'],
+                                 pool_options=kwargs['pool_options'])
 
-        self.storage = Manager(self.client, prefix=kwargs['prefix'])
+        self.options = kwargs['options']
+        self.async_client_class = kwargs['async_client_class']
 
-    def _make_key(self, instance, name, action=None, target=None):
-        segments = [
-            self.storage.add_prefix('uid'),
-            app.backend.get_uid(instance),
-            name,
-        ]
+        self.storage = load_class(kwargs['manager_class'])(self.client,
+                                                           prefix=kwargs['prefix'],
+                                                           **kwargs.get('manager_options', {}))
+
+        self.save_script = self.client.register_script(scripts.SAVE)
+        self.delete_script = self.client.register_script(scripts.DELETE)
+        self.unread_script = self.client.register_script(scripts.UNREAD)
+        self.mark_as_read_script = self.client.register_script(scripts.MARK_AS_READ)
+        self.views_script = self.client.register_script(scripts.VIEWS)
+        self.range_after_script = self.client.register_script(follow_scripts.RANGE_AFTER)
+
+        self._async_backend = None
+
+    def get_async_backend(self):
+        """
+        Returns the asyncio mirror of the backend, created once per backend.
+        """
+        if self._async_backend is None:
+            self._async_backend = load_class(self.async_backend_class)(self)
+
+        return self._async_backend
+
+    def _get_target_identifier(self, target):
+        if isinstance(target, six.string_types):
+            return target
+
+        if isinstance(target, models.Model) or issubclass(target, models.Model):
+            return registry.get_identifier(target)
+
+    def _make_uid_key(self, uid, name, action=None, target=None):
+        segments = [self.storage.get_uid_key(uid, name)]
 
         if target:
-            if isinstance(target, six.string_types):
-                segments += ['target', target]
+            identifier = self._get_target_identifier(target)
 
-            else:
-                if isinstance(target, models.Model) or issubclass(target, models.Model):
-                    segments += ['target', registry.get_identifier(target)]
+            if identifier:
+                segments += ['target', identifier]
 
         if action:
             if isinstance(action, six.string_types):
@@ -52,36 +100,96 @@ class RedisBackend(object):
 
         return key
 
-    def _get_keys(self, instance, action):
-        identifier = registry.get_identifier(instance)
+    def _make_key(self, instance, name, action=None, target=None):
+        return self._make_uid_key(app.backend.get_uid(instance), name, action=action, target=target)
+
+    def _has_indexes(self):
+        return get_setting('TIMELINE_FILTER_MODE') != 'view'
+
+    def _get_action_target_identifier(self, action):
+        if action.target is not None and action.target != action.actor:
+            return registry.get_identifier(action.target)
+
+        return None
+
+    def _get_uid_keys(self, uid, identifier, action, is_actor):
+        return self._get_timeline_keys(uid, identifier, self._get_action_target_identifier(action), is_actor)
+
+    def _get_timeline_keys(self, uid, identifier, target_identifier, is_actor):
+        """
+        Returns the timelines of a uid an action is written to, the target
+        identifier being None when the action has no target or when its
+        target is its actor.
+        """
+        get_uid_key = partial(self.storage.get_uid_key, uid)
 
-        prefix = self.storage.add_prefix('uid')
+        if not self._has_indexes():
+            keys = [get_uid_key('private')]
 
-        uid = app.backend.get_uid(instance)
+            if is_actor:
+                keys.append(get_uid_key('public'))
+
+            return keys
 
         keys = [
-            get_key(prefix, uid, 'private'),
-            get_key(prefix, uid, 'private', 'target', identifier)
+            get_uid_key('private'),
+            get_uid_key('private', 'target', identifier)
         ]
 
-        if action.actor == instance:
-            keys.append(get_key(prefix, uid, 'public'))
-            keys.append(get_key(prefix, uid, 'public', 'target', identifier))
-
-        if action.target is not None and action.target != action.actor:
-            identifier = registry.get_identifier(action.target)
+        if is_actor:
+            keys.append(get_uid_key('public'))
+            keys.append(get_uid_key('public', 'target', identifier))
 
-            keys.append(get_key(prefix, uid, 'private', 'target', identifier))
+        if target_identifier is not None:
+            keys.append(get_uid_key('private', 'target', target_identifier))
 
-            if action.actor == instance:
-                keys.append(get_key(prefix, uid, 'public', 'target', identifier))
+            if is_actor:
+                keys.append(get_uid_key('public', 'target', target_identifier))
 
         return keys
 
+    def _get_keys(self, instance, action):
+        return self._get_uid_keys(app.backend.get_uid(instance),
+                                  registry.get_identifier(instance),
+                                  action,
+                                  action.actor == instance)
+
     def get_action(self, data):
         if isinstance(data, six.string_types + (int, )):
             return self.get_action(self.storage.get_data_from_uid(data))
 
+        return self._build_action(data, app.backend.get_from_uid)
+
+    def get_action_list(self, data_list):
+        """
+        Returns the actions of a list of action data in the same order (None
+        when invalid), the actors and the targets of every action are loaded
+        at once with one query per identifier.
+        """
+        with instruments.measure('timeline.hydrate', size=len(data_list), backend=self.__class__.__name__):
+            uids = list(set(data[attr_name]
+                            for data in data_list
+                            for attr_name in ('actor', 'target', )
+                            if data.get(attr_name, None)))
+
+            instances = dict(zip(uids, app.backend.get_from_uid_list(uids)))
+
+            actions = []
+
+            for data in data_list:
+                try:
+                    actions.append(self._build_action(data, instances.get))
+                except ActionInvalid as e:
+                    logger.exception(e)
+
+                    actions.append(None)
+
+            return actions
+
+    def _build_action(self, data, get_from_uid):
+        for attr_name in ('dispatch_total', 'dispatched', ):
+            data.pop(attr_name, None)
+
         verb = data['verb']
 
         actions = get_actions()
@@ -93,7 +201,7 @@ class RedisBackend(object):
 
         for attr_name in ('actor', 'target', ):
             if data.get(attr_name, None):
-                result = app.backend.get_from_uid(data[attr_name])
+                result = get_from_uid(data[attr_name])
 
                 if result is None:
                     raise ActionInvalid(data=data)
@@ -115,48 +223,337 @@ class RedisBackend(object):
             'verb': action.verb,
         }
 
-        timestamp = to_timestamp(action.date)
+        timestamp = to_precise_timestamp(action.date)
 
         result['timestamp'] = timestamp
 
         if action.target:
             result['target'] = app.backend.get_uid(action.target)
 
-        uid = self.storage.make_uid(result)
+        ttl = get_setting('TIMELINE_ACTION_TTL')
+
+        with self.client.pipeline() as pipe:
+            uid = self.storage.make_uid(result, client=pipe)
+
+            if ttl:
+                pipe.expire(self.storage.get_action_key(uid), ttl)
+
+            pipe.execute()
 
         action.uid = uid
         action.timestamp = timestamp
 
+    def _get_params(self, keys, verb):
+        params = []
+
+        indexes = self._has_indexes()
+
+        for key in keys:
+            params += [
+                key,
+                get_key(key, 'count'),
+            ]
+
+            if indexes:
+                params += [
+                    get_key(key, 'verb', verb),
+                    get_key(key, 'verb', verb, 'count'),
+                ]
+
+        return params
+
+    def _get_lengths(self, keys):
+        """
+        Returns the maximum length of the sorted sets of each key given to
+        _get_params from the kind of its timeline (private, public, outbox).
+        """
+        max_lengths = get_setting('TIMELINE_MAX_LENGTH') or {}
+
+        if not max_lengths:
+            return []
+
+        prefix = get_key(self.storage.add_prefix('uid'), '')
+
+        lengths = []
+
+        per_key = 2 if self._has_indexes() else 1
+
+        for key in keys:
+            kind = key[len(prefix):].split(get_setting('KEY_SEPARATOR'))[1]
+
+            lengths += [max_lengths.get(kind) or 0] * per_key
+
+        return lengths
+
+    @instrument('timeline.save')
     def save(self, instance, action):
         if action.uid is None:
             self._save(action)
 
-        with self.client.pipeline() as pipe:
-            for key in self._get_keys(instance, action):
-                pipe.incr(get_key(key, 'count'))
-                pipe.incr(get_key(key, 'verb', action.verb, 'count'))
+        keys = self._get_keys(instance, action)
 
-                pipe.zadd(key, **{
-                    '%s' % action.uid: action.timestamp
-                })
+        with self.client.pipeline(transaction=False) as pipe:
+            self.save_script(keys=self._get_params(keys, action.verb) + self._get_unread_keys(app.backend.get_uid(instance)),
+                             args=['%s' % action.uid, action.timestamp, 0, 1] + self._get_lengths(keys),
+                             client=pipe)
 
-                pipe.zadd(get_key(key, 'verb', action.verb), **{
-                    '%s' % action.uid: action.timestamp
-                })
+            self._update_views(pipe, keys, registry.get_identifier(instance), action.verb,
+                               self._get_action_target_identifier(action), action.uid, action.timestamp)
 
             pipe.execute()
 
+    @instrument('timeline.save_many')
+    def save_many(self, uids, identifier, action):
+        """
+        Adds an action to the timelines of the uids of a same identifier in a
+        single round trip, the instances behind the uids are not loaded.
+
+        The uids already having the action are left untouched and the others
+        are counted in the progress of the dispatch of the action.
+        """
+        if action.uid is None:
+            self._save(action)
+
+        action_key = self.storage.get_progress_key(action.uid)
+
+        # the progress of the dispatch is stored on another shard than the
+        # timelines, it is incremented once the timelines are saved
+        progress = [] if self.storage.hash_tags else [action_key]
+
+        lengths = None
+
+        target_identifier = self._get_action_target_identifier(action)
+
+        views = not self._has_indexes()
+
+        with self.client.pipeline(transaction=False) as pipe:
+            for uid in uids:
+                keys = self._get_uid_keys(uid, identifier, action, False)
+
+                # the timelines of the uids share the same layout
+                if lengths is None:
+                    lengths = self._get_lengths(keys)
+
+                self.save_script(keys=self._get_params(keys, action.verb) + self._get_unread_keys(uid) + progress,
+                                 args=['%s' % action.uid, action.timestamp, len(progress), 1] + lengths,
+                                 client=pipe)
+
+                self._update_views(pipe, keys, identifier, action.verb, target_identifier,
+                                   action.uid, action.timestamp)
+
+            results = pipe.execute()
+
+            saved = sum(results[::2] if views else results)
+
+        if saved and not progress:
+            self.client.hincrby(action_key, 'dispatched', saved)
+
+        return saved
+
+    @instrument('timeline.delete')
     def delete(self, instance, action):
+        keys = self._get_keys(instance, action)
+
+        with self.client.pipeline(transaction=False) as pipe:
+            self.delete_script(keys=(self._get_params(keys, action.verb) +
+                                     self._get_unread_keys(app.backend.get_uid(instance))),
+                               args=['%s' % action.uid, 1],
+                               client=pipe)
+
+            self._update_views(pipe, keys, registry.get_identifier(instance), action.verb,
+                               self._get_action_target_identifier(action), action.uid, action.timestamp, add=False)
+
+            pipe.execute()
+
+    def _get_view_name(self, key, verb=None, target=None):
+        segments = [key]
+
+        if target:
+            segments += ['target', target]
+
+        if verb:
+            segments += ['verb', verb]
+
+        return get_key(*(segments + ['view']))
+
+    def _get_view_keys(self, keys, identifier, verb, target_identifier):
+        """
+        Returns the filtered views (view, scan cursor, ...) of the timelines
+        ``keys`` of an owner an action of a verb and a target identifier
+        belongs to, see _get_view.
+        """
+        targets = [None]
+
+        if target_identifier is not None and target_identifier != identifier:
+            targets.append(target_identifier)
+
+        views = []
+
+        for key in keys:
+            for target in targets:
+                for view_verb in (None, verb):
+                    if target is None and view_verb is None:
+                        continue
+
+                    view_key = self._get_view_name(key, view_verb, target)
+
+                    views += [view_key, get_key(view_key, 'cursor')]
+
+        return views
+
+    def _update_views(self, pipe, keys, identifier, verb, target_identifier, uid, score, add=True):
+        """
+        Queues the update of the filtered views of the timelines ``keys``
+        which are alive when an action is added or removed, views are only
+        maintained in the view filter mode.
+        """
+        if self._has_indexes():
+            return
+
+        self.views_script(keys=self._get_view_keys(keys, identifier, verb, target_identifier),
+                          args=['%s' % uid, score, 1 if add else 0],
+                          client=pipe)
+
+    def _get_targets(self, uid, data_list):
+        """
+        Returns the identifier of a uid and the target identifiers of a
+        list of action data (see _get_timeline_keys), instances are not
+        loaded.
+        """
+        uids = list(set(data['target'] for data in data_list
+                        if data.get('target') and data['target'] != data['actor']))
+
+        identifiers = dict(zip([uid] + uids, app.backend.get_identifiers([uid] + uids)))
+
+        return identifiers[uid], [identifiers.get(data['target'])
+                                  if data.get('target') and data['target'] != data['actor'] else None
+                                  for data in data_list]
+
+    @instrument('timeline.import_actions')
+    def import_actions(self, from_uid, to_uid, limit=None):
+        """
+        Copies the latest actions of the public timeline of a uid to the
+        private timeline of one of its followers in a constant number of
+        round trips, counters are updated by the same calls.
+
+        The actions of a pulled actor are left in its outbox, they are
+        merged when the follower reads its timeline.
+        """
+        limit = limit or get_setting('TIMELINE_POPULATE_LIMIT')
+
+        with self.client.pipeline() as pipe:
+            pipe.sismember(self.get_pulled_actors_key(), from_uid)
+            pipe.zrevrange(self._make_uid_key(from_uid, 'public'), 0, limit - 1, withscores=True)
+
+            pulled, scores = pipe.execute()
+
+        if pulled or not scores:
+            return 0
+
+        data_list = self.storage.get_data_from_uid_list([uid for uid, score in scores])
+
+        identifier, targets = self._get_targets(to_uid, data_list)
+
+        unread_keys = self._get_unread_keys(to_uid)
+
+        views = not self._has_indexes()
+
+        with self.client.pipeline(transaction=False) as pipe:
+            for (uid, score), data, target_identifier in zip(scores, data_list, targets):
+                # expired actions
+                if not data:
+                    continue
+
+                keys = self._get_timeline_keys(to_uid, identifier, target_identifier, False)
+
+                self.save_script(keys=self._get_params(keys, data['verb']) + unread_keys,
+                                 args=[uid, score, 0, 1] + self._get_lengths(keys),
+                                 client=pipe)
+
+                self._update_views(pipe, keys, identifier, data['verb'], target_identifier, uid, score)
+
+            results = pipe.execute()
+
+            return sum(results[::2] if views else results)
+
+    @instrument('timeline.remove_actions')
+    def remove_actions(self, from_uid, to_uid):
+        """
+        Removes the actions of the public timeline of a uid from the private
+        timeline of one of its former followers in a constant number of
+        round trips, counters are updated by the same calls.
+        """
+        private_key = self._make_uid_key(to_uid, 'private')
+
+        removed_key = get_key(private_key, 'removed', from_uid)
+
         with self.client.pipeline() as pipe:
-            for key in self._get_keys(instance, action):
-                pipe.decr(get_key(key, 'count'))
-                pipe.decr(get_key(key, 'verb', action.verb, 'count'))
+            pipe.zinterstore(removed_key, [private_key, self._make_uid_key(from_uid, 'public')])
+            pipe.zrange(removed_key, 0, -1)
+            pipe.delete(removed_key)
+
+            uids = pipe.execute()[1]
+
+        if not uids:
+            return 0
+
+        data_list = self.storage.get_data_from_uid_list(uids)
+
+        identifier, targets = self._get_targets(to_uid, data_list)
+
+        unread_keys = self._get_unread_keys(to_uid)
+
+        # positions of the results of the DELETE scripts in the pipeline
+        positions = []
+
+        with self.client.pipeline(transaction=False) as pipe:
+            for uid, data, target_identifier in zip(uids, data_list, targets):
+                if data:
+                    keys = self._get_timeline_keys(to_uid, identifier, target_identifier, False)
 
-                pipe.zrem(key, '%s' % action.uid)
-                pipe.zrem(get_key(key, 'verb', action.verb), '%s' % action.uid)
+                    params = self._get_params(keys, data['verb'])
+                else:
+                    # expired actions are only removed from the unfiltered timeline
+                    params = [private_key, get_key(private_key, 'count')]
+
+                positions.append(len(pipe))
+
+                self.delete_script(keys=params + unread_keys, args=[uid, 1], client=pipe)
+
+                if data:
+                    self._update_views(pipe, keys, identifier, data['verb'], target_identifier, uid, 0, add=False)
+
+            results = pipe.execute()
+
+            return sum(results[i] for i in positions)
+
+    def start_dispatch(self, action, total):
+        key = self.storage.get_progress_key(action.uid)
+
+        ttl = self.storage.get_progress_ttl()
+
+        with self.client.pipeline() as pipe:
+            pipe.hset(key, 'dispatch_total', total)
+
+            if ttl:
+                pipe.expire(key, ttl)
 
             pipe.execute()
 
+    def get_dispatch_progress(self, action_uid):
+        """
+        Returns the number of followers the action has to be dispatched to
+        and the number of followers which have already received it.
+        """
+        total, dispatched = self.client.hmget(self.storage.get_progress_key(action_uid),
+                                              ['dispatch_total', 'dispatched'])
+
+        return {
+            'total': int(total or 0),
+            'dispatched': int(dispatched or 0),
+        }
+
+    @instrument('timeline.get_count')
     def get_count(self, instance, name, action=None, target=None):
         key = get_key(self._make_key(instance, name, action=action, target=target), 'count')
 
@@ -168,54 +565,459 @@ class RedisBackend(object):
         return 0
 
     def get_read_key(self, instance):
-        segments = [
-            self.storage.add_prefix('uid'),
-            app.backend.get_uid(instance),
-            'read_at'
+        return self._make_key(instance, 'read_at')
+
+    def _get_unread_keys(self, uid):
+        """
+        Returns the read cursor and the unread counter of the private
+        timeline of a uid.
+        """
+        return [
+            self._make_uid_key(uid, 'read_at'),
+            self._make_uid_key(uid, 'unread'),
         ]
 
-        return get_key(*segments)
+    @instrument('timeline.mark_as_read')
+    def mark_as_read(self, instance, timestamp=None):
+        """
+        Marks the private timeline of an instance as read up to a date or,
+        without date, up to its latest action.
+        """
+        keys = [self._get_source(instance, 'private')[0], self._make_key(instance, 'private')]
+
+        score = '%r' % to_precise_timestamp(timestamp) if timestamp is not None else ''
 
-    def mark_as_read(self, instance, timestamp):
-        self.client.set(self.get_read_key(instance), to_timestamp(timestamp))
+        self.mark_as_read_script(keys=keys + self._get_unread_keys(app.backend.get_uid(instance)),
+                                 args=[score, '%r' % to_precise_timestamp(datetime.now())])
 
     def get_read_at(self, instance):
         result = self.client.get(self.get_read_key(instance))
 
         if result:
-            return from_timestamp(float(result))
+            return from_timestamp(float(result.split('|')[0]))
 
         return None
 
-    def get_unread_count(self, instance, read_at, action=None, target=None):
-        if read_at:
-            read_at = to_timestamp(read_at)
+    def get_pulled_actors_key(self):
+        return self.storage.add_prefix('pulled')
 
-        key = self._make_key(instance, 'private', action=action, target=target)
+    def _get_outbox_keys(self, uid, action):
+        keys = [self.storage.get_uid_key(uid, 'outbox')]
 
-        return self.client.zcount(key, read_at, to_timestamp(datetime.now()))
+        if not self._has_indexes():
+            return keys
+
+        if action.target is not None and action.target != action.actor:
+            keys.append(self.storage.get_uid_key(uid, 'outbox', 'target', registry.get_identifier(action.target)))
+
+        return keys
+
+    @instrument('timeline.save_pulled')
+    def save_pulled(self, action):
+        """
+        Marks the actor of an action as pulled and stores the action in its
+        outbox, laid out like the private timelines of its followers.
+        """
+        uid = app.backend.get_uid(action.actor)
+
+        keys = self._get_outbox_keys(uid, action)
+
+        with self.client.pipeline() as pipe:
+            pipe.sadd(self.get_pulled_actors_key(), uid)
+
+            self.save_script(keys=self._get_params(keys, action.verb),
+                             args=['%s' % action.uid, action.timestamp, 0, 0] + self._get_lengths(keys),
+                             client=pipe)
+
+            pipe.execute()
+
+    def get_pulled_uids(self, uids):
+        """
+        Returns the uids among ``uids`` of the pulled actors.
+        """
+        with self.client.pipeline() as pipe:
+            for uid in uids:
+                pipe.sismember(self.get_pulled_actors_key(), uid)
+
+            return [uid for uid, pulled in zip(uids, pipe.execute()) if pulled]
+
+    def remove_pulled(self, uid):
+        """
+        Stops pulling the actions of an actor, returns False when it was not
+        pulled. Its outbox is kept and merged again if it gets pulled again.
+        """
+        return bool(self.client.srem(self.get_pulled_actors_key(), uid))
+
+    def _get_following_pulled_uids(self, instance):
+        """
+        Returns the uids of the pulled actors followed by an instance,
+        intersected by Redis when the follow backend shares the client of
+        the timelines.
+        """
+        if getattr(app.backend, 'client', None) is self.client:
+            return app.backend.intersect_following_uids(instance, self.get_pulled_actors_key())
+
+        uids = self.client.smembers(self.get_pulled_actors_key())
+
+        if not uids:
+            return []
+
+        return app.backend.get_following_uids(instance, list(uids))
+
+    def _get_pulled_key(self, instance, action=None, target=None):
+        """
+        Returns a temporary key merging the private timeline of an instance
+        with the outboxes of the pulled actors it follows, None when it does
+        not follow any of them.
+        """
+        if get_setting('TIMELINE_PULL_THRESHOLD') is None:
+            return None
 
-    def get_private(self, instance, action=None, target=None, desc=True):
         key = self._make_key(instance, 'private', action=action, target=target)
 
-        return self.retrieve_instances(key, self.get_private_count(instance, action=action, target=target), desc=desc)
+        pulled_key = get_key(key, 'pulled')
+
+        ttl = get_setting('TIMELINE_PULL_TTL')
+
+        # the pulled actors are only looked up when the merge is rebuilt
+        if ttl and self.client.exists(pulled_key):
+            return pulled_key
+
+        uids = self._get_following_pulled_uids(instance)
+
+        if not uids:
+            return None
+
+        # all the actions pushed to a follower land in its private timeline
+        # filtered by its own identifier
+        target = self._get_target_identifier(target) if target else None
+
+        if target == registry.get_identifier(instance):
+            target = None
+
+        keys = [key] + [self._make_uid_key(uid, 'outbox', action=action, target=target) for uid in uids]
+
+        with self.client.pipeline() as pipe:
+            pipe.zunionstore(pulled_key, keys, aggregate='MAX')
+            pipe.expire(pulled_key, ttl or PULLED_KEY_LIFETIME)
+            pipe.execute()
+
+        return pulled_key
+
+    def _get_view(self, instance, key, action=None, target=None):
+        """
+        Returns a temporary key holding the actions of the timeline ``key``
+        of an instance filtered by verb and target, and a callable filling it
+        up to a number of actions (see _fill_view), None when the timeline is
+        not filtered.
+
+        Views are kept ``TIMELINE_VIEW_TTL`` seconds, the actions saved and
+        deleted meanwhile are added and removed by _update_views.
+        """
+        verb = action if isinstance(action, six.string_types) or action is None else action.verb
+
+        target = self._get_target_identifier(target) if target else None
+
+        # all the actions of a timeline are filtered by the identifier of
+        # its owner with indexes
+        if target == registry.get_identifier(instance):
+            target = None
+
+        if verb is None and target is None:
+            return key, None
+
+        view_key = self._get_view_name(key, verb, target)
+
+        ttl = get_setting('TIMELINE_VIEW_TTL')
+
+        if not ttl or not self.client.exists(get_key(view_key, 'cursor')):
+            with self.client.pipeline() as pipe:
+                pipe.delete(view_key)
+                pipe.set(get_key(view_key, 'cursor'), '', ex=ttl or PULLED_KEY_LIFETIME)
+                pipe.execute()
+
+        return view_key, partial(self._fill_view, key, view_key, verb, target)
+
+    def _filter_view(self, scores, data_list, verb, target, identifiers):
+        """
+        Returns the actions (uid -> score) of a window of a timeline matching
+        a verb and a target identifier.
+        """
+        matches = {}
+
+        for (uid, score), data in zip(scores, data_list):
+            if not data or (verb and data['verb'] != verb):
+                continue
+
+            if target and identifiers.get(data.get('target')) != target:
+                continue
+
+            matches[uid] = score
+
+        return matches
+
+    def _get_view_cursor(self, scores):
+        if len(scores) < VIEW_WINDOW:
+            return VIEW_DONE
+
+        uid, score = scores[-1]
+
+        return '%r|%s' % (score, uid)
+
+    def _parse_view_cursor(self, cursor):
+        if not cursor or cursor == VIEW_DONE:
+            return None
+
+        score, uid = cursor.split('|', 1)
+
+        return float(score), uid
+
+    def _fill_view(self, key, view_key, verb, target, limit=None):
+        """
+        Scans the timeline ``key`` of a view from its scan cursor, newest
+        actions first, until the view holds ``limit`` actions newer than the
+        cursor or the whole timeline has been scanned. Returns the number of
+        actions of the view.
+        """
+        cursor_key = get_key(view_key, 'cursor')
+
+        ttl = get_setting('TIMELINE_VIEW_TTL') or PULLED_KEY_LIFETIME
+
+        with self.client.pipeline() as pipe:
+            pipe.zcard(view_key)
+            pipe.get(cursor_key)
+
+            count, cursor = pipe.execute()
+
+        position = self._parse_view_cursor(cursor)
+
+        # the actions saved meanwhile below the cursor are not counted
+        scanned = self.client.zcount(view_key, position[0], '+inf') if position else 0
+
+        # an expired cursor is rebuilt by the next read
+        while cursor is not None and cursor != VIEW_DONE and (limit is None or scanned < limit):
+            scores = zrange_after(self.client, key, VIEW_WINDOW, self.range_after_script, cursor=position)
+
+            data_list = self.storage.get_data_from_uid_list([uid for uid, score in scores])
+
+            identifiers = {}
+
+            if target:
+                uids = list(set(data['target'] for data in data_list
+                                if data.get('target') and data['target'] != data['actor']))
+
+                identifiers = dict(zip(uids, app.backend.get_identifiers(uids)))
+
+            matches = self._filter_view(scores, data_list, verb, target, identifiers)
+
+            cursor = self._get_view_cursor(scores)
+
+            position = self._parse_view_cursor(cursor)
+
+            with self.client.pipeline() as pipe:
+                if matches:
+                    pipe.zadd(view_key, matches)
+
+                pipe.expire(view_key, ttl)
+                pipe.set(cursor_key, cursor, ex=ttl)
+                pipe.zcard(view_key)
+                pipe.zcount(view_key, position[0] if position else '-inf', '+inf')
+
+                count, scanned = pipe.execute()[-2:]
+
+        return count
+
+    def _get_source(self, instance, name, action=None, target=None):
+        """
+        Returns the key a timeline is read from and whether its count is
+        stored in a counter (False for merged timelines and views).
+        """
+        view = (action or target) and not self._has_indexes()
+
+        if view:
+            key, fill = self._get_view(instance, self._get_source(instance, name)[0], action=action, target=target)
+
+            if fill:
+                fill()
+
+            return key, False
+
+        if name == 'private':
+            pulled_key = self._get_pulled_key(instance, action=action, target=target)
+
+            if pulled_key:
+                return pulled_key, False
+
+        return self._make_key(instance, name, action=action, target=target), True
+
+    @instrument('timeline.get_unread_count')
+    def get_unread_count(self, instance, read_at=None, action=None, target=None):
+        """
+        Returns the number of actions of the private timeline of an instance
+        after a date or, without date, after its read cursor.
+        """
+        key, counted = self._get_source(instance, 'private', action=action, target=target)
+
+        if read_at:
+            return self.client.zcount(key, '(%r' % to_precise_timestamp(read_at), '+inf')
+
+        keys = self._get_unread_keys(app.backend.get_uid(instance))
+
+        # the unread counter is maintained for the whole private timeline
+        if not counted or action or target:
+            keys = keys[:1]
+
+        return self.unread_script(keys=[key] + keys)
+
+    @instrument('timeline.get_unread_counts')
+    def get_unread_counts(self, instances):
+        """
+        Returns the number of unread actions of the private timelines of a
+        list of instances in the same order, in a single round trip when no
+        actor is pulled.
+        """
+        pulled = get_setting('TIMELINE_PULL_THRESHOLD') is not None
+
+        with self.client.pipeline(transaction=False) as pipe:
+            for instance, uid in zip(instances, app.backend.get_uids(instances)):
+                key, counted = (self._get_source(instance, 'private') if pulled
+                                else (self._make_uid_key(uid, 'private'), True))
+
+                keys = self._get_unread_keys(uid)
+
+                if not counted:
+                    keys = keys[:1]
+
+                self.unread_script(keys=[key] + keys, client=pipe)
+
+            return [int(result) for result in pipe.execute()]
+
+    def get_private(self, instance, action=None, target=None, desc=True):
+        return self.get_timeline(instance, 'private', action=action, target=target, desc=desc)
 
     def get_public(self, instance, action=None, target=None, desc=True):
-        key = self._make_key(instance, 'public', action=action, target=target)
+        return self.get_timeline(instance, 'public', action=action, target=target, desc=desc)
+
+    def get_timeline(self, instance, name, action=None, target=None, desc=True):
+        fill = None
+
+        if (action or target) and not self._has_indexes():
+            # views are filled up to the pages read
+            key, fill = self._get_view(instance, self._get_source(instance, name)[0], action=action, target=target)
+
+            count = fill or partial(self.client.zcard, key)
+        else:
+            key, counted = self._get_source(instance, name, action=action, target=target)
+
+            if counted:
+                count = partial(self.get_count, instance, name, action=action, target=target)
+            else:
+                count = partial(self.client.zcard, key)
+
+        return self.retrieve_instances(key, count, desc=desc,
+                                       prune=partial(self.prune, instance, name, key, action=action, target=target),
+                                       fill=fill)
+
+    def _get_prune_params(self, uid, identifier, name, key, action=None, target=None, pulled_uids=()):
+        """
+        Returns the parameters (keys, args) of the DELETE scripts removing
+        expired actions from a timeline of a uid read from the sorted set
+        ``key``, and the temporary keys (merged timelines and views) holding
+        them too.
+
+        The data of an expired action is gone, it is removed from the
+        unfiltered timeline and the filtered one which has been read, other
+        indexes are pruned when they are read.
+        """
+        unfiltered = self._make_uid_key(uid, name)
+
+        keys = [unfiltered, get_key(unfiltered, 'count')]
+
+        if self._has_indexes():
+            filtered = self._make_uid_key(uid, name, action=action, target=target)
+
+            if filtered != unfiltered:
+                keys += [filtered, get_key(filtered, 'count')]
+
+        if name == 'private':
+            params = [(keys + self._get_unread_keys(uid), 1)]
+        else:
+            params = [(keys, 0)]
+
+        if pulled_uids:
+            target = self._get_target_identifier(target) if target else None
+
+            if target == identifier:
+                target = None
+
+            for pulled_uid in pulled_uids:
+                outbox = self._make_uid_key(pulled_uid, 'outbox')
+
+                keys = [outbox, get_key(outbox, 'count')]
+
+                if self._has_indexes():
+                    filtered = self._make_uid_key(pulled_uid, 'outbox', action=action, target=target)
+
+                    if filtered != outbox:
+                        keys += [filtered, get_key(filtered, 'count')]
+
+                params.append((keys, 0))
+
+        temporary = [key] if key not in [param for keys, tracked in params for param in keys] else []
+
+        return params, temporary
+
+    @instrument('timeline.prune')
+    def prune(self, instance, name, key, uids, action=None, target=None):
+        """
+        Removes the expired actions ``uids`` found by a read of the sorted
+        set ``key`` from a timeline of an instance, its counters and its
+        unread counter are updated by the same calls.
+        """
+        pulled_uids = []
+
+        if key.endswith(get_key('', 'pulled')):
+            pulled_uids = self._get_following_pulled_uids(instance)
+
+        params, temporary = self._get_prune_params(app.backend.get_uid(instance),
+                                                   registry.get_identifier(instance),
+                                                   name,
+                                                   key,
+                                                   action=action,
+                                                   target=target,
+                                                   pulled_uids=pulled_uids)
+
+        with self.client.pipeline(transaction=False) as pipe:
+            for uid in uids:
+                for keys, tracked in params:
+                    self.delete_script(keys=keys, args=[uid, tracked], client=pipe)
+
+            for temporary_key in temporary:
+                pipe.zrem(temporary_key, *uids)
+
+            pipe.execute()
+
+    def get_timeline_count(self, instance, name, action=None, target=None):
+        key, counted = self._get_source(instance, name, action=action, target=target)
+
+        if counted:
+            return self.get_count(instance, name, action=action, target=target)
 
-        return self.retrieve_instances(key, self.get_public_count(instance, action=action, target=target), desc=desc)
+        return self.client.zcard(key)
 
     def get_private_count(self, instance, action=None, target=None):
-        return self.get_count(instance, 'private', action=action, target=target)
+        return self.get_timeline_count(instance, 'private', action=action, target=target)
 
     def get_public_count(self, instance, action=None, target=None, desc=True):
-        return self.get_count(instance, 'public', action=action, target=target)
+        return self.get_timeline_count(instance, 'public', action=action, target=target)
 
-    def retrieve_instances(self, key, count, desc):
+    def retrieve_instances(self, key, count, desc, prune=None, fill=None):
         transformer = self.queryset_class(self,
                                           count,
                                           key=key,
-                                          prefix=self.storage.prefix)
+                                          prefix=self.storage.prefix,
+                                          prune=prune,
+                                          fill=fill)
         transformer.order_by(desc)
 
         return transformer
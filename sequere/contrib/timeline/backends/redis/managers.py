@@ -0,0 +1,170 @@
+import six
+import threading
+
+from sequere.backends.redis.managers import Manager
+from sequere.backends.redis.utils import get_key
+from sequere.contrib.timeline.action import get_actions
+from sequere.utils import get_setting
+
+from . import scripts
+
+
+class ActionManager(Manager):
+    """
+    Stores each action in its own hash (``uid:<uuid>``) with its actor, verb,
+    timestamp and target as fields.
+    """
+    def get_action_key(self, uid):
+        return self.get_uid_key(uid)
+
+    def get_progress_key(self, uid):
+        return self.get_action_key(uid)
+
+    def get_progress_ttl(self):
+        return get_setting('TIMELINE_ACTION_TTL')
+
+    def get_data_from_uid_list(self, uid_list):
+        with self.client.pipeline() as pipe:
+            self.read_data(pipe, uid_list)
+
+            return self.parse_data(uid_list, pipe.execute())
+
+    def read_data(self, pipe, uid_list):
+        """
+        Queues the commands reading the data of a list of uids on a
+        pipeline, the results are decoded by parse_data.
+        """
+        for uid in uid_list:
+            pipe.hgetall(self.get_action_key(uid))
+
+    def parse_data(self, uid_list, results):
+        return results
+
+
+class CompactActionManager(ActionManager):
+    """
+    Packs each action in a single field of a bucket hash: integer uids are
+    split in ``bucket_size`` fields per hash (``actions:<uid // bucket_size>``)
+    so buckets stay small enough for Redis to keep them in their compact
+    encoding (``hash-max-listpack-entries``, 128 by default).
+
+    Values are ``<verb id>|<timestamp>|<actor>|<target>``, timestamps being
+    stored in microseconds and verbs interned to small integers in the
+    ``verbs`` hash. The progress of a dispatch is
+    kept ``progress_ttl`` seconds in its own ``dispatch:<uid>`` hash and
+    expiring actions expire with their whole bucket.
+    """
+    separator = '|'
+
+    def __init__(self, client, prefix=None, cache=None, bucket_size=100, progress_ttl=86400):
+        super(CompactActionManager, self).__init__(client, prefix=prefix, cache=cache)
+
+        self.bucket_size = bucket_size
+        self.progress_ttl = progress_ttl
+
+        self.intern_script = self.client.register_script(scripts.INTERN)
+
+        self._verb_ids = {}
+        self._verbs = {}
+        self._lock = threading.Lock()
+
+    def get_verbs_key(self):
+        return self.add_prefix(self.tag('verbs'))
+
+    def get_verb_id_key(self):
+        # interned by the same script as the verbs so stored on their shard
+        if self.hash_tags:
+            return self.add_prefix(get_key(self.tag('verbs'), 'id'))
+
+        return self.add_prefix('verb_id')
+
+    def get_action_key(self, uid):
+        return self.add_prefix(get_key('actions', int(uid) // self.bucket_size))
+
+    def get_progress_key(self, uid):
+        return self.add_prefix(get_key('dispatch', uid))
+
+    def get_progress_ttl(self):
+        return self.progress_ttl
+
+    def load_verbs(self):
+        """
+        Interns the verbs of the registered actions and loads the ids of
+        every known verb.
+        """
+        results = self.intern_script(keys=[self.get_verbs_key(), self.get_verb_id_key()],
+                                     args=sorted(get_actions()))
+
+        with self._lock:
+            for verb, verb_id in zip(results[::2], results[1::2]):
+                self._verb_ids[verb] = int(verb_id)
+                self._verbs[int(verb_id)] = verb
+
+    def get_verb_id(self, verb):
+        if verb not in self._verb_ids:
+            self.load_verbs()
+
+            if verb not in self._verb_ids:
+                self.intern_script(keys=[self.get_verbs_key(), self.get_verb_id_key()], args=[verb])
+
+                self.load_verbs()
+
+        return self._verb_ids[verb]
+
+    def get_verb(self, verb_id):
+        if verb_id not in self._verbs:
+            self.load_verbs()
+
+        return self._verbs.get(verb_id)
+
+    def encode(self, data):
+        return self.separator.join([
+            '%d' % self.get_verb_id(data['verb']),
+            '%d' % round(float(data['timestamp']) * 1000000),
+            data['actor'],
+            data.get('target') or '',
+        ])
+
+    def decode(self, uid, value):
+        verb_id, timestamp, actor, target = value.split(self.separator, 3)
+
+        data = {
+            'uid': uid,
+            'verb': self.get_verb(int(verb_id)),
+            'timestamp': int(timestamp) / 1000000.0,
+            'actor': actor,
+        }
+
+        if target:
+            data['target'] = target
+
+        return data
+
+    def make_uid(self, data, client=None):
+        client = client or self.client
+
+        uid = '%d' % self.client.incr(self.add_prefix('action_uid'))
+
+        data['uid'] = uid
+
+        client.hset(self.get_action_key(uid), int(uid) % self.bucket_size, self.encode(data))
+
+        return uid
+
+    def get_data_from_uid(self, uid):
+        return self.get_data_from_uid_list([uid])[0]
+
+    def read_data(self, pipe, uid_list):
+        for uid in uid_list:
+            pipe.hget(self.get_action_key(uid), int(uid) % self.bucket_size)
+
+    def parse_data(self, uid_list, results):
+        return [self.decode(six.text_type(uid), value) if value else {}
+                for uid, value in zip(uid_list, results)]
+
+    def clear(self):
+        super(CompactActionManager, self).clear()
+
+        with self._lock:
+            self._verb_ids.clear()
+            self._verbs.clear()
@@ -1,13 +1,8 @@
 from sequere.query import QuerySetTransformer
 
-from sequere.backends.redis.utils import get_key
-
-from sequere.contrib.timeline.exceptions import ActionInvalid
-from sequere.contrib.timeline.utils import logger
-
 
 class TimelineQuerySetTransformer(QuerySetTransformer):
-    def __init__(self, backend, count, key, prefix=None):
+    def __init__(self, backend, count, key, prefix=None, prune=None, fill=None):
         client = backend.client
 
         super(TimelineQuerySetTransformer, self).__init__(client, count)
@@ -16,9 +11,12 @@ class TimelineQuerySetTransformer(QuerySetTransformer):
         self.keys = [key, ]
         self.order_by(False)
         self.prefix = prefix or ''
+        self.prune = prune
+        self.fill = fill
 
     def order_by(self, desc):
         self.desc = desc
+        self._result_cache = {}
 
         if desc:
             self.method = getattr(self.qs, 'zrevrangebyscore')
@@ -35,6 +33,10 @@ class TimelineQuerySetTransformer(QuerySetTransformer):
         start = self.start or 0
         stop = self.stop or -1
 
+        # filtered views are scanned up to the last action read
+        if self.fill:
+            self.fill(self.stop if self.desc and self.stop else None)
+
         scores = self.method(*self.pieces,
                              start=start,
                              num=stop - start,
@@ -48,23 +50,13 @@ class TimelineQuerySetTransformer(QuerySetTransformer):
 
 class RedisTimelineQuerySetTransformer(TimelineQuerySetTransformer):
     def _transform(self, scores):
-        with self.qs.pipeline() as pipe:
-            for uid, score in scores:
-                pipe.hgetall(get_key(self.prefix, 'uid', uid))
-
-            results = pipe.execute()
+        results = self.backend.storage.get_data_from_uid_list([uid for uid, score in scores])
 
-            actions = []
+        expired = [uid for (uid, score), data in zip(scores, results) if not data]
 
-            for data in results:
-                if not data:
-                    continue
+        if expired and self.prune:
+            self.prune(expired)
 
-                try:
-                    action = self.backend.get_action(data)
-                except ActionInvalid as e:
-                    logger.exception(e)
-                else:
-                    actions.append(action)
+        actions = self.backend.get_action_list([data for data in results if data])
 
-            return actions
+        return [action for action in actions if action is not None]
@@ -0,0 +1,245 @@
+# Read cursors are stored as "<score>|<member>" (or a bare score when the
+# timeline has been marked as read at a given date): the actions after the
+# cursor are unread, members sharing its score are ordered like the sorted
+# set.
+CURSOR = """
+local function parse_cursor(cursor)
+    if not cursor then
+        return nil, nil
+    end
+
+    local score, member = string.match(cursor, '^([^|]*)|?(.*)$')
+
+    return score, member
+end
+
+local function is_unread(cursor_score, cursor_member, score, member)
+    if not cursor_score then
+        return true
+    end
+
+    score, cursor_score = tonumber(score), tonumber(cursor_score)
+
+    return score > cursor_score or (score == cursor_score and cursor_member ~= '' and member > cursor_member)
+end
+
+local function count_unread(key, cursor_score, cursor_member)
+    if not cursor_score then
+        return redis.call('ZCARD', key)
+    end
+
+    local count = redis.call('ZCOUNT', key, '(' .. cursor_score, '+inf')
+
+    if cursor_member ~= '' then
+        local ties = redis.call('ZRANGEBYSCORE', key, cursor_score, cursor_score)
+
+        for i = 1, #ties do
+            if ties[i] > cursor_member then
+                count = count + 1
+            end
+        end
+    end
+
+    return count
+end
+"""
+
+# KEYS layout shared by SAVE and DELETE, see RedisBackend._get_params:
+#
+#  sorted set, count, sorted set, count, ... then when ARGV[4] ('1') asks
+#  for it the read cursor and the unread counter of the owner of the first
+#  sorted set and when ARGV[3] is '1' the progress hash of the action as last
+#  key to report its dispatch.
+#
+# ARGV: action uid, timestamp, '1' to report the progress, '1' to track the
+# unread actions then the maximum length of each sorted set (0 when
+# unlimited) for SAVE, the action uid and '1' to track the unread actions
+# for DELETE
+#
+# Counters only move when the sorted set has changed so running a script
+# twice (a retried task for example) leaves the timeline untouched. Both
+# scripts return 1 when the first sorted set has been updated, 0 otherwise.
+#
+# The unread counter is only maintained once it exists, it is initialized
+# by UNREAD and MARK_AS_READ.
+
+SAVE = CURSOR + """
+local last = #KEYS
+
+local progress, unread, cursor_score, cursor_member
+
+if ARGV[3] == '1' then
+    progress = KEYS[last]
+    last = last - 1
+end
+
+if ARGV[4] == '1' then
+    if redis.call('EXISTS', KEYS[last]) == 1 then
+        unread = KEYS[last]
+        cursor_score, cursor_member = parse_cursor(redis.call('GET', KEYS[last - 1]))
+    end
+
+    last = last - 2
+end
+
+local result = 0
+
+for i = 1, last, 2 do
+    if redis.call('ZADD', KEYS[i], ARGV[2], ARGV[1]) == 1 then
+        redis.call('INCR', KEYS[i + 1])
+
+        local delta = 0
+
+        if i == 1 then
+            result = 1
+
+            if unread and is_unread(cursor_score, cursor_member, ARGV[2], ARGV[1]) then
+                delta = 1
+            end
+        end
+
+        -- the oldest actions are trimmed beyond the maximum length
+        local length = tonumber(ARGV[5 + (i - 1) / 2])
+
+        if length and length > 0 then
+            if i == 1 and unread then
+                local trimmed = redis.call('ZRANGE', KEYS[i], 0, -length - 1, 'WITHSCORES')
+
+                for j = 1, #trimmed, 2 do
+                    if is_unread(cursor_score, cursor_member, trimmed[j + 1], trimmed[j]) then
+                        delta = delta - 1
+                    end
+                end
+            end
+
+            local removed = redis.call('ZREMRANGEBYRANK', KEYS[i], 0, -length - 1)
+
+            if removed > 0 then
+                redis.call('DECRBY', KEYS[i + 1], removed)
+            end
+        end
+
+        if delta ~= 0 then
+            redis.call('INCRBY', unread, delta)
+        end
+    end
+end
+
+if result == 1 and progress then
+    redis.call('HINCRBY', progress, 'dispatched', 1)
+end
+
+return result
+"""
+
+DELETE = CURSOR + """
+local last = #KEYS
+
+local unread, cursor_score, cursor_member
+
+if ARGV[2] == '1' then
+    if redis.call('EXISTS', KEYS[last]) == 1 then
+        unread = KEYS[last]
+        cursor_score, cursor_member = parse_cursor(redis.call('GET', KEYS[last - 1]))
+    end
+
+    last = last - 2
+end
+
+local result = 0
+
+for i = 1, last, 2 do
+    local score = redis.call('ZSCORE', KEYS[i], ARGV[1])
+
+    if score then
+        redis.call('ZREM', KEYS[i], ARGV[1])
+        redis.call('DECR', KEYS[i + 1])
+
+        if i == 1 then
+            result = 1
+
+            if unread and is_unread(cursor_score, cursor_member, score, ARGV[1]) then
+                redis.call('DECR', unread)
+            end
+        end
+    end
+end
+
+return result
+"""
+
+# Adds (ARGV[3] is '1') or removes the action ARGV[1] of score ARGV[2] to the
+# filtered views KEYS[1], KEYS[3], ... which are alive, a view being alive
+# while its scan cursor KEYS[2], KEYS[4], ... exists.
+VIEWS = """
+for i = 1, #KEYS, 2 do
+    if redis.call('EXISTS', KEYS[i + 1]) == 1 then
+        if ARGV[3] == '1' then
+            redis.call('ZADD', KEYS[i], ARGV[2], ARGV[1])
+        else
+            redis.call('ZREM', KEYS[i], ARGV[1])
+        end
+    end
+end
+
+return 1
+"""
+
+# Returns the number of unread actions of the sorted set KEYS[1] according
+# to the read cursor KEYS[2], the unread counter KEYS[3] (optional) is
+# returned when it exists and initialized otherwise.
+UNREAD = CURSOR + """
+if KEYS[3] then
+    local count = redis.call('GET', KEYS[3])
+
+    if count then
+        return tonumber(count)
+    end
+end
+
+local count = count_unread(KEYS[1], parse_cursor(redis.call('GET', KEYS[2])))
+
+if KEYS[3] then
+    redis.call('SET', KEYS[3], count)
+end
+
+return count
+"""
+
+# Moves the read cursor KEYS[3] to the score ARGV[1] or, when empty, to the
+# latest action of the sorted set KEYS[1] (the score ARGV[2] when there is
+# none) then resets the unread counter KEYS[4] of the sorted set KEYS[2].
+# Returns the number of actions left unread.
+MARK_AS_READ = CURSOR + """
+local cursor = ARGV[1]
+
+if cursor == '' then
+    local latest = redis.call('ZREVRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+
+    if #latest > 0 then
+        cursor = latest[2] .. '|' .. latest[1]
+    else
+        cursor = ARGV[2]
+    end
+end
+
+redis.call('SET', KEYS[3], cursor)
+
+local count = count_unread(KEYS[2], parse_cursor(cursor))
+
+redis.call('SET', KEYS[4], count)
+
+return count
+"""
+
+# Interns the verbs ARGV in the hash KEYS[1] (verb -> id), new verbs get their
+# id from the counter KEYS[2]. Returns the whole hash.
+INTERN = """
+for i = 1, #ARGV do
+    if redis.call('HEXISTS', KEYS[1], ARGV[i]) == 0 then
+        redis.call('HSET', KEYS[1], ARGV[i], redis.call('INCR', KEYS[2]))
+    end
+end
+
+return redis.call('HGETALL', KEYS[1])
+"""
@@ -0,0 +1,119 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from sequere.backends.redis.utils import get_key
+from sequere.helpers import batches
+from sequere.utils import get_setting
+
+LENGTH_COMMANDS = {
+    'zset': 'ZCARD',
+    'hash': 'HLEN',
+    'set': 'SCARD',
+    'string': 'STRLEN',
+}
+
+
+class Command(BaseCommand):
+    help = 'Report the memory used by the Redis keyspace of sequere.contrib.timeline per kind of key'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of keys inspected per pipeline')
+        parser.add_argument('--samples', type=int, default=5,
+                            help='Number of nested values sampled by MEMORY USAGE')
+
+    def handle(self, *args, **options):
+        from sequere.contrib.timeline import app
+
+        storage = app.backend.storage
+        client = storage.client
+
+        self.separator = get_setting('KEY_SEPARATOR')
+
+        # kind: [keys, elements, bytes]
+        stats = defaultdict(lambda: [0, 0, 0])
+
+        memory_usage = True
+
+        keys = client.scan_iter(match=get_key(storage.prefix, '*'), count=options['batch_size'])
+
+        for batch in batches(keys, options['batch_size']):
+            with client.pipeline(transaction=False) as pipe:
+                for key in batch:
+                    pipe.type(key)
+
+                    if memory_usage:
+                        pipe.execute_command('MEMORY', 'USAGE', key, 'SAMPLES', options['samples'])
+
+                results = pipe.execute(raise_on_error=False)
+
+            if memory_usage:
+                types, usages = results[::2], results[1::2]
+
+                # MEMORY USAGE requires Redis >= 4.0
+                if any(isinstance(usage, Exception) for usage in usages):
+                    memory_usage = False
+            else:
+                types, usages = results, [0] * len(batch)
+
+            with client.pipeline(transaction=False) as pipe:
+                for key, key_type in zip(batch, types):
+                    pipe.execute_command(LENGTH_COMMANDS.get(key_type, 'EXISTS'), key)
+
+                lengths = pipe.execute()
+
+            for key, length, usage in zip(batch, lengths, usages):
+                stat = stats[self.get_kind(storage, key)]
+
+                stat[0] += 1
+                stat[1] += length
+
+                if memory_usage:
+                    stat[2] += usage or 0
+
+        self.stdout.write('%-30s %12s %12s %16s' % ('kind', 'keys', 'elements',
+                                                    'bytes' if memory_usage else ''))
+
+        for kind, (count, length, usage) in sorted(stats.items(), key=lambda item: (-item[1][2], -item[1][1])):
+            self.stdout.write('%-30s %12d %12d %16s' % (kind, count, length, usage if memory_usage else ''))
+
+        if not memory_usage:
+            self.stdout.write('MEMORY USAGE is not supported by the server (Redis < 4.0), '
+                              'only elements are reported')
+
+    def get_kind(self, storage, key):
+        """
+        Returns the kind of a key: action hashes (or buckets of the compact
+        storage), timelines (private, public, outbox), filtered timelines,
+        counters, merged timelines and filtered views.
+        """
+        for name, kind in (('actions', 'actions'), ('dispatch', 'dispatch progress')):
+            if key.startswith(get_key(storage.add_prefix(name), '')):
+                return kind
+
+        prefix = storage.add_prefix('uid')
+
+        if not key.startswith(get_key(prefix, '')):
+            return 'other'
+
+        segments = key[len(prefix) + len(self.separator):].split(self.separator)
+
+        if len(segments) == 1:
+            return 'actions'
+
+        kind = segments[1]
+
+        if len(segments) == 2:
+            return kind
+
+        if segments[-1] == 'count':
+            return '%s counters' % kind
+
+        if segments[-1] == 'pulled':
+            return '%s merged' % kind
+
+        if segments[-1] in ('view', 'cursor'):
+            return '%s views' % kind
+
+        return '%s filtered' % kind
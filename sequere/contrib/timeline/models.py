@@ -1,29 +1,68 @@
 from django.dispatch import receiver
 
-from sequere.signals import followed, unfollowed
+from sequere.signals import followed, unfollowed, bulk_followed, bulk_unfollowed
 
-from .tasks import import_actions, remove_actions
+from .tasks import import_actions, prune_pulled, remove_actions
 
 from sequere.utils import get_setting
 
 
+def populate(task, edges):
+    from sequere import app
+
+    for from_instance, to_instance in edges:
+        task.delay(to_uid=app.backend.get_uid(from_instance),
+                   from_uid=app.backend.get_uid(to_instance))
+
+
+def prune(edges):
+    """
+    Checks whether the pulled actors among the instances unfollowed dropped
+    below ``TIMELINE_PULL_THRESHOLD``.
+    """
+    from sequere import app as sequere_app
+    from sequere.contrib.timeline import app
+
+    if get_setting('TIMELINE_PULL_THRESHOLD') is None or not hasattr(app.backend, 'get_pulled_uids'):
+        return
+
+    uids = list(set(sequere_app.backend.get_uid(to_instance) for from_instance, to_instance in edges))
+
+    for uid in app.backend.get_pulled_uids(uids):
+        prune_pulled.delay(uid)
+
+
 @receiver(followed)
 def handle_follow(sender, from_instance, to_instance, *args, **kwargs):
     if not get_setting('TIMELINE_IMPORT_ACTIONS_ON_FOLLOW'):
         return
 
-    from sequere import app
-
-    import_actions.delay(to_uid=app.backend.get_uid(from_instance),
-                         from_uid=app.backend.get_uid(to_instance))
+    populate(import_actions, [(from_instance, to_instance)])
 
 
 @receiver(unfollowed)
 def handle_unfollow(sender, from_instance, to_instance, *args, **kwargs):
+    prune([(from_instance, to_instance)])
+
     if not get_setting('TIMELINE_REMOVE_ACTIONS_ON_UNFOLLOW'):
         return
 
-    from sequere import app
+    populate(remove_actions, [(from_instance, to_instance)])
+
+
+@receiver(bulk_followed)
+def handle_bulk_follow(sender, edges, *args, **kwargs):
+    if not get_setting('TIMELINE_IMPORT_ACTIONS_ON_FOLLOW'):
+        return
+
+    populate(import_actions, edges)
+
+
+@receiver(bulk_unfollowed)
+def handle_bulk_unfollow(sender, edges, *args, **kwargs):
+    prune(edges)
+
+    if not get_setting('TIMELINE_REMOVE_ACTIONS_ON_UNFOLLOW'):
+        return
 
-    remove_actions.delay(to_uid=app.backend.get_uid(from_instance),
-                         from_uid=app.backend.get_uid(to_instance))
+    populate(remove_actions, edges)
@@ -1,7 +1,7 @@
 from django.dispatch import Signal
 
-pre_save = Signal(providing_args=['instance', 'action', ])
-post_save = Signal(providing_args=['instance', 'action', ])
+pre_save = Signal()  # instance, action
+post_save = Signal()  # instance, action
 
-pre_delete = Signal(providing_args=['instance', 'action', ])
-post_delete = Signal(providing_args=['instance', 'action', ])
+pre_delete = Signal()  # instance, action
+post_delete = Signal()  # instance, action
@@ -2,36 +2,156 @@ from __future__ import unicode_literals
 
 from django.core.paginator import Paginator
 
+from celery import group
 from celery.task import task
 
+from sequere.instrumentation import instruments
 from sequere.utils import get_setting
 
 
 @task(name='sequere.timeline.tasks.dispatch_action')
 def dispatch_action(action_uid, dispatch=True):
-    from sequere.models import get_followers
+    from sequere import app as sequere_app
     from sequere.contrib.timeline import app
 
-    from . import Timeline
+    from . import signals
 
     logger = dispatch_action.get_logger()
 
     action = app.backend.get_action(action_uid)
 
+    origin = action.__class__
+
+    threshold = get_setting('TIMELINE_PULL_THRESHOLD')
+
+    # the followers of a pulled actor merge its outbox when they read their
+    # private timeline
+    if (threshold is not None and hasattr(sequere_app.backend, 'get_following_uids')
+            and sequere_app.backend.get_followers_count(action.actor) >= threshold):
+        app.backend.save_pulled(action)
+
+        logger.info('Action %s will be pulled by the followers of %s' % (action, action.actor))
+
+        return
+
+    # pre_save and post_save receivers need the instances of the followers,
+    # the timelines are then saved one by one
+    if (dispatch and (signals.pre_save.has_listeners(origin) or signals.post_save.has_listeners(origin))
+            or not hasattr(sequere_app.backend, 'get_follower_windows')):
+        dispatch_to_instances(action, dispatch=dispatch, logger=logger)
+
+        return
+
+    windows = get_dispatch_windows(action.actor, get_setting('TIMELINE_DISPATCH_CHUNK_SIZE'))
+
+    total = sum(size for identifier, after, until, size in windows)
+
+    app.backend.start_dispatch(action, total)
+
+    logger.info('Dispatch action %s to %s followers in %s chunks' % (action, total, len(windows)))
+
+    group(dispatch_chunk.s(action.uid, identifier, after, until, size)
+          for identifier, after, until, size in windows).apply_async()
+
+
+@task(name='sequere.timeline.tasks.dispatch_chunk')
+def dispatch_chunk(action_uid, identifier, after, until, size=None):
+    from sequere.contrib.timeline import app
+
+    action = app.backend.get_action(action_uid)
+
+    dispatch_to_uids(action, identifier, after, until, size=size, logger=dispatch_chunk.get_logger())
+
+
+def get_dispatch_windows(instance, chunk_size):
+    """
+    Splits the followers of an instance in windows
+    (identifier, after, until, size) of about ``chunk_size`` followers
+    bounded by the (score, uid) cursors of followers, see
+    ``get_follower_windows``.
+    """
+    from sequere import app
+    from sequere.registry import registry
+
+    return [(identifier, after, until, size)
+            for identifier in registry.identifiers
+            for after, until, size in app.backend.get_follower_windows(instance, chunk_size, identifier)]
+
+
+def is_after(score, uid, cursor):
+    """
+    Returns whether the follower (score, uid) is located after a cursor,
+    a cursor without uid ends with the followers of its score.
+    """
+    if score != cursor[0]:
+        return score > cursor[0]
+
+    return cursor[1] is not None and uid > cursor[1]
+
+
+def dispatch_to_instances(action, dispatch=True, logger=None):
+    from sequere.contrib.timeline import app
+    from sequere.models import get_followers
+
+    from . import Timeline
+
     paginator = Paginator(get_followers(action.actor),
                           get_setting('TIMELINE_DISPATCH_RANGE'))
 
-    logger.info('Dispatch action %s to %s followers' % (action, paginator.count))
+    if logger:
+        logger.info('Dispatch action %s to %s followers' % (action, paginator.count))
 
-    for num_page in paginator.page_range:
-        page = paginator.page(num_page)
+    with instruments.measure('timeline.dispatch', size=paginator.count, backend=app.backend.__class__.__name__):
+        for num_page in paginator.page_range:
+            page = paginator.page(num_page)
 
-        for obj, timestamp in page.object_list:
-            if action.actor == obj:
-                continue
+            for obj, timestamp in page.object_list:
+                if action.actor == obj:
+                    continue
 
-            timeline = Timeline(obj)
-            timeline.save(action, dispatch=dispatch)
+                timeline = Timeline(obj)
+                timeline.save(action, dispatch=dispatch)
+
+
+def dispatch_to_uids(action, identifier, after, until, size=None, logger=None):
+    """
+    Writes the action to the timelines of the followers of its actor located
+    after the cursor ``after`` until the cursor ``until``, by batches of
+    ``TIMELINE_DISPATCH_RANGE`` uids read from the followers sets, one
+    pipeline per batch and no follower is loaded.
+    """
+    from sequere import app as sequere_app
+    from sequere.contrib.timeline import app
+
+    batch_size = get_setting('TIMELINE_DISPATCH_RANGE')
+
+    actor_uid = sequere_app.backend.get_uid(action.actor)
+
+    count = 0
+
+    cursor = after
+
+    with instruments.measure('timeline.dispatch', size=size, backend=app.backend.__class__.__name__):
+        while True:
+            scores = sequere_app.backend.get_follower_uids_after(action.actor, identifier,
+                                                                 cursor=cursor,
+                                                                 limit=batch_size)
+
+            uids = [uid for uid, score in scores if not is_after(score, uid, until)]
+
+            count += app.backend.save_many([uid for uid in uids if uid != actor_uid], identifier, action)
+
+            if len(uids) < batch_size:
+                break
+
+            uid, score = scores[-1]
+
+            cursor = (score, uid)
+
+    if logger:
+        logger.info('Dispatch action %s to %s followers (%s after %s)' % (action, count, identifier, after))
+
+    return count
 
 
 def populate_actions(from_uid, to_uid, method, logger=None):
@@ -63,11 +183,59 @@ def populate_actions(from_uid, to_uid, method, logger=None):
 
 @task(name='sequere.timeline.tasks.import_actions')
 def import_actions(from_uid, to_uid):
-    populate_actions(from_uid, to_uid, 'save',
-                     logger=import_actions.get_logger())
+    from sequere.contrib.timeline import app
+
+    logger = import_actions.get_logger()
+
+    if not hasattr(app.backend, 'import_actions'):
+        return populate_actions(from_uid, to_uid, 'save', logger=logger)
+
+    count = app.backend.import_actions(from_uid, to_uid)
+
+    logger.info('Import %s actions from %s to %s' % (count, from_uid, to_uid))
 
 
 @task(name='sequere.timeline.tasks.remove_actions')
 def remove_actions(from_uid, to_uid):
-    populate_actions(from_uid, to_uid, 'delete',
-                     logger=remove_actions.get_logger())
+    from sequere.contrib.timeline import app
+
+    logger = remove_actions.get_logger()
+
+    if not hasattr(app.backend, 'remove_actions'):
+        return populate_actions(from_uid, to_uid, 'delete', logger=logger)
+
+    count = app.backend.remove_actions(from_uid, to_uid)
+
+    logger.info('Remove %s actions of %s from %s' % (count, from_uid, to_uid))
+
+
+@task(name='sequere.timeline.tasks.prune_pulled')
+def prune_pulled(uid):
+    """
+    Pushes the actions of a pulled actor again once its followers dropped
+    below ``TIMELINE_PULL_THRESHOLD``, its latest actions are imported in
+    the timelines of the followers it has left.
+    """
+    from sequere import app as sequere_app
+    from sequere.contrib.timeline import app
+
+    logger = prune_pulled.get_logger()
+
+    threshold = get_setting('TIMELINE_PULL_THRESHOLD')
+
+    instance = sequere_app.backend.get_from_uid(uid)
+
+    if threshold is not None and instance is not None:
+        if sequere_app.backend.get_followers_count(instance) >= threshold:
+            return
+
+    if not app.backend.remove_pulled(uid):
+        return
+
+    uids = sequere_app.backend.get_follower_uids(instance) if instance is not None else []
+
+    for to_uid in uids:
+        if to_uid != uid:
+            import_actions.delay(from_uid=uid, to_uid=to_uid)
+
+    logger.info('Actions of %s are pushed to its %s followers' % (uid, len(uids)))
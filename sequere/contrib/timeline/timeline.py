@@ -1,10 +1,15 @@
-from django.utils import timezone as datetime
+import sys
 
 from . import signals
 from .tasks import dispatch_action
 
+if sys.version_info >= (3, 6):
+    from .aio import AsyncTimelineMixin
+else:
+    AsyncTimelineMixin = object
 
-class Timeline(object):
+
+class Timeline(AsyncTimelineMixin):
     def __init__(self, instance, *args, **kwargs):
         from . import app
 
@@ -13,15 +18,10 @@ class Timeline(object):
         self.backend = kwargs.pop('backend', app.backend)
 
     def mark_as_read(self, timestamp=None):
-        if timestamp is None:
-            timestamp = datetime.now()
-
         self.backend.mark_as_read(self.instance, timestamp=timestamp)
 
     def get_unread_count(self, action=None, target=None):
-        read_at = self.read_at or 0
-
-        return self.backend.get_unread_count(self.instance, read_at, action=action, target=target)
+        return self.backend.get_unread_count(self.instance, action=action, target=target)
 
     @property
     def read_at(self):
@@ -73,3 +73,9 @@ class Timeline(object):
             signals.post_save.send(sender=origin,
                                    instance=self.instance,
                                    action=action)
+
+
+def get_unread_counts(instances):
+    from . import app
+
+    return app.backend.get_unread_counts(instances)
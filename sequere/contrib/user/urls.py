@@ -1,4 +1,4 @@
-from django.conf.urls import url
+from sequere.compat import url
 
 from .views import FollowView, UnFollowView
 
@@ -6,10 +6,9 @@ from django.contrib.auth.decorators import login_required
 
 from sequere.registry import registry
 
-from sequere.models import (get_followers_count,
+from sequere.models import (get_counts,
                             follow,
-                            unfollow,
-                            get_followings_count)
+                            unfollow)
 
 
 class BaseFollowView(generic.View):
@@ -49,17 +48,22 @@ class BaseFollowView(generic.View):
         return self.redirect(self.success(self.instance))
 
     def redirect(self, instance):
-        if not self.request.is_ajax():
+        # HttpRequest.is_ajax() was removed in Django 4.0
+        if self.request.META.get('HTTP_X_REQUESTED_WITH') != 'XMLHttpRequest':
             redirect_url = self.data.get(self.redirect_url_name, self.success_url)
 
             if redirect_url:
                 return redirect(redirect_url)
 
+        counts = get_counts([self.instance, self.request.user],
+                            kinds=('followers', 'followings'),
+                            identifiers=(None, self.identifier))
+
         data = {
-            'followers_count': get_followers_count(self.instance),
-            'followings_count': get_followings_count(self.request.user),
-            '%s_followers_count' % self.identifier: get_followers_count(self.instance, self.identifier),
-            '%s_followings_count' % self.identifier: get_followings_count(self.request.user, self.identifier),
+            'followers_count': counts[self.instance][('followers', None)],
+            'followings_count': counts[self.request.user][('followings', None)],
+            '%s_followers_count' % self.identifier: counts[self.instance][('followers', self.identifier)],
+            '%s_followings_count' % self.identifier: counts[self.request.user][('followings', self.identifier)],
         }
 
         return JsonResponse(data)
@@ -4,10 +4,26 @@ BACKEND = 'sequere.backends.database.DatabaseBackend'
 BACKEND_OPTIONS = {}
 FAIL_SILENTLY = False
 
+CONNECTION_POOL_CLASS = 'sequere.backends.redis.connections.ConnectionPool'
+CONNECTION_POOL_OPTIONS = {}
+
+INSTRUMENTATION_SINKS = {}
+
 TIMELINE_BACKEND = 'sequere.contrib.timeline.backends.redis.RedisBackend'
 TIMELINE_BACKEND_OPTIONS = {}
 TIMELINE_IMPORT_ACTIONS_ON_FOLLOW = False
 TIMELINE_REMOVE_ACTIONS_ON_UNFOLLOW = False
 
 TIMELINE_DISPATCH_RANGE = 100
+TIMELINE_DISPATCH_CHUNK_SIZE = 10000
 TIMELINE_POPULATE_RANGE = 100
+TIMELINE_POPULATE_LIMIT = 1000
+
+TIMELINE_PULL_THRESHOLD = None
+TIMELINE_PULL_TTL = 10
+
+TIMELINE_MAX_LENGTH = {}
+TIMELINE_ACTION_TTL = None
+
+TIMELINE_FILTER_MODE = 'index'
+TIMELINE_VIEW_TTL = 60
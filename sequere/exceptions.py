@@ -8,3 +8,7 @@ class AlreadyFollowingException(SequereException):
 
 class NotFollowingException(SequereException):
     pass
+
+
+class CrossShardException(SequereException):
+    pass
@@ -1,8 +1,27 @@
+from itertools import islice
+
+from six.moves import range
+
+
 def chunks(l, n, length=None):
     """ Yield successive n-sized chunks from l.
     """
     if length is None:
         length = len(l)
 
-    for i in xrange(0, length, n):
+    for i in range(0, length, n):
         yield l[i:i + n]
+
+
+def batches(iterable, n):
+    """ Yield successive n-sized lists from an iterable without consuming it at once.
+    """
+    iterator = iter(iterable)
+
+    while True:
+        batch = list(islice(iterator, n))
+
+        if not batch:
+            return
+
+        yield batch
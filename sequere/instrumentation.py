@@ -0,0 +1,293 @@
+"""
+Measures of the operations of the backends.
+
+An operation is timed with the number of round trips it made to Redis, the
+number of SQL queries it ran and, for hydrations and lists, the number of
+items it handled, then recorded by the sinks of
+``SEQUERE_INSTRUMENTATION_SINKS``. Without sink an instrumented call only
+checks that ``instruments.sinks`` is empty.
+"""
+from __future__ import absolute_import
+
+import logging
+import socket
+import threading
+import time
+
+from functools import wraps
+
+import six
+
+from django.core.exceptions import ImproperlyConfigured
+
+from sequere.utils import get_setting, load_class
+
+
+class Operation(object):
+    def __init__(self, name, tags, size=None):
+        self.name = name
+        self.tags = tags
+        self.size = size
+        self.round_trips = 0
+        self.queries = 0
+        self.duration = None
+
+
+class NullMeasure(object):
+    """
+    The context manager returned when no sink is configured.
+    """
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_MEASURE = NullMeasure()
+
+
+class Measure(object):
+    def __init__(self, instruments, operation):
+        self.instruments = instruments
+        self.operation = operation
+        self.wrappers = []
+
+    def __enter__(self):
+        operations = self.instruments.get_operations()
+
+        # SQL queries are counted by the outermost operation for all of them
+        if not operations:
+            self.wrappers = self.instruments.get_query_wrappers()
+
+            for wrapper in self.wrappers:
+                wrapper.__enter__()
+
+        operations.append(self.operation)
+
+        self.started = time.time()
+
+        return self.operation
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.operation.duration = time.time() - self.started
+
+        self.instruments.get_operations().pop()
+
+        for wrapper in reversed(self.wrappers):
+            wrapper.__exit__(exc_type, exc_value, traceback)
+
+        if exc_type is None:
+            self.instruments.record(self.operation)
+
+        return False
+
+
+class Instruments(object):
+    """
+    Hands the operations measured in a thread to ``sinks``, objects with a
+    ``record(operation)`` method.
+    """
+    def __init__(self, sinks=()):
+        self.sinks = list(sinks)
+        self.local = threading.local()
+
+    def configure(self, sinks):
+        """
+        Loads the sinks of a dict of class paths and options.
+        """
+        self.sinks = [load_class(path)(**options) for path, options in six.iteritems(sinks)]
+
+    def get_operations(self):
+        try:
+            return self.local.operations
+        except AttributeError:
+            operations = self.local.operations = []
+
+            return operations
+
+    def measure(self, name, size=None, **tags):
+        if not self.sinks:
+            return NULL_MEASURE
+
+        return Measure(self, Operation(name, tags, size=size))
+
+    def round_trip(self, count=1):
+        if not self.sinks:
+            return
+
+        for operation in self.get_operations():
+            operation.round_trips += count
+
+    def is_measuring(self):
+        return bool(self.sinks) and bool(self.get_operations())
+
+    def collect(self, func):
+        """
+        Calls ``func`` from another thread on behalf of the operations of the
+        calling thread and returns its result with an operation holding its
+        round trips, to be merged in the calling thread once it returned.
+        """
+        operation = Operation(None, {})
+
+        operations = self.get_operations()
+        operations.append(operation)
+
+        try:
+            return func(), operation
+        finally:
+            operations.pop()
+
+    def merge(self, operation):
+        for current in self.get_operations():
+            current.round_trips += operation.round_trips
+            current.queries += operation.queries
+
+    def get_query_wrappers(self):
+        from django.db import connections
+
+        # execute_wrapper is available since Django 2.0
+        return [connections[alias].execute_wrapper(self.count_query)
+                for alias in connections if hasattr(connections[alias], 'execute_wrapper')]
+
+    def count_query(self, execute, sql, params, many, context):
+        for operation in self.get_operations():
+            operation.queries += 1
+
+        return execute(sql, params, many, context)
+
+    def record(self, operation):
+        for sink in self.sinks:
+            sink.record(operation)
+
+
+instruments = Instruments()
+
+instruments.configure(get_setting('INSTRUMENTATION_SINKS'))
+
+
+def instrument(name):
+    """
+    Measures the calls of a method of a backend as the ``name`` operation.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if not instruments.sinks:
+                return func(self, *args, **kwargs)
+
+            with instruments.measure(name, backend=self.__class__.__name__):
+                return func(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class LoggingSink(object):
+    """
+    Logs each operation, at ``level`` with the ``logger`` logger.
+    """
+    def __init__(self, logger='sequere.instrumentation', level='DEBUG'):
+        self.logger = logging.getLogger(logger)
+        self.level = logging.getLevelName(level.upper())
+
+    def record(self, operation):
+        if not self.logger.isEnabledFor(self.level):
+            return
+
+        self.logger.log(self.level, '%s %.3fms round_trips=%d queries=%d size=%s %s',
+                        operation.name,
+                        operation.duration * 1000,
+                        operation.round_trips,
+                        operation.queries,
+                        operation.size,
+                        ' '.join('%s=%s' % item for item in sorted(operation.tags.items())))
+
+
+class StatsdSink(object):
+    """
+    Sends the measures of each operation in a single UDP packet to a statsd
+    server: the duration as a timer and the counts as ``histogram_type``
+    metrics, the tags are appended in the DogStatsD format when
+    ``dogstatsd`` is set.
+    """
+    def __init__(self, host='localhost', port=8125, prefix='sequere', histogram_type='h', dogstatsd=False):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.histogram_type = histogram_type
+        self.dogstatsd = dogstatsd
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def get_lines(self, operation):
+        name = '%s.%s' % (self.prefix, operation.name)
+
+        lines = ['%s.duration:%.3f|ms' % (name, operation.duration * 1000),
+                 '%s.round_trips:%d|%s' % (name, operation.round_trips, self.histogram_type),
+                 '%s.queries:%d|%s' % (name, operation.queries, self.histogram_type)]
+
+        if operation.size is not None:
+            lines.append('%s.size:%d|%s' % (name, operation.size, self.histogram_type))
+
+        if self.dogstatsd and operation.tags:
+            tags = '|#' + ','.join('%s:%s' % item for item in sorted(operation.tags.items()))
+
+            lines = [line + tags for line in lines]
+
+        return lines
+
+    def record(self, operation):
+        try:
+            self.socket.sendto('\n'.join(self.get_lines(operation)).encode('utf-8'), self.address)
+        except socket.error:
+            pass
+
+
+# bounds of the histograms of counts (round trips, queries, sizes)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000, float('inf'), )
+
+
+class PrometheusSink(object):
+    """
+    Observes the measures of each operation in ``prometheus_client``
+    histograms labelled by operation and backend.
+    """
+    def __init__(self, prefix='sequere', registry=None, buckets=None):
+        try:
+            import prometheus_client
+        except ImportError:
+            raise ImproperlyConfigured('The Prometheus sink requires prometheus_client to be installed.')
+
+        if registry is None:
+            registry = prometheus_client.REGISTRY
+
+        labels = ('operation', 'backend', )
+
+        duration_options = {'buckets': buckets} if buckets else {}
+
+        self.duration = prometheus_client.Histogram('%s_operation_duration_seconds' % prefix,
+                                                    'Duration of the operations',
+                                                    labels, registry=registry, **duration_options)
+
+        self.round_trips = prometheus_client.Histogram('%s_operation_round_trips' % prefix,
+                                                       'Redis round trips of the operations',
+                                                       labels, registry=registry, buckets=COUNT_BUCKETS)
+
+        self.queries = prometheus_client.Histogram('%s_operation_queries' % prefix,
+                                                   'SQL queries of the operations',
+                                                   labels, registry=registry, buckets=COUNT_BUCKETS)
+
+        self.size = prometheus_client.Histogram('%s_operation_size' % prefix,
+                                                'Items hydrated or listed by the operations',
+                                                labels, registry=registry, buckets=COUNT_BUCKETS)
+
+    def record(self, operation):
+        labels = (operation.name, operation.tags.get('backend', ''))
+
+        self.duration.labels(*labels).observe(operation.duration)
+        self.round_trips.labels(*labels).observe(operation.round_trips)
+        self.queries.labels(*labels).observe(operation.queries)
+
+        if operation.size is not None:
+            self.size.labels(*labels).observe(operation.size)
@@ -0,0 +1,205 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from sequere import app
+from sequere.backends.redis import RedisBackend
+from sequere.backends.redis.managers import IdentifierInstanceManager
+from sequere.backends.redis.utils import get_key
+from sequere.helpers import batches
+from sequere.utils import get_setting
+
+
+class Command(BaseCommand):
+    help = 'Rewrite the Redis keyspaces with uids derived from identifiers (IdentifierInstanceManager)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of keys processed per pipeline')
+        parser.add_argument('--skip-timeline', action='store_true', default=False,
+                            help='Do not rewrite the keyspace of sequere.contrib.timeline')
+
+    def handle(self, *args, **options):
+        if not isinstance(app.backend, RedisBackend):
+            raise CommandError('SEQUERE_BACKEND is not a RedisBackend')
+
+        if app.backend.manager.hash_tags:
+            raise CommandError('Sharded Redis clients are not supported, uids are renamed in place')
+
+        self.batch_size = options['batch_size']
+        self.separator = get_setting('KEY_SEPARATOR')
+
+        manager = app.backend.manager
+
+        uids = self.get_uids(manager.client, manager.add_prefix('uid'))
+
+        self.stdout.write('%d uids to rewrite' % len(uids))
+
+        self.rewrite_keys(manager.client, manager.add_prefix('uid'), uids)
+
+        if not options['skip_timeline'] and apps.is_installed('sequere.contrib.timeline'):
+            from sequere.contrib.timeline import app as timeline_app
+            from sequere.contrib.timeline.backends.redis.managers import CompactActionManager
+
+            storage = timeline_app.backend.storage
+
+            self.rewrite_keys(storage.client, storage.add_prefix('uid'), uids, members=False)
+            self.rewrite_set(storage.client, timeline_app.backend.get_pulled_actors_key(), uids)
+
+            if isinstance(storage, CompactActionManager):
+                self.rewrite_compact_actions(storage.client, storage.add_prefix('actions'), uids,
+                                             storage.separator)
+            else:
+                self.rewrite_actions(storage.client, storage.add_prefix('uid'), uids)
+
+        for batch in batches(uids.items(), self.batch_size):
+            with manager.client.pipeline() as pipe:
+                for uid, (new_uid, data) in batch:
+                    pipe.delete(get_key(manager.add_prefix('uid'), uid))
+                    pipe.delete(get_key(manager.add_prefix('uid'), data['identifier'], data['object_id']))
+
+                pipe.execute()
+
+        self.stdout.write('Done')
+
+    def scan(self, client, prefix):
+        keys = client.scan_iter(match=get_key(prefix, '*'), count=self.batch_size)
+
+        return batches(keys, self.batch_size)
+
+    def split(self, prefix, key):
+        """
+        Returns the uid segment and the remaining segments of a key
+        """
+        segments = key[len(prefix) + len(self.separator):].split(self.separator, 1)
+
+        return segments[0], segments[1] if len(segments) > 1 else None
+
+    def get_uids(self, client, prefix):
+        """
+        Maps the random uids to uids derived from identifiers using
+        the uid hashes stored by InstanceManager.
+        """
+        uids = {}
+
+        for keys in self.scan(client, prefix):
+            keys = [key for key in keys if self.split(prefix, key)[1] is None]
+
+            with client.pipeline() as pipe:
+                for key in keys:
+                    pipe.hgetall(key)
+
+                results = pipe.execute()
+
+            for key, data in zip(keys, results):
+                if not data or 'identifier' not in data:
+                    continue
+
+                new_uid = IdentifierInstanceManager.separator.join([data['identifier'],
+                                                                    data['object_id']])
+
+                uids[self.split(prefix, key)[0]] = (new_uid, data)
+
+        return uids
+
+    def rewrite_keys(self, client, prefix, uids, members=True):
+        """
+        Moves every key owned by a random uid to its new uid, sorted set
+        members are rewritten too when they are uids.
+        """
+        for keys in self.scan(client, prefix):
+            keys = [key for key in keys
+                    if self.split(prefix, key)[0] in uids and self.split(prefix, key)[1]]
+
+            with client.pipeline() as pipe:
+                for key in keys:
+                    pipe.type(key)
+
+                types = pipe.execute()
+
+            with client.pipeline() as pipe:
+                for key, key_type in zip(keys, types):
+                    if key_type == 'zset' and members:
+                        pipe.zrange(key, 0, -1, withscores=True)
+                    else:
+                        pipe.exists(key)
+
+                results = pipe.execute()
+
+            with client.pipeline() as pipe:
+                for key, key_type, result in zip(keys, types, results):
+                    uid, rest = self.split(prefix, key)
+
+                    new_key = get_key(prefix, uids[uid][0], rest)
+
+                    if key_type == 'zset' and members:
+                        pipe.delete(key)
+
+                        if result:
+                            pipe.zadd(new_key, dict((uids.get(member, (member, ))[0], score)
+                                                    for member, score in result))
+                    elif result:
+                        pipe.rename(key, new_key)
+
+                pipe.execute()
+
+    def rewrite_set(self, client, key, uids):
+        """
+        Rewrites the members of a set when they are uids (the pulled actors
+        of the timelines).
+        """
+        members = [member for member in client.smembers(key) if member in uids]
+
+        for batch in batches(members, self.batch_size):
+            with client.pipeline() as pipe:
+                pipe.srem(key, *batch)
+                pipe.sadd(key, *[uids[member][0] for member in batch])
+
+                pipe.execute()
+
+    def rewrite_actions(self, client, prefix, uids):
+        """
+        Rewrites the actor and the target of the timeline actions.
+        """
+        for keys in self.scan(client, prefix):
+            keys = [key for key in keys if self.split(prefix, key)[1] is None]
+
+            with client.pipeline() as pipe:
+                for key in keys:
+                    pipe.hmget(key, 'actor', 'target')
+
+                results = pipe.execute()
+
+            with client.pipeline() as pipe:
+                for key, (actor, target) in zip(keys, results):
+                    for name, uid in (('actor', actor), ('target', target)):
+                        if uid in uids:
+                            pipe.hset(key, name, uids[uid][0])
+
+                pipe.execute()
+
+    def rewrite_compact_actions(self, client, prefix, uids, separator):
+        """
+        Rewrites the actor and the target of the timeline actions packed in
+        buckets (CompactActionManager).
+        """
+        for keys in self.scan(client, prefix):
+            with client.pipeline() as pipe:
+                for key in keys:
+                    pipe.hgetall(key)
+
+                results = pipe.execute()
+
+            with client.pipeline() as pipe:
+                for key, values in zip(keys, results):
+                    for field, value in values.items():
+                        verb_id, timestamp, actor, target = value.split(separator, 3)
+
+                        new_value = separator.join([verb_id,
+                                                    timestamp,
+                                                    uids.get(actor, (actor, ))[0],
+                                                    uids.get(target, (target, ))[0]])
+
+                        if new_value != value:
+                            pipe.hset(key, field, new_value)
+
+                pipe.execute()
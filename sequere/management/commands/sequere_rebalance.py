@@ -0,0 +1,189 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from sequere import app
+from sequere.backends.redis.sharding import STORE_BATCH_SIZE
+from sequere.backends.redis.utils import get_key
+from sequere.helpers import batches, chunks
+from sequere.utils import get_setting
+
+# counters of the sorted set of the same key without suffix, recounted
+# once merged
+COUNT_SUFFIX = 'count'
+
+# counters rebuilt from the read cursor by the next read
+UNREAD_SUFFIX = 'unread'
+
+# sequences merged by keeping the highest value
+SEQUENCE_SUFFIXES = ('action_uid', 'id', )
+
+# Sets the counter KEYS[2] to the cardinality of the sorted set KEYS[1] when
+# the counter exists, merges are idempotent as counters are not summed.
+RECOUNT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('SET', KEYS[2], redis.call('ZCARD', KEYS[1]))
+end
+
+return 1
+"""
+
+# Sets the sequence KEYS[1] to ARGV[1] when it is greater.
+MAX = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+
+if tonumber(ARGV[1]) > current then
+    redis.call('SET', KEYS[1], ARGV[1])
+end
+
+return 1
+"""
+
+READERS = {
+    'string': lambda pipe, key: pipe.get(key),
+    'hash': lambda pipe, key: pipe.hgetall(key),
+    'set': lambda pipe, key: pipe.smembers(key),
+    'zset': lambda pipe, key: pipe.zrange(key, 0, -1, withscores=True),
+}
+
+
+class Command(BaseCommand):
+    help = 'Move the keys of the sharded Redis backends to the shards assigned by the hash ring after adding a node'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of keys processed per pipeline')
+        parser.add_argument('--dry-run', action='store_true', default=False,
+                            help='Count the keys to move without moving them')
+        parser.add_argument('--skip-timeline', action='store_true', default=False,
+                            help='Do not rebalance the keyspace of sequere.contrib.timeline')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.dry_run = options['dry_run']
+        self.separator = get_setting('KEY_SEPARATOR')
+
+        managers = [('follow', getattr(app.backend, 'manager', None))]
+
+        if not options['skip_timeline'] and apps.is_installed('sequere.contrib.timeline'):
+            from sequere.contrib.timeline import app as timeline_app
+
+            managers.append(('timeline', getattr(timeline_app.backend, 'storage', None)))
+
+        managers = [(name, manager) for name, manager in managers if manager is not None]
+
+        sharded = [(name, manager) for name, manager in managers if getattr(manager, 'hash_tags', False)]
+
+        if not sharded:
+            raise CommandError('No Redis backend uses a sharded client')
+
+        for name, manager in sharded:
+            # keyspaces nested in this one (the timeline in the follow graph)
+            excluded = tuple(get_key(other.prefix, '') for other_name, other in managers
+                             if other is not manager and other.prefix.startswith(manager.prefix))
+
+            moved = self.rebalance(manager, excluded)
+
+            self.stdout.write('%s: %d keys %s' % (name, moved, 'to move' if self.dry_run else 'moved'))
+
+    def rebalance(self, manager, excluded):
+        client = manager.client
+
+        self.recount_script = client.register_script(RECOUNT)
+        self.max_script = client.register_script(MAX)
+
+        moved = 0
+
+        for name in sorted(client.shards):
+            shard = client.shards[name]
+
+            keys = shard.scan_iter(match=get_key(manager.prefix, '*'), count=self.batch_size)
+
+            for batch in batches(keys, self.batch_size):
+                misplaced = [key for key in batch
+                             if client.get_shard_name(key) != name and not key.startswith(excluded)]
+
+                if misplaced and not self.dry_run:
+                    self.move(client, shard, misplaced)
+
+                moved += len(misplaced)
+
+        return moved
+
+    def get_suffix(self, key):
+        return key.rsplit(self.separator, 1)[-1]
+
+    def get_count_key(self, key):
+        return get_key(key, COUNT_SUFFIX)
+
+    def move(self, client, shard, keys):
+        """
+        Copies keys from a shard to the shards of the ring then deletes them,
+        keys already written on their new shard are merged: members and
+        fields are added, counters are recounted from their sorted sets,
+        unread counters are reset, the highest value of sequences is kept
+        and other strings are kept.
+
+        Merges are idempotent, keys copied by an interrupted run are merged
+        again by the next one.
+        """
+        with shard.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.type(key)
+                pipe.pttl(key)
+
+            results = pipe.execute()
+
+        entries = []
+
+        for key, kind, ttl in zip(keys, results[::2], results[1::2]):
+            kind = kind.decode() if isinstance(kind, bytes) else kind
+
+            if kind in READERS:
+                entries.append((key, kind, ttl))
+            elif kind != 'none':
+                self.stderr.write('%s: %s keys are not supported' % (key, kind))
+
+        with shard.pipeline(transaction=False) as pipe:
+            for key, kind, ttl in entries:
+                READERS[kind](pipe, key)
+
+            values = pipe.execute()
+
+        with client.pipeline(transaction=False) as pipe:
+            for (key, kind, ttl), value in zip(entries, values):
+                if not value:
+                    continue
+
+                suffix = self.get_suffix(key)
+
+                if kind == 'zset':
+                    for scores in chunks(value, STORE_BATCH_SIZE):
+                        pipe.execute_command('ZADD', key, 'NX', *[item
+                                                                  for member, score in scores
+                                                                  for item in (repr(float(score)), member)])
+
+                    self.recount_script(keys=[key, self.get_count_key(key)], client=pipe)
+                elif kind == 'set':
+                    pipe.sadd(key, *value)
+                elif kind == 'hash':
+                    for field, field_value in value.items():
+                        pipe.hsetnx(key, field, field_value)
+                elif suffix == COUNT_SUFFIX:
+                    # the sorted set may be moved by another batch
+                    pipe.set(key, value, nx=True)
+
+                    self.recount_script(keys=[key[:-len(self.separator + COUNT_SUFFIX)], key], client=pipe)
+                elif suffix == UNREAD_SUFFIX:
+                    pipe.delete(key)
+                elif suffix in SEQUENCE_SUFFIXES:
+                    self.max_script(keys=[key], args=[value], client=pipe)
+                else:
+                    pipe.set(key, value, nx=True)
+
+                if ttl > 0 and suffix != UNREAD_SUFFIX:
+                    pipe.pexpire(key, ttl)
+
+            pipe.execute()
+
+        if entries:
+            shard.delete(*[key for key, kind, ttl in entries])
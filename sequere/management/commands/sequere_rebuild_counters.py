@@ -0,0 +1,47 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the FollowCounter table of the database backend from the Follow table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of counters inserted per query')
+
+    def handle(self, *args, **options):
+        from sequere.backends.database.models import Follow, FollowCounter
+
+        edges = Follow.objects.order_by()
+
+        aggregates = (
+            (FollowCounter.FOLLOWERS, edges, ('to_identifier', 'to_object_id', 'from_identifier')),
+            (FollowCounter.FOLLOWINGS, edges, ('from_identifier', 'from_object_id', 'to_identifier')),
+            (FollowCounter.FRIENDS, edges.filter(is_mutual=True), ('from_identifier', 'from_object_id', 'to_identifier')),
+        )
+
+        counters = defaultdict(int)
+
+        for kind, qs, fields in aggregates:
+            for row in qs.values(*fields).annotate(count=Count('id')):
+                identifier, object_id, sub_identifier = [row[field] for field in fields]
+
+                counters[(identifier, object_id, kind, sub_identifier)] += row['count']
+                counters[(identifier, object_id, kind, '')] += row['count']
+
+        with transaction.atomic():
+            FollowCounter.objects.all().delete()
+
+            FollowCounter.objects.bulk_create([
+                FollowCounter(identifier=identifier,
+                              object_id=object_id,
+                              kind=kind,
+                              sub_identifier=sub_identifier,
+                              count=count)
+                for (identifier, object_id, kind, sub_identifier), count in counters.items()
+            ], batch_size=options['batch_size'])
+
+        self.stdout.write('%d counters rebuilt' % len(counters))
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Follow',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('from_object_id', models.PositiveIntegerField()),
+                ('from_identifier', models.CharField(max_length=50, db_index=True)),
+                ('to_object_id', models.PositiveIntegerField()),
+                ('to_identifier', models.CharField(max_length=50, db_index=True)),
+                ('is_mutual', models.BooleanField(default=False)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count
+
+# Vendors supporting partial indexes
+PARTIAL_INDEX_VENDORS = ('postgresql', 'sqlite')
+
+EDGE_FIELDS = ('from_identifier', 'from_object_id', 'to_identifier', 'to_object_id')
+
+
+def delete_duplicate_follows(apps, schema_editor):
+    """
+    Deletes the follows of an edge created more than once, the oldest one
+    is kept, before the edge is made unique.
+    """
+    Follow = apps.get_model('sequere', 'Follow')
+
+    follows = Follow.objects.using(schema_editor.connection.alias)
+
+    duplicates = (follows.values(*EDGE_FIELDS)
+                  .annotate(follow_count=Count('pk'))
+                  .filter(follow_count__gt=1)
+                  .order_by())
+
+    for edge in list(duplicates):
+        del edge['follow_count']
+
+        pks = list(follows.filter(**edge).order_by('created_at', 'pk').values_list('pk', flat=True))
+
+        follows.filter(pk__in=pks[1:]).delete()
+
+
+def create_friends_index(apps, schema_editor):
+    if schema_editor.connection.vendor not in PARTIAL_INDEX_VENDORS:
+        return
+
+    schema_editor.execute('CREATE INDEX sequere_follow_friends '
+                          'ON sequere_follow (from_identifier, from_object_id, created_at) '
+                          'WHERE is_mutual')
+
+
+def drop_friends_index(apps, schema_editor):
+    if schema_editor.connection.vendor not in PARTIAL_INDEX_VENDORS:
+        return
+
+    schema_editor.execute('DROP INDEX sequere_follow_friends')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sequere', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='follow',
+            name='from_identifier',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='to_identifier',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.RunPython(delete_duplicate_follows, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='follow',
+            unique_together=set([EDGE_FIELDS]),
+        ),
+        migrations.AlterIndexTogether(
+            name='follow',
+            index_together=set([('from_identifier', 'from_object_id', 'created_at'),
+                                ('to_identifier', 'to_object_id', 'created_at')]),
+        ),
+        migrations.RunPython(create_friends_index, drop_friends_index),
+    ]
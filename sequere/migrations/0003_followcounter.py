@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sequere', '0002_follow_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FollowCounter',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('identifier', models.CharField(max_length=50)),
+                ('object_id', models.PositiveIntegerField()),
+                ('kind', models.CharField(max_length=10, choices=[('followers', 'followers'), ('followings', 'followings'), ('friends', 'friends')])),
+                ('sub_identifier', models.CharField(max_length=50, blank=True, default='')),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='followcounter',
+            unique_together=set([('identifier', 'object_id', 'kind', 'sub_identifier')]),
+        ),
+    ]
@@ -9,11 +9,31 @@ class SequereMixin(object):
 
         return is_following(self, instance)
 
+    def is_following_many(self, instances):
+        from .models import is_following_many
+
+        return is_following_many(self, instances)
+
     def unfollow(self, instance):
         from .models import unfollow
 
         return unfollow(self, instance)
 
+    def bulk_follow(self, instances):
+        from .models import bulk_follow
+
+        return bulk_follow(self, instances)
+
+    def bulk_unfollow(self, instances):
+        from .models import bulk_unfollow
+
+        return bulk_unfollow(self, instances)
+
+    def bulk_add_followers(self, instances):
+        from .models import bulk_add_followers
+
+        return bulk_add_followers(self, instances)
+
     def get_followings(self, *args, **kwargs):
         from .models import get_followings
 
@@ -34,6 +54,11 @@ class SequereMixin(object):
 
         return get_friends_count(self, *args, **kwargs)
 
+    def get_counts(self, *args, **kwargs):
+        from .models import get_counts
+
+        return get_counts([self], *args, **kwargs)[self]
+
     def get_friends(self, *args, **kwargs):
         from .models import get_friends
 
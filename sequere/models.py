@@ -11,12 +11,36 @@ def is_following(from_instance, to_instance):
     return app.backend.is_following(from_instance, to_instance)
 
 
+def is_following_many(from_instance, to_instances):
+    from sequere import app
+
+    return app.backend.is_following_many(from_instance, to_instances)
+
+
 def unfollow(from_instance, to_instance):
     from sequere import app
 
     return app.backend.unfollow(from_instance, to_instance)
 
 
+def bulk_follow(from_instance, to_instances):
+    from sequere import app
+
+    return app.backend.bulk_follow(from_instance, to_instances)
+
+
+def bulk_unfollow(from_instance, to_instances):
+    from sequere import app
+
+    return app.backend.bulk_unfollow(from_instance, to_instances)
+
+
+def bulk_add_followers(to_instance, from_instances):
+    from sequere import app
+
+    return app.backend.bulk_add_followers(to_instance, from_instances)
+
+
 def get_followings(instance, *args, **kwargs):
     from sequere import app
 
@@ -35,6 +59,12 @@ def get_followers_count(instance, *args, **kwargs):
     return app.backend.get_followers_count(instance, *args, **kwargs)
 
 
+def get_counts(instances, *args, **kwargs):
+    from sequere import app
+
+    return app.backend.get_counts(instances, *args, **kwargs)
+
+
 def get_followers(instance, *args, **kwargs):
     from sequere import app
 
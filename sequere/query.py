@@ -1,19 +1,82 @@
+import base64
+import json
+
 import six
 
+from sequere.instrumentation import instruments
+
 REPR_OUTPUT_SIZE = 20
 
+ITERATOR_CHUNK_SIZE = 100
+
+
+def encode_cursor(position):
+    """
+    Returns an opaque token from a position (score or date, uid or pk).
+    """
+    if position is None:
+        return None
+
+    return base64.urlsafe_b64encode(json.dumps(list(position)).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    if cursor is None:
+        return None
+
+    if isinstance(cursor, (tuple, list)):
+        return tuple(cursor)
+
+    try:
+        return tuple(json.loads(base64.urlsafe_b64decode(str(cursor)).decode('utf-8')))
+    except (TypeError, ValueError):
+        raise ValueError('Invalid cursor %r' % cursor)
+
+
+class CursorPage(list):
+    def __init__(self, results, next_cursor=None, previous_cursor=None):
+        super(CursorPage, self).__init__(results)
+
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
 
 class QuerySetTransformer(object):
+    chunk_size = ITERATOR_CHUNK_SIZE
+
     def __init__(self, qs, count):
         self.qs = qs
         self._count = count
+        self._result_cache = {}
 
     def set_limits(self, start, stop):
         self.start = start
         self.stop = stop
 
     def __len__(self):
-        return self._count
+        return self.count()
+
+    def __bool__(self):
+        return self.exists()
+
+    __nonzero__ = __bool__
+
+    def __iter__(self):
+        if self._result_cache:
+            results = self._result_cache.get((0, self.count()))
+
+            if results is not None:
+                return iter(results)
+
+        return self.iterator(self.chunk_size)
 
     def __getitem__(self, k):
         if not isinstance(k, (slice,) + six.integer_types):
@@ -33,19 +96,140 @@ class QuerySetTransformer(object):
             else:
                 stop = None
 
+            results = self._get_results(start, stop)
+
+            return k.step and results[::k.step] or results
+
+        results = self._get_results(k, k + 1)
+
+        if not results:
+            raise IndexError('Index out of range')
+
+        return results[0]
+
+    def _get_results(self, start, stop):
+        """
+        Returns the results of a slice, each slice is computed once then
+        retrieved from the result cache.
+        """
+        key = (start, stop)
+
+        if key not in self._result_cache:
             self.set_limits(start, stop)
 
-            return k.step and list(self.transform(self.qs))[::k.step] or self.transform(self.qs)
+            self._result_cache[key] = self._measure(lambda: list(self.transform(self.qs)))
+
+        return self._result_cache[key]
 
     def transform(self, qs):
         raise NotImplementedError
 
+    def _measure(self, func, *args, **kwargs):
+        """
+        Returns the results of ``func`` measured as a ``list`` operation.
+        """
+        with instruments.measure('list', backend=self.__class__.__name__) as operation:
+            results = func(*args, **kwargs)
+
+            if operation is not None:
+                operation.size = len(results)
+
+        return results
+
+    def _fetch(self, limit, cursor=None, reverse=False):
+        """
+        Returns at most ``limit`` couples (result, position) located strictly
+        after ``cursor`` in the order of the transformer, or before it when
+        ``reverse`` is set (nearest first).
+        """
+        raise NotImplementedError
+
+    def page(self, limit, after=None, before=None):
+        """
+        Returns the ``limit`` results after (or before) a cursor using
+        ranges bounded by the cursor position instead of offsets, the cost
+        of a page does not depend on its depth.
+        """
+        after = decode_cursor(after)
+        before = decode_cursor(before)
+
+        if before is not None:
+            rows = self._measure(self._fetch, limit + 1, before, reverse=True)
+
+            has_previous = len(rows) > limit
+
+            rows = rows[:limit][::-1]
+
+            return CursorPage([result for result, position in rows],
+                              next_cursor=encode_cursor(rows[-1][1]) if rows else encode_cursor(before),
+                              previous_cursor=encode_cursor(rows[0][1]) if has_previous else None)
+
+        rows = self._measure(self._fetch, limit + 1, after)
+
+        has_next = len(rows) > limit
+
+        rows = rows[:limit]
+
+        return CursorPage([result for result, position in rows],
+                          next_cursor=encode_cursor(rows[-1][1]) if has_next else None,
+                          previous_cursor=encode_cursor(rows[0][1]) if after is not None and rows else None)
+
+    def iterator(self, chunk_size=ITERATOR_CHUNK_SIZE):
+        """
+        Yields the results by chunks of ``chunk_size`` without caching them,
+        each chunk is fetched after the position of the previous one so
+        memory and cost per chunk stay bounded whatever the size of the set.
+        """
+        cursor = None
+
+        while True:
+            try:
+                rows = self._measure(self._fetch, chunk_size, cursor)
+            except NotImplementedError:
+                for result in self._offset_iterator(chunk_size):
+                    yield result
+
+                return
+
+            for result, position in rows:
+                yield result
+
+            if len(rows) < chunk_size:
+                return
+
+            cursor = rows[-1][1]
+
+    def _offset_iterator(self, chunk_size):
+        start = 0
+
+        while True:
+            self.set_limits(start, start + chunk_size)
+
+            results = self._measure(lambda: list(self.transform(self.qs)))
+
+            for result in results:
+                yield result
+
+            if len(results) < chunk_size:
+                return
+
+            start += chunk_size
+
     def count(self):
+        """
+        Returns the number of results, ``count`` can be given as a callable
+        to only be evaluated when needed.
+        """
+        if callable(self._count):
+            self._count = self._count()
+
         return self._count
 
+    def exists(self):
+        return self.count() > 0
+
     def all(self):
-        self.set_limits(0, self.count())
-        return self.transform(self.qs)
+        return self._get_results(0, self.count())
 
     def __repr__(self):
         data = list(self[:REPR_OUTPUT_SIZE + 1])
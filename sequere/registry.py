@@ -4,6 +4,8 @@ from .base import ModelBase
 class SequereRegistry(dict):
     def __init__(self):
         self._models = {}
+        self._identifiers = None
+        self._models_identifiers = None
 
     def for_model(self, model):
         try:
@@ -12,22 +14,37 @@ class SequereRegistry(dict):
             return
 
     def get_identifier(self, instance):
-        from django.db import models
-
         klass = instance
 
-        if isinstance(instance, models.Model):
+        if not isinstance(instance, type):
             klass = instance.__class__
 
-        return dict((v, k) for k, v in self.identifiers.items()).get(klass)
+        if self._models_identifiers is None:
+            self._models_identifiers = dict((v, k) for k, v in self.identifiers.items())
+
+        return self._models_identifiers.get(klass)
 
     @property
     def identifiers(self):
-        return dict((v().get_identifier(), k)
-                    for k, v in self._models.items())
+        if self._identifiers is None:
+            self._identifiers = dict((v().get_identifier(), k)
+                                     for k, v in self._models.items())
+
+        return self._identifiers
+
+    def _invalidate(self):
+        self._identifiers = None
+        self._models_identifiers = None
 
     def unregister(self, name):
-        del self[name]
+        sequere = self.pop(name)
+
+        model = getattr(sequere, 'model', None)
+
+        if model is not None and self._models.get(model) is sequere:
+            del self._models[model]
+
+        self._invalidate()
 
     def register(self, *args, **kwargs):
         from django.db import models
@@ -76,9 +93,13 @@ class SequereRegistry(dict):
         self._register(sequere)
         self._models[model] = sequere
 
+        self._invalidate()
+
     def _register(self, sequere):
         self[sequere.__name__] = sequere
 
+        self._invalidate()
+
 
 registry = SequereRegistry()
 
@@ -0,0 +1,82 @@
+import random
+
+from sequere.cache import LRUCache
+from sequere.registry import registry
+
+
+class ReadRouter(object):
+    """
+    Picks where the reads of a backend are sent: one of its ``replicas``
+    chosen at random or its ``primary`` when there is no replica.
+
+    Instances which followed, unfollowed or were followed or unfollowed
+    during the last ``sticky_ttl`` seconds are pinned to the primary so the
+    writes of their relations are visible despite the replication lag. Writers are remembered in a process
+    local LRU (``max_size`` entries) and, when ``cache_alias`` is given, in a
+    Django cache shared by the processes.
+    """
+    def __init__(self, primary, replicas=(), sticky_ttl=5, max_size=10000, cache_alias=None,
+                 key_prefix='sequere:sticky'):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.sticky_ttl = sticky_ttl
+
+        self.writers = LRUCache(max_size, ttl=sticky_ttl)
+
+        self.shared = None
+
+        if cache_alias is not None:
+            from django.core.cache import caches
+
+            self.shared = caches[cache_alias]
+
+        self.key_prefix = key_prefix
+
+    def get_key(self, instance):
+        return (registry.get_identifier(instance), instance.pk)
+
+    def get_shared_key(self, key):
+        return '%s:%s:%s' % ((self.key_prefix, ) + key)
+
+    def pin(self, instances):
+        """
+        Sends the reads of a list of instances to the primary for the next
+        ``sticky_ttl`` seconds.
+        """
+        if not self.replicas or not self.sticky_ttl:
+            return
+
+        keys = set(self.get_key(instance) for instance in instances)
+
+        self.writers.set_many(dict((key, True) for key in keys))
+
+        if self.shared is not None:
+            self.shared.set_many(dict((self.get_shared_key(key), True) for key in keys), self.sticky_ttl)
+
+    def pin_edges(self, edges):
+        """
+        Pins both instances of a list of (from, to) edges, the followings of
+        the first one and the followers of the second one being written.
+        """
+        self.pin([instance for edge in edges for instance in edge])
+
+    def is_pinned(self, instances):
+        keys = [self.get_key(instance) for instance in instances]
+
+        if self.writers.get_many(keys):
+            return True
+
+        if self.shared is not None:
+            return bool(self.shared.get_many([self.get_shared_key(key) for key in keys]))
+
+        return False
+
+    def get(self, *instances):
+        """
+        Returns the connection the reads of the relations of ``instances``
+        are sent to.
+        """
+        if not self.replicas or self.is_pinned(instances):
+            return self.primary
+
+        return random.choice(self.replicas)
@@ -1,6 +1,10 @@
 from django.dispatch import Signal
 
 
-followed = Signal(providing_args=['from_instance', 'to_instance'])
+followed = Signal()  # from_instance, to_instance
 
-unfollowed = Signal(providing_args=['from_instance', 'to_instance'])
+unfollowed = Signal()  # from_instance, to_instance
+
+bulk_followed = Signal()  # edges
+
+bulk_unfollowed = Signal()  # edges
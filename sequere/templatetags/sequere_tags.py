@@ -1,26 +1,129 @@
 from django import template
+from django.core.signals import request_finished, request_started
 
 from sequere.registry import registry
 from sequere import models
 
+try:
+    from asgiref.local import Local
+except ImportError:  # Django < 3.0
+    from threading import local as Local
+
 register = template.Library()
 
+# results of the prefetch tags, kept for the current request only
+_prefetched = Local()
+
+
+def _get_prefetched(name):
+    try:
+        store = _prefetched.store
+    except AttributeError:
+        store = _prefetched.store = {}
+
+    return store.setdefault(name, {})
+
+
+def clear_prefetched(**kwargs):
+    """
+    Drops the prefetched counts and follow states, done when a request
+    starts and finishes, to call when templates are rendered outside of
+    requests (in a task).
+    """
+    _prefetched.store = {}
+
+
+request_started.connect(clear_prefetched)
+request_finished.connect(clear_prefetched)
+
+
+def _cache_key(instance):
+    return registry.get_identifier(instance), instance.pk
+
 
 @register.filter
 def identifier(instance, arg=None):
     return registry.get_identifier(instance)
 
 
+def _get_count(instance, kind, identifier=None):
+    key = _cache_key(instance) + (kind, identifier, )
+
+    cache = _get_prefetched('counts')
+
+    if key in cache:
+        return cache[key]
+
+    return models.get_counts([instance], kinds=(kind, ), identifiers=(identifier, ))[instance][(kind, identifier)]
+
+
+@register.simple_tag
+def prefetch_counts(instances, *identifiers):
+    """
+    Retrieves the counts of a list of instances at once, ``followers_count``,
+    ``followings_count`` and ``friends_count`` then read them::
+
+        {% prefetch_counts users %}
+        {% prefetch_counts users 'projet' %}
+
+        {% for user in users %}{{ user|followers_count }}{% endfor %}
+    """
+    instances = list(instances)
+
+    results = models.get_counts(instances, identifiers=(None, ) + identifiers)
+
+    cache = _get_prefetched('counts')
+
+    for instance in instances:
+        cache.update((_cache_key(instance) + key, count) for key, count in results[instance].items())
+
+    return ''
+
+
 @register.filter
 def followers_count(instance, identifier=None):
-    return models.get_followers_count(instance, identifier)
+    return _get_count(instance, 'followers', identifier)
 
 
 @register.filter
 def followings_count(instance, identifier=None):
-    return models.get_followings_count(instance, identifier)
+    return _get_count(instance, 'followings', identifier)
+
+
+@register.filter
+def friends_count(instance, identifier=None):
+    return _get_count(instance, 'friends', identifier)
+
+
+@register.simple_tag
+def prefetch_following(from_instance, instances):
+    """
+    Retrieves the follow state of ``from_instance`` for a list of instances at once,
+    ``is_following`` then reads it without querying the backend for each item::
+
+        {% prefetch_following request.user users %}
+
+        {% for user in users %}
+            {% if request.user|is_following:user %}...{% endif %}
+        {% endfor %}
+    """
+    results = models.is_following_many(from_instance, list(instances))
+
+    from_key = _cache_key(from_instance)
+
+    _get_prefetched('following').update(((from_key, _cache_key(instance)), result)
+                                        for instance, result in results.items())
+
+    return ''
 
 
 @register.filter
 def is_following(from_instance, to_instance):
+    key = (_cache_key(from_instance), _cache_key(to_instance))
+
+    cache = _get_prefetched('following')
+
+    if key in cache:
+        return cache[key]
+
     return models.is_following(from_instance, to_instance)
@@ -1,10 +1,11 @@
 import json
 
+from unittest import skipIf
+
 from .celery import app as celery_app  # noqa
 
 from django.test.utils import override_settings
 from django.test import TestCase
-from django.core.urlresolvers import reverse
 from django.conf import settings
 
 from datetime import datetime, timedelta
@@ -15,10 +16,29 @@ from exam.cases import Exam
 from .models import Project
 
 from sequere import app
+from sequere.compat import reverse
 from sequere.backends.redis import RedisBackend
+from sequere.backends.redis.utils import get_key
 from sequere.registry import registry
 from sequere.backends.database.models import Follow
 
+try:
+    from asgiref.sync import async_to_sync
+except ImportError:  # Django < 3.0
+    async_to_sync = None
+
+SHARDED_OPTIONS = {
+    'client_class': 'sequere.backends.redis.sharding.ShardedRedis',
+    'options': {
+        'decode_responses': True,
+        'hosts': {
+            'a': {'db': 1},
+            'b': {'db': 2},
+            'c': {'db': 3},
+        },
+    },
+}
+
 
 class FixturesMixin(Exam):
     @fixture
@@ -100,6 +120,44 @@ class BaseBackendTests(FixturesMixin):
     def test_get_friends(self):
         pass
 
+    def test_bulk_follow(self):
+        from ..models import (bulk_follow, bulk_unfollow, bulk_add_followers, follow,
+                              get_followers_count, get_followings_count, get_friends_count)
+        from ..signals import bulk_followed
+
+        follow(self.newbie, self.user)
+
+        sent = []
+
+        def receiver(sender, edges, **kwargs):
+            sent.append(edges)
+
+        bulk_followed.connect(receiver)
+
+        try:
+            created = bulk_follow(self.user, [self.project, self.newbie, self.user, self.project])
+        finally:
+            bulk_followed.disconnect(receiver)
+
+        self.assertEqual(created, [(self.user, self.project), (self.user, self.newbie)])
+        self.assertEqual(sent, [created])
+
+        self.assertEqual(get_followings_count(self.user), 2)
+        self.assertEqual(get_friends_count(self.user), 1)
+        self.assertEqual(get_friends_count(self.newbie), 1)
+
+        created = bulk_add_followers(self.project, [self.user, self.newbie])
+
+        self.assertEqual(created, [(self.newbie, self.project)])
+        self.assertEqual(get_followers_count(self.project), 2)
+
+        deleted = bulk_unfollow(self.user, [self.project, self.newbie])
+
+        self.assertEqual(len(deleted), 2)
+        self.assertEqual(get_followings_count(self.user), 0)
+        self.assertEqual(get_friends_count(self.newbie), 0)
+        self.assertEqual(get_followers_count(self.project), 1)
+
     def test_is_following(self):
         from ..models import (follow, unfollow, is_following)
 
@@ -111,6 +169,120 @@ class BaseBackendTests(FixturesMixin):
 
         self.assertFalse(is_following(self.user, self.project))
 
+    def test_is_following_many(self):
+        from ..models import follow, is_following_many
+
+        follow(self.user, self.project)
+
+        self.assertEqual(is_following_many(self.user, [self.project, self.newbie]), {
+            self.project: True,
+            self.newbie: False
+        })
+
+        self.assertEqual(is_following_many(self.newbie, [self.project]), {
+            self.project: False
+        })
+
+    def test_prefetch_following(self):
+        from django.template import Context, Template
+
+        from ..models import follow
+
+        follow(self.user, self.project)
+
+        template = Template('{% load sequere_tags %}'
+                            '{% prefetch_following user instances %}'
+                            '{% for instance in instances %}{{ user|is_following:instance }} {% endfor %}')
+
+        content = template.render(Context({
+            'user': self.user,
+            'instances': [self.project, self.newbie]
+        }))
+
+        self.assertEqual(content, 'True False ')
+
+    def test_get_counts(self):
+        from ..models import follow, get_counts
+
+        follow(self.user, self.project)
+        follow(self.project, self.user)
+        follow(self.newbie, self.project)
+
+        identifier = registry.get_identifier(self.user)
+
+        counts = get_counts([self.user, self.project, self.newbie],
+                            identifiers=(None, identifier))
+
+        self.assertEqual(counts[self.project], {
+            ('followers', None): 2,
+            ('followers', identifier): 2,
+            ('followings', None): 1,
+            ('followings', identifier): 1,
+            ('friends', None): 1,
+            ('friends', identifier): 1,
+        })
+
+        self.assertEqual(counts[self.user][('followers', None)], 1)
+        self.assertEqual(counts[self.user][('followers', identifier)], 0)
+        self.assertEqual(counts[self.user][('friends', None)], 1)
+        self.assertEqual(counts[self.newbie][('followings', None)], 1)
+        self.assertEqual(counts[self.newbie][('friends', None)], 0)
+
+    def test_prefetch_counts(self):
+        from django.template import Context, Template
+
+        from ..models import follow
+
+        follow(self.user, self.project)
+        follow(self.newbie, self.project)
+
+        template = Template('{% load sequere_tags %}'
+                            '{% prefetch_counts instances %}'
+                            '{% for instance in instances %}{{ instance|followers_count }} {% endfor %}')
+
+        content = template.render(Context({
+            'instances': [self.project, self.user]
+        }))
+
+        self.assertEqual(content, '2 0 ')
+
+    def test_prefetch_request_scope(self):
+        from django.core.signals import request_started
+        from django.template import Context, Template
+
+        from ..compat import User
+        from ..models import follow
+
+        follow(self.user, self.project)
+
+        template = Template('{% load sequere_tags %}'
+                            '{% prefetch_counts instances %}'
+                            '{% prefetch_following user instances %}')
+
+        template.render(Context({
+            'user': self.newbie,
+            'instances': [self.project]
+        }))
+
+        self.assertEqual(sorted(vars(self.project)), ['_state', 'id', 'name'])
+        self.assertEqual(sorted(vars(self.newbie)), sorted(vars(User.objects.get(pk=self.newbie.pk))))
+
+        follow(self.newbie, self.project)
+
+        template = Template('{% load sequere_tags %}'
+                            '{{ project|followers_count }} {{ user|is_following:project }}')
+
+        context = {
+            'user': self.newbie,
+            'project': Project.objects.get(pk=self.project.pk)
+        }
+
+        self.assertEqual(template.render(Context(context)), '1 False')
+
+        request_started.send(sender=self.__class__)
+
+        self.assertEqual(template.render(Context(context)), '2 True')
+
     def test_get_followers(self):
         from ..models import follow, get_followers
 
@@ -122,6 +294,50 @@ class BaseBackendTests(FixturesMixin):
 
         self.assertIn(self.user, dict(qs.all()))
 
+    def test_get_followers_page(self):
+        from ..models import follow, get_followers
+
+        follow(self.user, self.project)
+        follow(self.newbie, self.project)
+
+        qs = get_followers(self.project)
+
+        page = qs.page(1)
+
+        self.assertEqual(len(page), 1)
+        self.assertTrue(page.has_next)
+        self.assertFalse(page.has_previous)
+
+        next_page = qs.page(1, after=page.next_cursor)
+
+        self.assertEqual(len(next_page), 1)
+        self.assertFalse(next_page.has_next)
+        self.assertTrue(next_page.has_previous)
+
+        self.assertEqual(set(dict(page + next_page)), set([self.user, self.newbie]))
+
+        self.assertEqual(qs.page(1, before=next_page.previous_cursor), page)
+
+    def test_get_followers_iterator(self):
+        from ..models import follow, get_followers
+
+        follow(self.user, self.project)
+        follow(self.newbie, self.project)
+
+        qs = get_followers(self.project)
+
+        self.assertTrue(qs.exists())
+        self.assertEqual(list(qs.iterator(chunk_size=1)), qs.all())
+        self.assertEqual(list(qs), qs.all())
+        self.assertEqual(qs[0], qs.all()[0])
+
+        self.assertIs(qs[0:1], qs[0:1])
+
+        with self.assertRaises(IndexError):
+            qs[2]
+
+        self.assertFalse(get_followers(self.user).exists())
+
     def test_get_followings(self):
         from ..models import follow, get_followings
 
@@ -192,6 +408,63 @@ class BaseBackendTests(FixturesMixin):
         self.assertEqual(content['followings_count'], 0)
         self.assertEqual(content['%s_followings_count' % identifier], 0)
 
+    @skipIf(async_to_sync is None, 'the asyncio API requires Django 3.0+')
+    def test_async_api(self):
+        from .. import aio
+        from ..models import follow, get_counts, get_followers, get_followings, is_following_many
+
+        follow(self.newbie, self.user)
+
+        async_to_sync(aio.afollow)(self.user, self.project)
+        async_to_sync(aio.afollow)(self.user, self.newbie)
+
+        self.assertTrue(async_to_sync(aio.ais_following)(self.user, self.project))
+        self.assertFalse(async_to_sync(aio.ais_following)(self.project, self.user))
+
+        self.assertEqual(async_to_sync(aio.ais_following_many)(self.newbie, [self.user, self.project]),
+                         is_following_many(self.newbie, [self.user, self.project]))
+
+        self.assertEqual(async_to_sync(aio.aget_followers_count)(self.project), 1)
+        self.assertEqual(async_to_sync(aio.aget_followings_count)(self.user), 2)
+        self.assertEqual(async_to_sync(aio.aget_friends_count)(self.user), 1)
+
+        instances = [self.user, self.newbie, self.project]
+
+        self.assertEqual(async_to_sync(aio.aget_counts)(instances), get_counts(instances))
+
+        self.assertEqual(async_to_sync(aio.aget_followings)(self.user), list(get_followings(self.user)))
+        self.assertEqual(async_to_sync(aio.aget_followings)(self.user, False), list(get_followings(self.user, False)))
+        self.assertEqual(async_to_sync(aio.aget_followers)(self.user, start=0, stop=1), get_followers(self.user)[0:1])
+
+        async_to_sync(aio.aunfollow)(self.user, self.newbie)
+
+        self.assertEqual(async_to_sync(aio.aget_friends)(self.user), [])
+
+    @skipIf(async_to_sync is None, 'the asyncio API requires Django 3.0+')
+    def test_async_signals(self):
+        import asyncio
+
+        from .. import aio
+        from ..signals import followed
+
+        loops = []
+
+        def receiver(sender, **kwargs):
+            try:
+                loops.append(asyncio.get_running_loop())
+            except RuntimeError:
+                loops.append(None)
+
+        followed.connect(receiver)
+
+        try:
+            async_to_sync(aio.afollow)(self.user, self.project)
+        finally:
+            followed.disconnect(receiver)
+
+        # receivers do blocking I/O, they are not run in the event loop
+        self.assertEqual(loops, [None])
+
 
 @override_settings(SEQUERE_BACKEND='sequere.backends.database.DatabaseBackend')
 class DatabaseBackendTests(BaseBackendTests, TestCase):
@@ -205,146 +478,1426 @@ class DatabaseBackendTests(BaseBackendTests, TestCase):
         self.assertEqual(instance.to_instance, self.project)
         self.assertEqual(instance.from_instance, self.user)
 
+    def test_unique_follow(self):
+        from django.db import IntegrityError, transaction
 
-@override_settings(SEQUERE_TIMELINE_IMPORT_ACTIONS_ON_FOLLOW=True,
-                   SEQUERE_TIMELINE_REMOVE_ACTIONS_ON_UNFOLLOW=True,
-                   INSTALLED_APPS=settings.INSTALLED_APPS + ['sequere.contrib.timeline', ],
-                   SEQUERE_TIMELINE_BACKEND='sequere.contrib.timeline.backends.redis.RedisBackend')
-class TimelineTests(FixturesMixin, TestCase):
+        from ..models import follow
+
+        follow(self.user, self.project)
+        follow(self.user, self.project)
+
+        self.assertEqual(Follow.objects.count(), 1)
+
+        with transaction.atomic():
+            self.assertRaises(IntegrityError, Follow.objects.create,
+                              from_identifier=registry.get_identifier(self.user),
+                              from_object_id=self.user.pk,
+                              to_identifier=registry.get_identifier(self.project),
+                              to_object_id=self.project.pk)
+
+
+class DatabaseCounterBackendTests(DatabaseBackendTests):
     def setUp(self):
-        super(TimelineTests, self).setUp()
+        from sequere.backends.database import DatabaseBackend
 
-        app.backend = RedisBackend()
+        super(DatabaseCounterBackendTests, self).setUp()
+
+        self.backend = app.backend
+
+        app.backend = DatabaseBackend(counters=True)
+
+    def tearDown(self):
+        app.backend = self.backend
+
+        super(DatabaseCounterBackendTests, self).tearDown()
+
+    def test_rebuild_counters(self):
+        from django.core.management import call_command
+
+        from sequere.backends.database.models import FollowCounter
+
+        from ..models import follow, get_followers_count, get_friends_count
+
+        follow(self.user, self.project)
+        follow(self.project, self.user)
+        follow(self.newbie, self.project)
+
+        FollowCounter.objects.all().delete()
+
+        self.assertEqual(get_followers_count(self.project), 0)
+
+        call_command('sequere_rebuild_counters')
+
+        self.assertEqual(get_followers_count(self.project), 2)
+        self.assertEqual(get_followers_count(self.project, registry.get_identifier(self.user)), 2)
+        self.assertEqual(get_friends_count(self.user), 1)
+        self.assertEqual(get_friends_count(self.project, registry.get_identifier(self.user)), 1)
+
+
+class RegistryTests(TestCase):
+    def test_register_unregister(self):
+        from .sequere_registry import ProjectSequere
+
+        self.assertEqual(registry.get_identifier(Project), 'projet')
+        self.assertEqual(registry.identifiers['projet'], Project)
+
+        registry.unregister('ProjectSequere')
+
+        try:
+            self.assertIsNone(registry.get_identifier(Project))
+            self.assertNotIn('projet', registry.identifiers)
+            self.assertIsNone(registry.for_model(Project))
+        finally:
+            registry.register(Project, ProjectSequere)
+
+        self.assertEqual(registry.get_identifier(Project()), 'projet')
+        self.assertEqual(registry.identifiers['projet'], Project)
+
+
+class RedisBackendTests(BaseBackendTests, TestCase):
+    backend_options = {}
+
+    def setUp(self):
+        super(RedisBackendTests, self).setUp()
+
+        self.backend = app.backend
+
+        app.backend = RedisBackend(**self.backend_options)
         app.backend.clear()
 
-    def test_simple_timeline(self):
-        from .sequere_registry import JoinAction, User
-        from sequere.contrib.timeline import Timeline
+    def tearDown(self):
+        app.backend = self.backend
 
-        timeline = Timeline(self.user)
+        super(RedisBackendTests, self).tearDown()
 
-        timeline.save(JoinAction(self.user))
+    def test_follow_twice(self):
+        from ..models import follow, get_followers_count
+        from ..exceptions import AlreadyFollowingException
 
-        self.assertEqual(timeline.get_private_count(), 1)
-        self.assertEqual(timeline.get_public_count(), 1)
+        follow(self.user, self.project)
 
-        self.assertEqual(timeline.get_public_count(action='join'), 1)
-        self.assertEqual(timeline.get_private_count(action='join'), 1)
+        self.assertRaises(AlreadyFollowingException, follow, self.user, self.project)
 
-        self.assertEqual(timeline.get_private_count(action=JoinAction), 1)
-        self.assertEqual(timeline.get_public_count(action=JoinAction), 1)
+        self.assertEqual(get_followers_count(self.project), 1)
 
-        self.assertEqual(timeline.get_private_count(target=self.user), 1)
-        self.assertEqual(timeline.get_private_count(target=User), 1)
+    def test_unfollow_not_following(self):
+        from ..models import unfollow, get_followings_count
+        from ..exceptions import NotFollowingException
 
-        self.assertEqual(timeline.get_public_count(target=self.user), 1)
-        self.assertEqual(timeline.get_public_count(target=User), 1)
+        self.assertRaises(NotFollowingException, unfollow, self.user, self.project)
 
-        qs = timeline.get_private()
+        self.assertEqual(get_followings_count(self.user), 0)
 
-        self.assertEqual(qs.count(), 1)
+    def test_get_followers_page_registered_script(self):
+        from ..models import follow, get_followers
 
-        results = qs.all()
+        follow(self.user, self.project)
+        follow(self.newbie, self.project)
 
-        self.assertEqual(len(results), 1)
+        client = app.backend.client
 
-        qs = timeline.get_public()
+        def register_script(script):
+            raise AssertionError('Scripts are registered by the backend')
 
-        self.assertEqual(qs.count(), 1)
+        client.register_script = register_script
 
-        results = qs.all()
+        try:
+            qs = get_followers(self.project)
 
-        self.assertEqual(len(results), 1)
+            page = qs.page(1)
 
-    def test_read_at(self):
-        from sequere.contrib.timeline import Timeline
+            self.assertEqual(len(qs.page(1, after=page.next_cursor)), 1)
+        finally:
+            del client.register_script
 
-        timeline = Timeline(self.user)
-        timeline.mark_as_read()
 
-        self.assertTrue(timeline.read_at is not None)
+class RedisIdentifierBackendTests(RedisBackendTests):
+    backend_options = {
+        'manager_class': 'sequere.backends.redis.managers.IdentifierInstanceManager'
+    }
 
-    def test_dispatch_action(self):
-        from ..models import (follow, unfollow)
-        from .sequere_registry import JoinAction, LikeAction, Project
-        from sequere.contrib.timeline import Timeline
+    def test_uid(self):
+        self.assertEqual(app.backend.get_uid(self.user), 'user.%s' % self.user.pk)
+        self.assertEqual(app.backend.get_from_uid('user.%s' % self.user.pk), self.user)
 
-        follow(self.newbie, self.user)
+    def test_migrate_uids(self):
+        from django.core.management import call_command
 
-        timeline = Timeline(self.user)
+        from ..models import follow, get_followers, get_friends_count, is_following
 
-        action = JoinAction(self.user)
+        app.backend = RedisBackend()
 
-        timeline.save(action)
+        follow(self.user, self.project)
+        follow(self.project, self.user)
+        follow(self.newbie, self.project)
 
-        timeline = Timeline(self.newbie)
+        call_command('sequere_migrate_uids', skip_timeline=True)
 
-        self.assertEqual(timeline.get_private_count(), 1)
-        self.assertEqual(timeline.get_public_count(), 0)
+        app.backend = RedisBackend(**self.backend_options)
 
-        unfollow(self.newbie, self.user)
+        self.assertTrue(is_following(self.user, self.project))
+        self.assertTrue(is_following(self.newbie, self.project))
+        self.assertEqual(get_friends_count(self.project), 1)
+        self.assertEqual(set(dict(get_followers(self.project).all())), set([self.user, self.newbie]))
+        self.assertEqual(app.backend.client.keys('sequere:uid:user:*'), [])
 
-        action = LikeAction(actor=self.user, target=self.project)
-        timeline = Timeline(self.user)
 
-        timeline.save(action)
+class RedisCacheBackendTests(RedisBackendTests):
+    backend_options = {
+        'cache_class': 'sequere.cache.HydrationCache',
+    }
 
-        self.assertEqual(timeline.get_private_count(), 2)
-        self.assertEqual(timeline.get_public_count(), 2)
+    def test_hydration_cache(self):
+        from ..models import follow, get_followers
 
-        self.assertEqual(timeline.get_private_count(target=Project), 1)
-        self.assertEqual(timeline.get_public_count(target=Project), 1)
+        follow(self.user, self.project)
 
-        timeline = Timeline(self.newbie)
+        cache = app.backend.manager.cache
 
-        self.assertEqual(timeline.get_private_count(), 0)
-        self.assertEqual(timeline.get_unread_count(), 0)
+        self.assertEqual(list(dict(get_followers(self.project).all())), [self.user])
 
-        timeline.mark_as_read(timestamp=datetime.now() + timedelta(days=1))
+        with self.assertNumQueries(0):
+            self.assertEqual(list(dict(get_followers(self.project).all())), [self.user])
 
-        self.assertEqual(timeline.get_unread_count(), 0)
+        self.assertEqual(cache.stats['hits'], 1)
 
-        self.assertEqual(timeline.get_public_count(), 0)
+        self.user.username = 'florent'
+        self.user.save()
 
-    def test_get_actions(self):
-        from .sequere_registry import JoinAction, LikeAction
-        from sequere.contrib.timeline import get_actions
+        with self.assertNumQueries(1):
+            user, = dict(get_followers(self.project).all())
 
-        actions = get_actions()
+        self.assertEqual(user.username, 'florent')
 
-        self.assertEqual(dict(actions), {
-            'join': JoinAction,
-            'like': LikeAction
-        })
+    def test_hydration_cache_copies(self):
+        from ..models import follow, get_followers
 
-    def test_signals_actions(self):
-        from ..models import follow, unfollow
-        from .sequere_registry import JoinAction
-        from sequere.contrib.timeline import Timeline
+        follow(self.user, self.project)
 
-        timeline = Timeline(self.user)
+        user, = dict(get_followers(self.project).all())
+        user.prefetched = True
 
-        action = JoinAction(self.user)
+        with self.assertNumQueries(0):
+            cached, = dict(get_followers(self.project).all())
 
-        timeline.save(action)
+        self.assertEqual(cached, self.user)
+        self.assertIsNot(cached, user)
+        self.assertFalse(hasattr(cached, 'prefetched'))
+        self.assertFalse(cached._state.adding)
 
-        follow(self.newbie, self.user)
+    def test_lru_cache(self):
+        from ..cache import LRUCache
 
-        timeline = Timeline(self.newbie)
+        cache = LRUCache(max_size=2)
+        cache.set_many({1: 'a', 2: 'b'})
+        cache.get_many([1])
+        cache.set_many({3: 'c'})
 
-        self.assertEqual(timeline.get_private_count(), 1)
-        self.assertEqual(timeline.get_unread_count(), 1)
+        self.assertEqual(cache.get_many([1, 2, 3]), {1: 'a', 3: 'c'})
 
-        unfollow(self.newbie, self.user)
 
-        self.assertEqual(timeline.get_private_count(), 0)
-        self.assertEqual(timeline.get_unread_count(), 0)
+class RedisShardedBackendTests(RedisBackendTests):
+    backend_options = SHARDED_OPTIONS
 
+    def test_async_api(self):
+        from django.core.exceptions import ImproperlyConfigured
 
-@override_settings(SEQUERE_BACKEND='sequere.backends.redis.RedisBackend',
-                   SEQUERE_TIMELINE_IMPORT_ACTIONS_ON_FOLLOW=True,
-                   SEQUERE_TIMELINE_REMOVE_ACTIONS_ON_UNFOLLOW=True,
-                   INSTALLED_APPS=settings.INSTALLED_APPS + ['sequere.contrib.timeline', ],
-                   SEQUERE_TIMELINE_BACKEND='sequere.contrib.timeline.backends.redis.RedisBackend')
-class RedisUrlTimelineTests(TimelineTests):
-    pass
+        self.assertRaises(ImproperlyConfigured, app.backend.get_async_backend)
+
+    def test_async_signals(self):
+        pass
+
+    def test_hash_ring(self):
+        from sequere.backends.redis.sharding import HashRing
+
+        ring = HashRing(['a', 'b'])
+
+        keys = ['user.%d' % i for i in range(1000)]
+
+        nodes = dict((key, ring.get_node(key)) for key in keys)
+
+        ring.add_node('c')
+
+        moved = [key for key in keys if ring.get_node(key) != nodes[key]]
+
+        self.assertTrue(all(ring.get_node(key) == 'c' for key in moved))
+        self.assertTrue(200 < len(moved) < 500)
+
+        ring.remove_node('c')
+
+        self.assertEqual(dict((key, ring.get_node(key)) for key in keys), nodes)
+
+    def test_hash_tags(self):
+        from ..exceptions import CrossShardException
+        from ..models import follow
+
+        follow(self.user, self.project)
+        follow(self.project, self.user)
+
+        client = app.backend.client
+
+        for instance in (self.user, self.project):
+            uid = app.backend.get_uid(instance)
+
+            shards = [name for name, shard in client.shards.items()
+                      if shard.keys(app.backend.manager.get_uid_key(uid, '*'))]
+
+            self.assertEqual(shards, [client.get_shard_name(app.backend.manager.get_uid_key(uid))])
+
+        keys = [app.backend.manager.get_uid_key(i) for i in range(20)]
+
+        key = next(key for key in keys if client.get_shard_name(key) != client.get_shard_name(keys[0]))
+
+        self.assertRaises(CrossShardException, client.register_script('return 1'), keys=[keys[0], key])
+
+    def test_concurrent_mutual_follow(self):
+        from ..models import get_friends, get_friends_count, is_following
+
+        backend = app.backend
+
+        uids = dict(zip((self.user, self.project), backend.get_uids([self.user, self.project])))
+
+        params = [backend._get_follow_params(uids, from_instance, to_instance, 1)
+                  for from_instance, to_instance in ((self.user, self.project), (self.project, self.user))]
+
+        (user_out, user_in), (project_out, project_in) = [backend._get_sharded_steps(backend.follow_script, param)
+                                                          for param in params]
+
+        def run(step):
+            script, keys, args = step
+
+            return script(keys=keys, args=args)
+
+        # each shard runs the FOLLOW_IN of an edge before the FOLLOW_OUT of the reverse edge
+        results = {
+            'project_in': run(project_in),
+            'user_in': run(user_in),
+            'user_out': run(user_out),
+            'project_out': run(project_out),
+        }
+
+        self.assertEqual(results['user_in'], 1)
+        self.assertEqual(results['project_in'], 1)
+
+        for param, out_result, in_result in ((params[0], results['user_out'], results['user_in']),
+                                             (params[1], results['project_out'], results['project_in'])):
+            for step in backend._get_friends_steps(param, out_result, in_result):
+                run(step)
+
+        self.assertTrue(is_following(self.user, self.project))
+        self.assertTrue(is_following(self.project, self.user))
+        self.assertEqual(get_friends_count(self.user), 1)
+        self.assertEqual(get_friends_count(self.project), 1)
+        self.assertEqual(list(dict(get_friends(self.user).all())), [self.project])
+        self.assertEqual(list(dict(get_friends(self.project).all())), [self.user])
+
+    def test_rebalance(self):
+        from django.core.management import call_command
+
+        from ..compat import User
+        from ..models import follow, get_counts, get_followers, is_following
+
+        options = dict(SHARDED_OPTIONS['options'])
+        options['hosts'] = dict((name, host) for name, host in options['hosts'].items() if name != 'c')
+
+        app.backend = RedisBackend(client_class=SHARDED_OPTIONS['client_class'], options=options)
+
+        users = [User.objects.create(username='user%d' % i) for i in range(10)]
+
+        for user in users:
+            follow(user, self.project)
+            follow(self.user, user)
+
+        follow(self.user, self.project)
+        follow(self.project, self.user)
+
+        app.backend = RedisBackend(**self.backend_options)
+
+        call_command('sequere_rebalance', skip_timeline=True)
+
+        client = app.backend.client
+
+        for name, shard in client.shards.items():
+            self.assertTrue(all(client.get_shard_name(key) == name for key in shard.keys('*')))
+
+        self.assertTrue(client.shards['c'].dbsize())
+
+        self.assertTrue(all(is_following(self.user, user) for user in users))
+        self.assertEqual(set(dict(get_followers(self.project).all())), set(users + [self.user]))
+        self.assertEqual(get_counts([self.user])[self.user][('friends', None)], 1)
+
+    def test_rebalance_recreated_edges(self):
+        from django.core.management import call_command
+
+        from ..compat import User
+        from ..models import bulk_follow, get_counts, get_followers
+
+        manager_class = 'sequere.backends.redis.managers.IdentifierInstanceManager'
+
+        options = dict(SHARDED_OPTIONS['options'])
+        options['hosts'] = dict((name, host) for name, host in options['hosts'].items() if name != 'c')
+
+        app.backend = RedisBackend(client_class=SHARDED_OPTIONS['client_class'], options=options,
+                                   manager_class=manager_class)
+
+        users = [User.objects.create(username='user%d' % i) for i in range(20)]
+
+        bulk_follow(self.project, users)
+
+        for user in users:
+            bulk_follow(user, [self.project])
+
+        app.backend = RedisBackend(manager_class=manager_class, **self.backend_options)
+
+        # the edges of the moved keys are written again on their new shard
+        bulk_follow(self.project, users)
+
+        for user in users:
+            bulk_follow(user, [self.project])
+
+        self.assertTrue(app.backend.client.shards['c'].dbsize())
+
+        call_command('sequere_rebalance', skip_timeline=True)
+        call_command('sequere_rebalance', skip_timeline=True)
+
+        counts = get_counts(users + [self.project])
+
+        for user in users:
+            self.assertEqual(counts[user][('followers', None)], 1)
+            self.assertEqual(counts[user][('followings', None)], 1)
+            self.assertEqual(counts[user][('friends', None)], 1)
+
+        self.assertEqual(counts[self.project][('followers', None)], 20)
+        self.assertEqual(counts[self.project][('friends', None)], 20)
+        self.assertEqual(set(dict(get_followers(self.project).all())), set(users))
+
+
+class ReadRouterTests(FixturesMixin, TestCase):
+    def setUp(self):
+        super(ReadRouterTests, self).setUp()
+
+        self.backend = app.backend
+
+        # the replica is not replicated: reads sent to it see an empty graph
+        app.backend = RedisBackend(replicas=[{'db': 4, 'decode_responses': True}])
+        app.backend.clear()
+        app.backend.router.replicas[0].flushdb()
+
+    def tearDown(self):
+        app.backend = self.backend
+
+        super(ReadRouterTests, self).tearDown()
+
+    def test_read_your_writes(self):
+        from ..models import follow, get_followers_count, get_followings_count, is_following
+
+        follow(self.user, self.project)
+
+        self.assertTrue(is_following(self.user, self.project))
+        self.assertEqual(get_followings_count(self.user), 1)
+        # the followed instance is pinned too
+        self.assertEqual(get_followers_count(self.project), 1)
+
+        app.backend.router.writers.clear()
+
+        self.assertFalse(is_following(self.user, self.project))
+        self.assertEqual(get_followers_count(self.project), 0)
+
+    def test_uids_read_from_replica(self):
+        from ..models import follow, get_followers, get_followers_count, is_following
+
+        follow(self.user, self.project)
+
+        app.backend.router.writers.clear()
+
+        # reads resolve uids with the replica and do not create them
+        self.assertEqual(get_followers_count(self.newbie), 0)
+        self.assertEqual(list(get_followers(self.newbie).all()), [])
+        self.assertFalse(is_following(self.newbie, self.project))
+
+        self.assertIsNone(app.backend.manager.get_uid(self.newbie))
+        self.assertIsNotNone(app.backend.manager.get_uid(self.project))
+        self.assertIsNone(app.backend.manager.get_uid(self.project, client=app.backend.router.replicas[0]))
+
+    @skipIf(async_to_sync is None, 'the asyncio API requires Django 3.0+')
+    def test_async_read_your_writes(self):
+        from .. import aio
+        from ..models import is_following
+
+        async_to_sync(aio.afollow)(self.user, self.project)
+
+        self.assertTrue(is_following(self.user, self.project))
+
+        async_to_sync(aio.abulk_unfollow)(self.user, [self.project])
+
+        app.backend.router.writers.clear()
+
+        async_to_sync(aio.abulk_follow)(self.user, [self.project])
+
+        self.assertTrue(is_following(self.user, self.project))
+
+    def test_shared_stickiness(self):
+        from django.core.cache import cache
+
+        from ..replicas import ReadRouter
+
+        cache.clear()
+
+        routers = [ReadRouter('primary', ['replica'], cache_alias='default') for i in range(2)]
+
+        self.assertEqual(routers[1].get(self.user), 'replica')
+
+        routers[0].pin([self.user])
+
+        self.assertEqual(routers[1].get(self.user, self.project), 'primary')
+        self.assertEqual(routers[1].get(self.project), 'replica')
+        self.assertEqual(ReadRouter('primary').get(self.project), 'primary')
+
+
+class ClientRegistryTests(TestCase):
+    def test_shared_client(self):
+        from sequere.backends.redis.connections import ConnectionPool
+        from sequere.contrib.timeline.backends.redis import RedisBackend as RedisTimelineBackend
+
+        client = RedisBackend().client
+
+        self.assertIs(RedisTimelineBackend().client, client)
+        self.assertIsInstance(client.connection_pool, ConnectionPool)
+        self.assertEqual(client.connection_pool.max_connections, 2 ** 31)
+
+        self.assertIsNot(RedisBackend(options={'db': 4, 'decode_responses': True}).client, client)
+
+        sharded = RedisBackend(**SHARDED_OPTIONS).client
+
+        self.assertIs(sharded.shards['a'], RedisBackend(options={'db': 1, 'decode_responses': True}).client)
+
+    def test_pool_stats(self):
+        import redis
+
+        from sequere.backends.redis.connections import clients
+
+        client = clients.get({'db': 5}, pool_class='sequere.backends.redis.connections.BlockingConnectionPool',
+                             pool_options={'max_connections': 1, 'timeout': 0.01})
+
+        pool = client.connection_pool
+
+        connection = pool.get_connection('PING')
+
+        stats = next(stats for stats in clients.get_stats() if stats['name'].endswith('/5'))
+
+        self.assertEqual(stats['in_use'], 1)
+        self.assertEqual(stats['saturation'], 1.0)
+
+        self.assertRaises(redis.ConnectionError, pool.get_connection, 'PING')
+
+        self.assertEqual(pool.get_stats()['exhausted'], 1)
+        self.assertEqual(pool.get_stats()['timeouts'], 1)
+
+        pool.release(connection)
+
+        self.assertEqual(pool.get_stats()['idle'], 1)
+        self.assertTrue(client.ping())
+
+        # a forked worker does not reuse the connections of its parent
+        clients.pid = None
+        clients.get({'db': 5})
+
+        self.assertEqual(pool.get_stats()['created'], 0)
+        self.assertEqual(pool.get_stats()['timeouts'], 0)
+
+    def test_default_pool_stats(self):
+        import redis
+
+        from sequere.backends.redis.connections import clients
+
+        client = clients.get({'db': 6}, pool_class='sequere.backends.redis.connections.ConnectionPool',
+                             pool_options={'max_connections': 1})
+
+        pool = client.connection_pool
+
+        connection = pool.get_connection('PING')
+
+        self.assertEqual(pool.get_stats()['in_use'], 1)
+        self.assertEqual(pool.get_stats()['exhausted'], 1)
+
+        # the default pool does not wait for a connection to be released
+        self.assertRaises(redis.ConnectionError, pool.get_connection, 'PING')
+
+        self.assertEqual(pool.get_stats()['exhausted'], 2)
+        self.assertEqual(pool.get_stats()['timeouts'], 1)
+
+        pool.release(connection)
+
+        self.assertEqual(pool.get_stats()['idle'], 1)
+        self.assertTrue(client.ping())
+        self.assertEqual(pool.get_stats()['exhausted'], 2)
+
+
+class MemorySink(object):
+    def __init__(self):
+        self.operations = []
+
+    def record(self, operation):
+        self.operations.append(operation)
+
+    def get(self, name):
+        return [operation for operation in self.operations if operation.name == name]
+
+
+class InstrumentationTests(FixturesMixin, TestCase):
+    def setUp(self):
+        from sequere.instrumentation import instruments
+
+        super(InstrumentationTests, self).setUp()
+
+        self.backend = app.backend
+
+        self.sink = MemorySink()
+
+        instruments.sinks = [self.sink]
+
+    def tearDown(self):
+        from sequere.instrumentation import instruments
+
+        instruments.sinks = []
+
+        app.backend = self.backend
+
+        super(InstrumentationTests, self).tearDown()
+
+    def test_redis_backend(self):
+        from ..models import follow, get_followers, get_followers_count
+
+        app.backend = RedisBackend()
+        app.backend.clear()
+
+        follow(self.user, self.project)
+
+        self.assertEqual(get_followers_count(self.project), 1)
+
+        operation = self.sink.get('follow')[0]
+
+        self.assertEqual(operation.tags, {'backend': 'RedisBackend'})
+        self.assertTrue(operation.round_trips >= 1)
+        self.assertEqual(operation.queries, 0)
+        self.assertTrue(operation.duration >= 0)
+
+        # the uid of the instance then its counter
+        self.assertEqual(self.sink.get('get_followers_count')[0].round_trips, 2)
+
+        self.sink.operations = []
+
+        self.assertEqual([instance for instance, timestamp in get_followers(self.project)[0:10]], [self.user])
+
+        hydrate, listing = self.sink.operations
+
+        self.assertEqual((listing.name, listing.size), ('list', 1))
+        self.assertEqual((hydrate.name, hydrate.size, hydrate.queries), ('hydrate', 1, 1))
+
+        # a nested operation is counted by the operations containing it
+        self.assertTrue(listing.round_trips > hydrate.round_trips >= 1)
+        self.assertEqual(listing.queries, 1)
+
+    def test_sharded_redis_backend(self):
+        from ..models import bulk_follow, get_counts
+
+        app.backend = RedisBackend(**SHARDED_OPTIONS)
+        app.backend.clear()
+
+        bulk_follow(self.user, [self.project, self.newbie])
+
+        self.assertTrue(self.sink.get('follow_many')[0].round_trips >= 2)
+
+        self.sink.operations = []
+
+        get_counts([self.user, self.newbie, self.project])
+
+        # the uids and the counters are read from the shards in parallel threads
+        self.assertTrue(self.sink.get('get_counts')[0].round_trips >= 2)
+
+    def test_database_backend(self):
+        from sequere.backends.database import DatabaseBackend
+
+        from ..models import follow, is_following
+
+        app.backend = DatabaseBackend()
+
+        follow(self.user, self.project)
+
+        self.assertTrue(is_following(self.user, self.project))
+
+        self.assertTrue(self.sink.get('follow')[0].queries > 0)
+        self.assertEqual(self.sink.get('follow')[0].round_trips, 0)
+        self.assertEqual(self.sink.get('is_following')[0].queries, 1)
+
+    def test_disabled(self):
+        from sequere.instrumentation import NULL_MEASURE, instruments
+
+        instruments.sinks = []
+
+        self.assertIs(instruments.measure('follow'), NULL_MEASURE)
+
+        with instruments.measure('follow') as operation:
+            self.assertIsNone(operation)
+
+    def test_statsd_sink(self):
+        from sequere.instrumentation import Operation, StatsdSink
+
+        operation = Operation('hydrate', {'backend': 'InstanceManager'}, size=20)
+        operation.duration = 0.0015
+        operation.round_trips = 1
+
+        self.assertEqual(StatsdSink(dogstatsd=True).get_lines(operation), [
+            'sequere.hydrate.duration:1.500|ms|#backend:InstanceManager',
+            'sequere.hydrate.round_trips:1|h|#backend:InstanceManager',
+            'sequere.hydrate.queries:0|h|#backend:InstanceManager',
+            'sequere.hydrate.size:20|h|#backend:InstanceManager',
+        ])
+
+
+@override_settings(SEQUERE_TIMELINE_IMPORT_ACTIONS_ON_FOLLOW=True,
+                   SEQUERE_TIMELINE_REMOVE_ACTIONS_ON_UNFOLLOW=True,
+                   INSTALLED_APPS=settings.INSTALLED_APPS + ['sequere.contrib.timeline', ],
+                   SEQUERE_TIMELINE_BACKEND='sequere.contrib.timeline.backends.redis.RedisBackend')
+class TimelineTests(FixturesMixin, TestCase):
+    def setUp(self):
+        super(TimelineTests, self).setUp()
+
+        app.backend = RedisBackend()
+        app.backend.clear()
+
+    def test_simple_timeline(self):
+        from .sequere_registry import JoinAction, User
+        from sequere.contrib.timeline import Timeline
+
+        timeline = Timeline(self.user)
+
+        timeline.save(JoinAction(self.user))
+
+        self.assertEqual(timeline.get_private_count(), 1)
+        self.assertEqual(timeline.get_public_count(), 1)
+
+        self.assertEqual(timeline.get_public_count(action='join'), 1)
+        self.assertEqual(timeline.get_private_count(action='join'), 1)
+
+        self.assertEqual(timeline.get_private_count(action=JoinAction), 1)
+        self.assertEqual(timeline.get_public_count(action=JoinAction), 1)
+
+        self.assertEqual(timeline.get_private_count(target=self.user), 1)
+        self.assertEqual(timeline.get_private_count(target=User), 1)
+
+        self.assertEqual(timeline.get_public_count(target=self.user), 1)
+        self.assertEqual(timeline.get_public_count(target=User), 1)
+
+        qs = timeline.get_private()
+
+        self.assertEqual(qs.count(), 1)
+
+        results = qs.all()
+
+        self.assertEqual(len(results), 1)
+
+        qs = timeline.get_public()
+
+        self.assertEqual(qs.count(), 1)
+
+        results = qs.all()
+
+        self.assertEqual(len(results), 1)
+
+    def test_read_at(self):
+        from sequere.contrib.timeline import Timeline
+
+        timeline = Timeline(self.user)
+        timeline.mark_as_read()
+
+        self.assertTrue(timeline.read_at is not None)
+
+    def test_unread_count(self):
+        from ..models import follow
+        from .sequere_registry import JoinAction
+        from sequere.contrib.timeline import Timeline, get_unread_counts
+
+        follow(self.newbie, self.user)
+
+        date = datetime.now()
+
+        timeline = Timeline(self.newbie)
+
+        for i in range(3):
+            Timeline(self.user).save(JoinAction(self.user, date=date + timedelta(microseconds=i)))
+
+        self.assertEqual(timeline.get_unread_count(), 3)
+
+        timeline.mark_as_read()
+
+        self.assertEqual(timeline.get_unread_count(), 0)
+
+        # actions saved in the same second as the latest read one
+        Timeline(self.user).save(JoinAction(self.user, date=date + timedelta(microseconds=3)))
+        Timeline(self.user).save(JoinAction(self.user, date=date + timedelta(microseconds=10)))
+
+        self.assertEqual(timeline.get_unread_count(), 2)
+        self.assertEqual(timeline.get_unread_count(action=JoinAction), 2)
+        self.assertEqual(get_unread_counts([self.newbie, self.user]), [2, 5])
+
+        timeline.mark_as_read(timestamp=date + timedelta(microseconds=5))
+
+        self.assertEqual(timeline.get_unread_count(), 1)
+        self.assertEqual(timeline.read_at.replace(microsecond=0), date.replace(microsecond=0))
+
+    def test_dispatch_action(self):
+        from ..models import (follow, unfollow)
+        from .sequere_registry import JoinAction, LikeAction, Project
+        from sequere.contrib.timeline import Timeline
+
+        follow(self.newbie, self.user)
+
+        timeline = Timeline(self.user)
+
+        action = JoinAction(self.user)
+
+        timeline.save(action)
+
+        timeline = Timeline(self.newbie)
+
+        self.assertEqual(timeline.get_private_count(), 1)
+        self.assertEqual(timeline.get_public_count(), 0)
+
+        unfollow(self.newbie, self.user)
+
+        action = LikeAction(actor=self.user, target=self.project)
+        timeline = Timeline(self.user)
+
+        timeline.save(action)
+
+        self.assertEqual(timeline.get_private_count(), 2)
+        self.assertEqual(timeline.get_public_count(), 2)
+
+        self.assertEqual(timeline.get_private_count(target=Project), 1)
+        self.assertEqual(timeline.get_public_count(target=Project), 1)
+
+        timeline = Timeline(self.newbie)
+
+        self.assertEqual(timeline.get_private_count(), 0)
+        self.assertEqual(timeline.get_unread_count(), 0)
+
+        timeline.mark_as_read(timestamp=datetime.now() + timedelta(days=1))
+
+        self.assertEqual(timeline.get_unread_count(), 0)
+
+        self.assertEqual(timeline.get_public_count(), 0)
+
+    def test_dispatch_action_with_receivers(self):
+        from ..models import follow
+        from .sequere_registry import LikeAction
+        from sequere.contrib.timeline import Timeline, signals
+
+        follow(self.newbie, self.user)
+        follow(self.project, self.user)
+
+        instances = []
+
+        def handle_save(sender, instance, action, **kwargs):
+            instances.append(instance)
+
+        signals.post_save.connect(handle_save)
+
+        try:
+            Timeline(self.user).save(LikeAction(actor=self.user, target=self.project))
+        finally:
+            signals.post_save.disconnect(handle_save)
+
+        self.assertEqual(set(instances), set([self.user, self.newbie, self.project]))
+
+        Timeline(self.user).save(LikeAction(actor=self.user, target=self.project))
+
+        for instance in (self.newbie, self.project):
+            timeline = Timeline(instance)
+
+            self.assertEqual(timeline.get_private_count(), 2)
+            self.assertEqual(timeline.get_public_count(), 0)
+
+        self.assertEqual(Timeline(self.newbie).get_private_count(target=self.project), 2)
+
+    @override_settings(SEQUERE_TIMELINE_DISPATCH_CHUNK_SIZE=1)
+    def test_dispatch_progress(self):
+        from ..models import follow
+        from .sequere_registry import JoinAction
+        from sequere.contrib.timeline import Timeline, app
+        from sequere.contrib.timeline.tasks import dispatch_chunk, get_dispatch_windows
+
+        follow(self.newbie, self.user)
+        follow(self.project, self.user)
+
+        action = JoinAction(self.user)
+
+        Timeline(self.user).save(action)
+
+        self.assertEqual(app.backend.get_dispatch_progress(action.uid), {
+            'total': 2,
+            'dispatched': 2,
+        })
+
+        windows = get_dispatch_windows(self.user, 1)
+
+        self.assertEqual(len(windows), 2)
+
+        for window in windows:
+            dispatch_chunk(action.uid, *window)
+
+        self.assertEqual(app.backend.get_dispatch_progress(action.uid)['dispatched'], 2)
+        self.assertEqual(Timeline(self.newbie).get_private_count(), 1)
+        self.assertEqual(Timeline(self.project).get_private_count(), 1)
+
+    def test_dispatch_windows_unfollow(self):
+        from ..compat import User
+        from ..models import unfollow
+        from .sequere_registry import JoinAction
+        from sequere import app as sequere_app
+        from sequere.contrib.timeline import Timeline, app
+        from sequere.contrib.timeline.tasks import dispatch_chunk, get_dispatch_windows
+
+        users = [User.objects.create_user(username='follower%d' % i) for i in range(3)]
+
+        # followers sharing their score are ordered by uid
+        sequere_app.backend.follow_many([(user, self.newbie) for user in users], timestamp=1000000000)
+
+        action = JoinAction(self.newbie)
+
+        # saved without being dispatched
+        app.backend.save(self.newbie, action)
+
+        windows = get_dispatch_windows(self.newbie, 1)
+
+        self.assertEqual([size for identifier, after, until, size in windows], [1, 1, 1])
+
+        dispatch_chunk(action.uid, *windows[0])
+
+        # the follower of the first window leaves during the fan-out
+        unfollow(min(users, key=sequere_app.backend.get_uid), self.newbie)
+
+        for window in windows[1:]:
+            dispatch_chunk(action.uid, *window)
+
+        self.assertEqual(sorted(Timeline(user).get_private_count() for user in users), [0, 1, 1])
+
+    def test_pulled_actor(self):
+        from ..models import follow
+        from .sequere_registry import JoinAction, LikeAction, Project
+        from sequere.contrib.timeline import Timeline
+
+        follow(self.newbie, self.user)
+
+        def save_actions():
+            Timeline(self.user).save(JoinAction(self.user))
+            Timeline(self.user).save(LikeAction(actor=self.user, target=self.project))
+
+        save_actions()
+
+        timeline = Timeline(self.newbie)
+
+        expected = [(action.verb, action.target) for action in timeline.get_private().all()]
+
+        self.assertEqual(timeline.get_private_count(), 2)
+
+        app.backend.clear()
+        timeline.backend.storage.clear()
+
+        follow(self.newbie, self.user)
+
+        with override_settings(SEQUERE_TIMELINE_PULL_THRESHOLD=1,
+                               SEQUERE_TIMELINE_PULL_TTL=0):
+            save_actions()
+
+            self.assertEqual(timeline.backend.get_count(self.newbie, 'private'), 0)
+
+            self.assertEqual([(action.verb, action.target) for action in timeline.get_private().all()], expected)
+
+            self.assertEqual(timeline.get_private_count(), 2)
+            self.assertEqual(timeline.get_private_count(target=Project), 1)
+            self.assertEqual(timeline.get_private_count(action=JoinAction), 1)
+            self.assertEqual(timeline.get_unread_count(), 2)
+
+    def test_pulled_key_cached(self):
+        from mock import patch
+
+        from ..models import follow
+        from .sequere_registry import JoinAction
+        from sequere.contrib.timeline import Timeline
+
+        follow(self.newbie, self.user)
+
+        timeline = Timeline(self.newbie)
+
+        with override_settings(SEQUERE_TIMELINE_PULL_THRESHOLD=1,
+                               SEQUERE_TIMELINE_PULL_TTL=60):
+            Timeline(self.user).save(JoinAction(self.user))
+
+            self.assertEqual(timeline.get_private_count(), 1)
+
+            # the merged timeline is read without looking up the pulled actors
+            with patch.object(timeline.backend, '_get_following_pulled_uids') as get_following_pulled_uids:
+                self.assertEqual(timeline.get_private_count(), 1)
+                self.assertEqual(len(timeline.get_private().all()), 1)
+
+            self.assertFalse(get_following_pulled_uids.called)
+
+    def test_pulled_actor_pruned(self):
+        from ..models import follow, unfollow
+        from .sequere_registry import JoinAction
+        from sequere.contrib.timeline import Timeline
+
+        follow(self.newbie, self.user)
+        follow(self.project, self.user)
+
+        timeline = Timeline(self.newbie)
+
+        uid = app.backend.get_uid(self.user)
+
+        with override_settings(SEQUERE_TIMELINE_PULL_THRESHOLD=2,
+                               SEQUERE_TIMELINE_PULL_TTL=0):
+            Timeline(self.user).save(JoinAction(self.user))
+
+            self.assertEqual(timeline.backend.get_pulled_uids([uid]), [uid])
+            self.assertEqual(timeline.backend._get_following_pulled_uids(self.newbie), [uid])
+            self.assertEqual(timeline.backend.get_count(self.newbie, 'private'), 0)
+            self.assertEqual(timeline.get_private_count(), 1)
+
+            unfollow(self.project, self.user)
+
+            self.assertEqual(timeline.backend.get_pulled_uids([uid]), [])
+            self.assertEqual(timeline.backend._get_following_pulled_uids(self.newbie), [])
+
+            # the actions of the outbox are pushed to the followers left
+            self.assertEqual(timeline.backend.get_count(self.newbie, 'private'), 1)
+            self.assertEqual(timeline.get_private_count(), 1)
+            self.assertEqual(Timeline(self.project).get_private_count(), 0)
+
+    def test_migrate_uids_pulled(self):
+        from django.core.management import call_command
+
+        from ..models import follow
+        from .sequere_registry import JoinAction
+        from sequere.contrib.timeline import Timeline
+
+        follow(self.newbie, self.user)
+
+        with override_settings(SEQUERE_TIMELINE_PULL_THRESHOLD=1,
+                               SEQUERE_TIMELINE_PULL_TTL=0):
+            Timeline(self.user).save(JoinAction(self.user))
+
+            call_command('sequere_migrate_uids')
+
+            app.backend = RedisBackend(manager_class='sequere.backends.redis.managers.IdentifierInstanceManager')
+
+            timeline = Timeline(self.newbie)
+
+            uid = app.backend.get_uid(self.user)
+
+            self.assertEqual(timeline.backend.get_pulled_uids([uid]), [uid])
+            self.assertEqual(timeline.backend._get_following_pulled_uids(self.newbie), [uid])
+            self.assertEqual([action.verb for action in timeline.get_private().all()], ['join'])
+            self.assertEqual(timeline.get_private_count(), 1)
+            self.assertEqual(timeline.get_unread_count(), 1)
+
+    def test_memory(self):
+        from django.core.management import call_command
+        from six import StringIO
+
+        from .sequere_registry import JoinAction
+        from sequere.contrib.timeline import Timeline
+
+        timeline = Timeline(self.user)
+
+        timeline.save(JoinAction(self.user))
+        timeline.save(JoinAction(self.user))
+
+        backend, storage = timeline.backend, timeline.backend.storage
+
+        private_key = storage.get_uid_key(app.backend.get_uid(self.user), 'private')
+        view_key = backend._get_view_name(private_key, verb='join')
+
+        backend.client.zadd(get_key(private_key, 'pulled'), {'1': 1})
+        backend.client.zadd(view_key, {'1': 1})
+        backend.client.set(get_key(view_key, 'cursor'), 'done')
+        backend.client.set(storage.add_prefix('unknown'), 1)
+
+        out = StringIO()
+
+        call_command('sequere_timeline_memory', stdout=out)
+
+        lines = out.getvalue().splitlines()
+
+        self.assertEqual(lines[0].split()[:3], ['kind', 'keys', 'elements'])
+
+        stats = dict((line[:30].strip(), [int(value) for value in line[30:].split()[:2]])
+                     for line in lines[1:] if line[30:].split()[0].isdigit())
+
+        self.assertEqual(stats['actions'][0], 2)
+
+        for kind in ('private', 'public'):
+            self.assertEqual(stats[kind], [1, 2])
+            # verb, target and target + verb indexes
+            self.assertEqual(stats['%s filtered' % kind], [3, 6])
+            self.assertEqual(stats['%s counters' % kind][0], 4)
+
+        self.assertEqual(stats['private merged'], [1, 1])
+        self.assertEqual(stats['private views'][0], 2)
+        self.assertEqual(stats['other'][0], 1)
+
+    @override_settings(SEQUERE_TIMELINE_MAX_LENGTH={'private': 2, 'public': 3},
+                       SEQUERE_TIMELINE_ACTION_TTL=3600)
+    def test_max_length(self):
+        from ..models import follow
+        from .sequere_registry import JoinAction
+        from sequere.contrib.timeline import Timeline
+
+        follow(self.newbie, self.user)
+
+        for i in range(5):
+            Timeline(self.user).save(JoinAction(self.user, date=datetime.now() + timedelta(seconds=i)))
+
+        timeline = Timeline(self.user)
+
+        self.assertEqual(timeline.get_public_count(), 3)
+        self.assertEqual(timeline.get_private_count(), 2)
+        self.assertEqual(len(timeline.get_public().all()), 3)
+
+        timeline = Timeline(self.newbie)
+
+        self.assertEqual(timeline.get_private_count(), 2)
+        self.assertEqual(timeline.get_private_count(action=JoinAction), 2)
+
+        actions = timeline.get_private().all()
+
+        self.assertEqual(len(actions), 2)
+
+        client = timeline.backend.client
+
+        self.assertTrue(0 < client.ttl(timeline.backend.storage.get_action_key(actions[0].uid)) <= 3600)
+
+    def test_expired_actions(self):
+        from ..models import follow
+        from .sequere_registry import JoinAction, LikeAction, Project
+        from sequere.contrib.timeline import Timeline
+
+        follow(self.newbie, self.user)
+
+        Timeline(self.user).save(JoinAction(self.user))
+        Timeline(self.user).save(LikeAction(actor=self.user, target=self.project))
+
+        timeline = Timeline(self.newbie)
+
+        self.assertEqual(timeline.get_private_count(), 2)
+        self.assertEqual(timeline.get_unread_count(), 2)
+
+        storage = timeline.backend.storage
+
+        for action in timeline.get_private().all():
+            storage.client.delete(storage.get_action_key(action.uid))
+
+        # the actions found expired by a read are removed with their counters
+        self.assertEqual(timeline.get_private().all(), [])
+        self.assertEqual(timeline.get_private_count(), 0)
+        self.assertEqual(timeline.get_unread_count(), 0)
+
+        self.assertEqual(timeline.get_private(target=Project).all(), [])
+        self.assertEqual(timeline.get_private_count(target=Project), 0)
+
+        self.assertEqual(Timeline(self.user).get_public().all(), [])
+        self.assertEqual(Timeline(self.user).get_public_count(), 0)
+
+    def test_import_actions(self):
+        from .sequere_registry import JoinAction, LikeAction, Project
+        from sequere.contrib.timeline import Timeline
+
+        for i in range(3):
+            Timeline(self.user).save(JoinAction(self.user, date=datetime.now() - timedelta(seconds=i + 1)))
+
+        Timeline(self.user).save(LikeAction(actor=self.user, target=self.project))
+
+        from_uid, to_uid = app.backend.get_uid(self.user), app.backend.get_uid(self.newbie)
+
+        timeline = Timeline(self.newbie)
+
+        # actions are not loaded
+        with self.assertNumQueries(0):
+            with override_settings(SEQUERE_TIMELINE_POPULATE_LIMIT=3):
+                self.assertEqual(timeline.backend.import_actions(from_uid, to_uid), 3)
+
+        self.assertEqual(timeline.get_private_count(), 3)
+        self.assertEqual(timeline.get_private_count(target=Project), 1)
+        self.assertEqual(timeline.get_private_count(action=JoinAction), 2)
+        self.assertEqual(timeline.get_unread_count(), 3)
+
+        self.assertEqual(timeline.backend.import_actions(from_uid, to_uid), 1)
+        self.assertEqual(timeline.backend.remove_actions(from_uid, to_uid), 4)
+
+        self.assertEqual(timeline.get_private_count(), 0)
+        self.assertEqual(timeline.get_private_count(target=Project), 0)
+        self.assertEqual(timeline.get_unread_count(), 0)
+
+    def test_get_private_queries(self):
+        from ..models import follow
+        from .sequere_registry import JoinAction, LikeAction
+        from sequere.contrib.timeline import Timeline
+
+        follow(self.newbie, self.user)
+
+        for i in range(5):
+            Timeline(self.user).save(JoinAction(self.user))
+            Timeline(self.user).save(LikeAction(actor=self.user, target=self.project))
+
+        qs = Timeline(self.newbie).get_private()
+
+        # one query for the actors, one for the targets
+        with self.assertNumQueries(2):
+            actions = qs[0:10]
+
+        self.assertEqual(len(actions), 10)
+
+    def test_get_actions(self):
+        from .sequere_registry import JoinAction, LikeAction
+        from sequere.contrib.timeline import get_actions
+
+        actions = get_actions()
+
+        self.assertEqual(dict(actions), {
+            'join': JoinAction,
+            'like': LikeAction
+        })
+
+    def test_signals_actions(self):
+        from ..models import follow, unfollow
+        from .sequere_registry import JoinAction
+        from sequere.contrib.timeline import Timeline
+
+        timeline = Timeline(self.user)
+
+        action = JoinAction(self.user)
+
+        timeline.save(action)
+
+        follow(self.newbie, self.user)
+
+        timeline = Timeline(self.newbie)
+
+        self.assertEqual(timeline.get_private_count(), 1)
+        self.assertEqual(timeline.get_unread_count(), 1)
+
+        unfollow(self.newbie, self.user)
+
+        self.assertEqual(timeline.get_private_count(), 0)
+        self.assertEqual(timeline.get_unread_count(), 0)
+
+    @skipIf(async_to_sync is None, 'the asyncio API requires Django 3.0+')
+    def test_async_timeline(self):
+        from ..models import follow
+        from .sequere_registry import JoinAction, LikeAction
+        from sequere.contrib.timeline import Timeline, get_unread_counts
+        from sequere.contrib.timeline.aio import aget_unread_counts
+
+        follow(self.newbie, self.user)
+
+        now = datetime.now()
+
+        timeline = Timeline(self.user)
+        timeline.save(JoinAction(self.user, date=now - timedelta(seconds=2)))
+        timeline.save(LikeAction(self.user, target=self.project, date=now - timedelta(seconds=1)))
+
+        timeline = Timeline(self.newbie)
+
+        self.assertEqual([action.uid for action in async_to_sync(timeline.aget_private)()],
+                         [action.uid for action in timeline.get_private()])
+        self.assertEqual([action.uid for action in async_to_sync(timeline.aget_private)(desc=False, stop=1)],
+                         [action.uid for action in timeline.get_private(desc=False)[0:1]])
+
+        self.assertEqual(len(async_to_sync(timeline.aget_private)(action=LikeAction)), 1)
+        self.assertEqual(async_to_sync(timeline.aget_private_count)(target=self.project), 1)
+        self.assertEqual(async_to_sync(Timeline(self.user).aget_public_count)(), 2)
+
+        self.assertEqual(async_to_sync(timeline.aget_unread_count)(), 2)
+
+        async_to_sync(timeline.amark_as_read)()
+
+        self.assertEqual(async_to_sync(timeline.aget_unread_count)(), 0)
+        self.assertEqual(async_to_sync(timeline.aget_read_at)(), timeline.read_at)
+
+        self.assertEqual(async_to_sync(aget_unread_counts)([self.user, self.newbie]),
+                         get_unread_counts([self.user, self.newbie]))
+
+
+@override_settings(SEQUERE_BACKEND='sequere.backends.redis.RedisBackend',
+                   SEQUERE_TIMELINE_IMPORT_ACTIONS_ON_FOLLOW=True,
+                   SEQUERE_TIMELINE_REMOVE_ACTIONS_ON_UNFOLLOW=True,
+                   INSTALLED_APPS=settings.INSTALLED_APPS + ['sequere.contrib.timeline', ],
+                   SEQUERE_TIMELINE_BACKEND='sequere.contrib.timeline.backends.redis.RedisBackend')
+class RedisUrlTimelineTests(TimelineTests):
+    pass
+
+
+class RedisCompactTimelineTests(RedisUrlTimelineTests):
+    def setUp(self):
+        from sequere.contrib.timeline import app as timeline_app
+        from sequere.contrib.timeline.backends.redis import RedisBackend as RedisTimelineBackend
+
+        super(RedisCompactTimelineTests, self).setUp()
+
+        self.timeline_backend = timeline_app.backend
+
+        timeline_app.backend = RedisTimelineBackend(
+            manager_class='sequere.contrib.timeline.backends.redis.managers.CompactActionManager',
+            manager_options={'bucket_size': 2}
+        )
+
+    def tearDown(self):
+        from sequere.contrib.timeline import app as timeline_app
+
+        timeline_app.backend = self.timeline_backend
+
+        super(RedisCompactTimelineTests, self).tearDown()
+
+    def test_compact_storage(self):
+        from .sequere_registry import JoinAction, LikeAction
+        from sequere.contrib.timeline import Timeline
+
+        timeline = Timeline(self.user)
+
+        for i in range(3):
+            timeline.save(JoinAction(self.user))
+
+        action = LikeAction(actor=self.user, target=self.project)
+
+        timeline.save(action)
+
+        self.assertEqual(action.uid, '4')
+
+        storage = timeline.backend.storage
+
+        self.assertEqual(storage.get_action_key(action.uid), storage.add_prefix('actions:2'))
+        self.assertEqual(timeline.backend.client.hlen(storage.get_action_key(action.uid)), 1)
+
+        result = timeline.backend.get_action(action.uid)
+
+        self.assertEqual(result.verb, 'like')
+        self.assertEqual(result.actor, self.user)
+        self.assertEqual(result.target, self.project)
+        self.assertEqual(result.timestamp, action.timestamp)
+
+        self.assertEqual([action.verb for action in timeline.get_public().all()],
+                         ['like', 'join', 'join', 'join'])
+
+
+class RedisShardedTimelineTests(RedisUrlTimelineTests):
+    def setUp(self):
+        from sequere.contrib.timeline import app as timeline_app
+        from sequere.contrib.timeline.backends.redis import RedisBackend as RedisTimelineBackend
+
+        super(RedisShardedTimelineTests, self).setUp()
+
+        app.backend = RedisBackend(**SHARDED_OPTIONS)
+        app.backend.clear()
+
+        self.timeline_backend = timeline_app.backend
+
+        timeline_app.backend = RedisTimelineBackend(**SHARDED_OPTIONS)
+
+    def tearDown(self):
+        from sequere.contrib.timeline import app as timeline_app
+
+        timeline_app.backend = self.timeline_backend
+
+        super(RedisShardedTimelineTests, self).tearDown()
+
+    def test_async_timeline(self):
+        from django.core.exceptions import ImproperlyConfigured
+
+        from sequere.contrib.timeline import app as timeline_app
+
+        self.assertRaises(ImproperlyConfigured, timeline_app.backend.get_async_backend)
+
+    def test_migrate_uids_pulled(self):
+        from django.core.management import CommandError, call_command
+
+        self.assertRaises(CommandError, call_command, 'sequere_migrate_uids')
+
+
+@override_settings(SEQUERE_TIMELINE_FILTER_MODE='view',
+                   SEQUERE_TIMELINE_VIEW_TTL=0)
+class RedisViewTimelineTests(RedisUrlTimelineTests):
+    def test_filtered_views(self):
+        from ..models import follow
+        from .sequere_registry import JoinAction, LikeAction, Project
+        from sequere.contrib.timeline import Timeline
+
+        follow(self.newbie, self.user)
+
+        Timeline(self.user).save(JoinAction(self.user))
+        Timeline(self.user).save(LikeAction(actor=self.user, target=self.project))
+
+        timeline = Timeline(self.newbie)
+
+        client = timeline.backend.client
+
+        keys = client.keys('%s*' % timeline.backend._make_key(self.newbie, 'private'))
+
+        self.assertEqual(sorted(keys), sorted([timeline.backend._make_key(self.newbie, 'private'),
+                                               get_key(timeline.backend._make_key(self.newbie, 'private'), 'count')]))
+
+        self.assertEqual(timeline.get_private_count(), 2)
+        self.assertEqual(timeline.get_private_count(target=Project), 1)
+        self.assertEqual(timeline.get_private_count(target=self.newbie), 2)
+        self.assertEqual(timeline.get_private_count(action=JoinAction), 1)
+        self.assertEqual(timeline.get_private_count(action=LikeAction, target=Project), 1)
+        self.assertEqual(timeline.get_private_count(action=JoinAction, target=Project), 0)
+
+        self.assertEqual([action.target for action in timeline.get_private(target=Project).all()],
+                         [self.project])
+
+        with override_settings(SEQUERE_TIMELINE_VIEW_TTL=60):
+            self.assertEqual(timeline.get_private_count(action=JoinAction), 1)
+
+            Timeline(self.user).save(JoinAction(self.user))
+
+            # live views get the actions saved meanwhile
+            self.assertEqual(timeline.get_private_count(action=JoinAction), 2)
+
+    @override_settings(SEQUERE_TIMELINE_VIEW_TTL=60)
+    def test_filtered_views_scan(self):
+        from mock import patch
+
+        from ..models import follow
+        from .sequere_registry import JoinAction, LikeAction
+        from sequere.contrib.timeline import Timeline
+
+        follow(self.newbie, self.user)
+
+        for i in range(6):
+            action = JoinAction if i % 2 else LikeAction
+
+            Timeline(self.user).save(action(actor=self.user, target=self.project,
+                                            date=datetime.now() + timedelta(seconds=i)))
+
+        timeline = Timeline(self.newbie)
+
+        view_key = timeline.backend._get_view_name(timeline.backend._make_key(self.newbie, 'private'), 'join')
+
+        client = timeline.backend.client
+
+        with patch('sequere.contrib.timeline.backends.redis.backend.VIEW_WINDOW', 2):
+            self.assertEqual(len(timeline.get_private(action=JoinAction)[0:1]), 1)
+
+            # the scan stops once the page is filled
+            self.assertEqual(client.zcard(view_key), 1)
+            self.assertNotEqual(client.get(get_key(view_key, 'cursor')), 'done')
+
+            self.assertEqual(len(timeline.get_private(action=JoinAction)[0:3]), 3)
+            self.assertEqual(timeline.get_private_count(action=JoinAction), 3)
+            self.assertEqual(client.get(get_key(view_key, 'cursor')), 'done')
+
+            action, = [action for action in timeline.get_private(action=JoinAction)[0:1]]
+
+            Timeline(self.newbie).delete(action)
+
+            self.assertEqual(timeline.get_private_count(action=JoinAction), 2)
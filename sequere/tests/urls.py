@@ -1,4 +1,6 @@
-from django.conf.urls import include, url
+from django.conf.urls import include
+
+from sequere.compat import url
 
 
 urlpatterns = [
@@ -94,7 +94,11 @@ def to_timestamp(dt):
     return int(time.mktime(dt.timetuple()))
 
 
-def get_client(connection, connection_class=None):
+def to_precise_timestamp(dt):
+    return to_timestamp(dt) + dt.microsecond / 1000000.0
+
+
+def create_client(connection, connection_class=None):
     if connection_class:
         client = load_class(connection_class)(**connection)
     else:
@@ -107,13 +111,45 @@ def get_client(connection, connection_class=None):
             client = redis.from_url(connection, decode_responses=True)
         else:
             # see https://github.com/andymccurdy/redis-py/issues/463#issuecomment-41229918
-            connection['decode_responses'] = True
-
-            client = redis.StrictRedis(**connection)
+            client = redis.StrictRedis(**dict(connection, decode_responses=True))
 
     return client
 
 
+def get_client(connection, connection_class=None, pool_class=None, pool_options=None, shared=True):
+    """
+    Returns the client of the process registered for these settings, its
+    connections being held by a ``pool_class`` pool when given. Clients
+    bound to an event loop are not ``shared``.
+    """
+    if not shared:
+        return create_client(connection, connection_class=connection_class)
+
+    from sequere.backends.redis.connections import clients
+
+    return clients.get(connection, connection_class=connection_class,
+                       pool_class=pool_class, pool_options=pool_options)
+
+
+def unique_edges(edges):
+    """
+    Removes duplicated edges and edges from an instance to itself, keeps the order.
+    """
+    seen = set()
+
+    results = []
+
+    for from_instance, to_instance in edges:
+        if from_instance == to_instance or (from_instance, to_instance) in seen:
+            continue
+
+        seen.add((from_instance, to_instance))
+
+        results.append((from_instance, to_instance))
+
+    return results
+
+
 def get_setting(name):
     try:
         return getattr(settings, 'SEQUERE_' + name)
@@ -29,10 +29,13 @@ setup(
         'Programming Language :: Python :: 2.6',
         'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3.3',
+        'Programming Language :: Python :: 3.8',
         'Topic :: Utilities',
     ],
     extras_require={
-        'redis': ['redis'],
+        'redis': ['redis>=3'],
+        # the asyncio API (sequere.aio)
+        'async': ['Django>=3.0', 'asgiref>=3.2', 'redis>=4.2'],
         'nydus': ['nydus'],
     },
     install_requires=['six'],